@@ -1,11 +1,29 @@
-import json
 import logging
 import os
-from typing import List, Tuple, Dict, Union
-from querier import BookmarkQuerier
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from indexer import (
+    BookmarkIndex,
+    BookmarkWatcher,
+    FaviconStore,
+    FirefoxProfiles,
+    FrecencyStore,
+    IndexSnapshot,
+    ProfileScanner,
+)
+from indexer.cache import get_cache_dir
+from querier import (
+    BookmarkQuerier,
+    ItemCache,
+    QueryStats,
+    QueryTimer,
+    QueryWorker,
+    ResultSender,
+)
 
 from ulauncher.api.client.EventListener import EventListener
 from ulauncher.api.client.Extension import Extension
+from ulauncher.api.shared.action.CopyToClipboardAction import CopyToClipboardAction
 from ulauncher.api.shared.action.OpenUrlAction import OpenUrlAction
 from ulauncher.api.shared.action.RenderResultListAction import RenderResultListAction
 from ulauncher.api.shared.event import (
@@ -14,6 +32,7 @@ from ulauncher.api.shared.event import (
     PreferencesUpdateEvent,
 )
 from ulauncher.api.shared.item.ExtensionResultItem import ExtensionResultItem
+from ulauncher.api.shared.Response import Response
 
 # Swap the two logging configs to enable/disable logging to file debug.log in this directory
 # logging.basicConfig(
@@ -23,6 +42,13 @@ from ulauncher.api.shared.item.ExtensionResultItem import ExtensionResultItem
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 
+# Typing the keyword followed by this query shows the query stats instead of bookmarks
+stats_query = ":stats"
+# The milliseconds a query may take if the preference is invalid
+default_time_budget = 100.0
+# Preferences which only change how queries are answered
+querier_preferences = ["filter_by_folders", "query_time_budget", "fuzzy_matching"]
+
 support_browsers = [
     "google-chrome",
     "chromium",
@@ -31,6 +57,19 @@ support_browsers = [
     "vivaldi",
 ]
 
+# Firefox based browsers and the directories containing their profiles.ini
+support_firefox_browsers = {
+    "firefox": [
+        "$HOME/.mozilla/firefox",
+        "$HOME/snap/firefox/common/.mozilla/firefox",
+        "$HOME/.var/app/org.mozilla.firefox/.mozilla/firefox",
+    ],
+    "librewolf": [
+        "$HOME/.librewolf",
+        "$HOME/.var/app/io.gitlab.librewolf-community/.librewolf",
+    ],
+}
+
 browser_imgs = {
     "google-chrome": "images/chrome.png",
     "chromium": "images/chromium.png",
@@ -38,6 +77,10 @@ browser_imgs = {
     "BraveSoftware": "images/brave.png",
     "vivaldi": "images/vivaldi.png",
     "custom_path": "images/chromium.png",
+    # No Firefox or LibreWolf logo ships with the extension, so their bookmarks fall back to the generic
+    # browser icon until the favicon of the site is known
+    "firefox": "images/chromium.png",
+    "librewolf": "images/chromium.png",
 }
 
 
@@ -48,7 +91,8 @@ class PreferencesEventListener(EventListener):
         extension: "BrowserBookmarks",
     ) -> None:
         """
-        Listens for preference events and updates the extension preferences. Then updates the bookmarks paths.
+        Listens for preference events and updates the extension preferences.
+        Then finds the bookmarks paths and builds the index on the watcher thread, so the extension starts right away.
 
         Parameters:
             event (Union[PreferencesEvent, PreferencesUpdateEvent]): The event to listen for
@@ -61,25 +105,108 @@ class PreferencesEventListener(EventListener):
         elif isinstance(event, PreferencesEvent):
             assert isinstance(event.preferences, dict)
             extension.preferences = event.preferences
-        # Could be optimized so it only refreshes the custom paths
-        extension.bookmarks_paths = extension.find_bookmarks_paths()
+
+        # A new querier also drops the cached matches of the previous preferences
+        extension.querier = BookmarkQuerier(
+            filter_by_folders=extension.preferences["filter_by_folders"],
+            frecency=extension.frecency_store,
+            time_budget=extension.get_time_budget(),
+            fuzzy=extension.preferences.get("fuzzy_matching", False),
+        )
+
+        if (
+            isinstance(event, PreferencesUpdateEvent)
+            and event.id in querier_preferences
+        ):
+            # Only the querier depends on these preferences, the bookmarks paths stay the same
+            return
+
+        if (
+            isinstance(event, PreferencesUpdateEvent)
+            and event.id == "additional_browser_paths"
+        ):
+            # Only the custom paths changed, so the browsers do not need to be searched again
+            extension.bookmark_watcher.discover(
+                extension.update_custom_bookmarks_paths, partial=True
+            )
+        else:
+            # Queries are served from the restored snapshot, or from the files loaded so far, in the meantime
+            extension.bookmark_watcher.discover(extension.update_bookmarks_paths)
 
 
 class KeywordQueryEventListener(EventListener):
     def on_event(  # type: ignore
         self, event: KeywordQueryEvent, extension: "BrowserBookmarks"
-    ) -> RenderResultListAction:
-        items = extension.get_items(event.get_argument())
-        return RenderResultListAction(items)
+    ) -> None:
+        """
+        Hands the query to the query worker, so the search of a previous keystroke is abandoned
+        instead of delaying this one. The results are sent once the worker found them.
+
+        Parameters:
+            event (KeywordQueryEvent): The event to answer
+            extension (BrowserBookmarks): The extension
+        """
+        extension.query_worker.submit(
+            event.get_argument(), partial(extension.result_sender.send, event)
+        )
 
 
 class BrowserBookmarks(Extension):
     max_matches_len = 10
     bookmarks_paths: List[Tuple[str, str]]
+    browser_bookmarks_paths: List[Tuple[str, str]]
+    custom_bookmarks_paths: List[Tuple[str, str]]
+    profile_scanner: ProfileScanner
+    querier: BookmarkQuerier
+    bookmark_index: BookmarkIndex
+    bookmark_watcher: BookmarkWatcher
+    stats: QueryStats
+    frecency_store: FrecencyStore
+    favicon_store: FaviconStore
+    query_worker: QueryWorker
+    result_sender: ResultSender
+    item_cache: ItemCache
 
     def __init__(self):
         super(BrowserBookmarks, self).__init__()
 
+        self.bookmarks_paths = []
+        self.browser_bookmarks_paths = []
+        self.custom_bookmarks_paths = []
+        cache_dir = get_cache_dir()
+        self.profile_scanner = ProfileScanner(os.path.join(cache_dir, "profiles.json"))
+        self.frecency_store = FrecencyStore(os.path.join(cache_dir, "frecency.marshal"))
+        self.favicon_store = FaviconStore(os.path.join(cache_dir, "favicons"))
+        self.querier = BookmarkQuerier(frecency=self.frecency_store)
+        self.stats = QueryStats()
+        self.bookmark_index = BookmarkIndex(self.stats)
+        # The watcher restores the index from the snapshot as soon as it starts
+        self.bookmark_watcher = BookmarkWatcher(
+            self.bookmark_index,
+            snapshot=IndexSnapshot(os.path.join(cache_dir, "index.marshal")),
+        )
+        # Boosts bookmarks by their visits, synced from the History databases in the background
+        self.bookmark_watcher.schedule(
+            lambda bookmarks_paths: self.frecency_store.sync(
+                bookmarks_paths, self.bookmark_index.urls()
+            ),
+            FrecencyStore.sync_interval,
+        )
+        # Extracts the favicons of the bookmarked sites in the background, results only look them up
+        self.bookmark_watcher.schedule(
+            lambda bookmarks_paths: self.favicon_store.sync(
+                bookmarks_paths, self.bookmark_index.urls()
+            ),
+            FaviconStore.sync_interval,
+        )
+        self.bookmark_watcher.start()
+        self.item_cache = ItemCache()
+        self.result_sender = ResultSender(
+            self, lambda event, items: Response(event, RenderResultListAction(items))
+        )
+        self.query_worker = QueryWorker(self.get_items)
+        self.query_worker.start()
+
         # Subscribe to preference events
         self.subscribe(PreferencesEvent, PreferencesEventListener())
         self.subscribe(PreferencesUpdateEvent, PreferencesEventListener())
@@ -87,15 +214,70 @@ class BrowserBookmarks(Extension):
         # Subscribe to keyword query events
         self.subscribe(KeywordQueryEvent, KeywordQueryEventListener())
 
+    def get_time_budget(self) -> Optional[float]:
+        """
+        Returns the configured time budget of a query
+
+        Returns:
+            Optional[float]: The milliseconds a query may take, or None if the search is not bounded
+        """
+        try:
+            time_budget = float(self.preferences.get("query_time_budget") or 0)
+        except ValueError:
+            logger.info(
+                "Invalid query time budget %s"
+                % self.preferences.get("query_time_budget")
+            )
+            return default_time_budget
+        return time_budget if time_budget > 0 else None
+
+    def update_bookmarks_paths(self) -> List[Tuple[str, str]]:
+        """
+        Searches for bookmarks by supported browsers and custom paths and remembers them
+
+        Returns:
+            List[Tuple[str, str]]: A list of tuples containing the path to the bookmarks and the browser name
+        """
+        self.bookmarks_paths = self.find_bookmarks_paths()
+        return self.bookmarks_paths
+
+    def update_custom_bookmarks_paths(self) -> List[Tuple[str, str]]:
+        """
+        Searches for bookmarks in the custom paths again, keeping the bookmarks found for the browsers
+
+        Returns:
+            List[Tuple[str, str]]: A list of tuples containing the path to the bookmarks and the browser name
+        """
+        self.custom_bookmarks_paths = self.find_custom_bookmarks_paths()
+        self.bookmarks_paths = (
+            self.browser_bookmarks_paths + self.custom_bookmarks_paths
+        )
+        return self.bookmarks_paths
+
     def find_bookmarks_paths(self) -> List[Tuple[str, str]]:
         """
         Searches for bookmarks by supported browsers and custom paths
 
+        Returns:
+            List[Tuple[str, str]]: A list of tuples containing the path to the bookmarks and the browser name
+        """
+        self.browser_bookmarks_paths = self.find_browser_bookmarks_paths()
+        self.custom_bookmarks_paths = self.find_custom_bookmarks_paths()
+        found_bookmarks = self.browser_bookmarks_paths + self.custom_bookmarks_paths
+
+        if len(found_bookmarks) == 0:
+            logger.exception("No Bookmarks were found")
+
+        return found_bookmarks
+
+    def find_browser_bookmarks_paths(self) -> List[Tuple[str, str]]:
+        """
+        Searches for bookmarks by supported browsers
+
         Returns:
             List[Tuple[str, str]]: A list of tuples containing the path to the bookmarks and the browser name
         """
         found_bookmarks: List[Tuple[str, str]] = []
-        additional_browser_paths = self.preferences["additional_browser_paths"]
 
         for browser in support_browsers:
             potential_bookmark_paths = [
@@ -104,29 +286,38 @@ class BrowserBookmarks(Extension):
             ]
 
             found_bookmarks.extend(
-                BrowserBookmarks.collect_bookmarks_paths(
-                    potential_bookmark_paths, browser
-                )
-            )
-
-        if additional_browser_paths:
-            custom_paths: List[str] = list(additional_browser_paths.split(":"))
-            logger.info(
-                "Custom browser paths found, searching through: %s" % custom_paths
-            )
-            found_bookmarks.extend(
-                BrowserBookmarks.collect_bookmarks_paths(custom_paths, "custom_path")
+                self.collect_bookmarks_paths(potential_bookmark_paths, browser)
             )
 
-        if len(found_bookmarks) == 0:
-            logger.exception("No Bookmarks were found")
+        for browser, profile_roots in support_firefox_browsers.items():
+            for profile_root in profile_roots:
+                root = os.path.expanduser(os.path.expandvars(profile_root))
+                for places_path in FirefoxProfiles.find(root):
+                    found_bookmarks.append((places_path, browser))
 
         return found_bookmarks
 
-    @staticmethod
-    def collect_bookmarks_paths(dirs: List[str], browser: str) -> List[Tuple[str, str]]:
+    def find_custom_bookmarks_paths(self) -> List[Tuple[str, str]]:
+        """
+        Searches for bookmarks in the custom paths
+
+        Returns:
+            List[Tuple[str, str]]: A list of tuples containing the path to the bookmarks and the browser name
+        """
+        additional_browser_paths = self.preferences["additional_browser_paths"]
+        if not additional_browser_paths:
+            return []
+
+        custom_paths: List[str] = list(additional_browser_paths.split(":"))
+        logger.info("Custom browser paths found, searching through: %s" % custom_paths)
+        return self.collect_bookmarks_paths(custom_paths, "custom_path")
+
+    def collect_bookmarks_paths(
+        self, dirs: List[str], browser: str
+    ) -> List[Tuple[str, str]]:
         """
-        Collects the paths to the bookmarks of the browser
+        Collects the paths to the bookmarks of the browser.
+        Directories which did not change since they were last scanned are not walked again.
 
         Parameters:
             dirs (List[str]): The directories to search in
@@ -135,30 +326,34 @@ class BrowserBookmarks(Extension):
         Returns:
             List[Tuple[str, str]]: A list of tuples containing the path to the bookmarks and the browser name
         """
-        grep_results: List[str] = []
+        bookmarks_paths: List[Tuple[str, str]] = []
 
-        for command in dirs:
-            f = os.popen("find %s | grep Bookmarks" % (command))
-            grep_results.extend(f.read().split("\n"))
-            f.close()
+        for directory in dirs:
+            root = os.path.expanduser(os.path.expandvars(directory.strip()))
+            if not root:
+                continue
+            for one_path in self.profile_scanner.scan(root):
+                bookmarks_paths.append((one_path, browser))
 
-        if len(grep_results) == 0:
-            logger.info("Path to the %s Bookmarks was not found" % browser)
-            return []
+        self.profile_scanner.save()
 
-        bookmarks_paths: List[Tuple[str, str]] = []
-        for one_path in grep_results:
-            if one_path.endswith("Bookmarks"):
-                bookmarks_paths.append((one_path, browser))
+        if len(bookmarks_paths) == 0:
+            logger.info("Path to the %s Bookmarks was not found" % browser)
 
         return bookmarks_paths
 
-    def get_items(self, query: Union[str, None]) -> List[ExtensionResultItem]:
+    def get_items(
+        self,
+        query: Union[str, None],
+        is_cancelled: Optional[Callable[[], bool]] = None,
+    ) -> List[ExtensionResultItem]:
         """
         Returns a list of ExtensionResultItems for the query, which is rendered by Ulauncher
 
         Parameters:
             query (Union[str, None]): The query being searched
+            is_cancelled (Optional[Callable[[], bool]]): Returns True once the query is superseded,
+                which abandons the search by raising QueryCancelled
 
         Returns:
             List[ExtensionResultItem]: A list of ExtensionResultItems to be rendered
@@ -168,30 +363,89 @@ class BrowserBookmarks(Extension):
         if query is None:
             query = ""
 
+        if query.strip() == stats_query:
+            return self.get_stats_items()
+
         logger.debug("Finding bookmark entries for query %s" % query)
+        timer = QueryTimer()
+
+        # The index is kept up to date by the watcher thread, so no disk access is needed here
+        sources = self.bookmark_index.prioritized_sources()
+        timer.lap("lookup")
+
+        # Returns the best matches of all bookmarks files, instead of the first ones of each file
+        source_timings: Dict[str, float] = {}
+        # The preferences listener may swap the querier while the worker searches
+        querier = self.querier
+        matches = querier.search_sources(sources, query, source_timings, is_cancelled)
+        timer.lap("search")
+
+        built_items = self.item_cache.misses
+        for bookmark, browser in matches:
+            # A URL found in several files is shown once, with the icon of the most recently modified one
+            if bookmark.origins:
+                browser = bookmark.origins[0][1]
+            # The favicon of the site if it was extracted already, the icon of the browser otherwise
+            icon = self.favicon_store.icon(bookmark.url) or browser_imgs.get(browser)
+            # Keyed by what the item shows, as records are replaced on every reload and Firefox ones on every query
+            key = (bookmark.name, bookmark.url, icon)
+            items.append(
+                self.item_cache.get(key, partial(BrowserBookmarks.create_item, *key))
+            )
+        timer.lap("items")
+
+        self.stats.record_query(
+            timer.stages,
+            {
+                "files": len(sources),
+                "visited": querier.visited_entries,
+                "matches": querier.matched_entries,
+                "new_items": self.item_cache.misses - built_items,
+                "timed_out": int(querier.timed_out),
+            },
+            source_timings,
+        )
+        if self.stats.should_dump():
+            logger.debug("Query stats:\n%s" % "\n".join(self.stats.format_lines()))
 
-        querier = BookmarkQuerier(
-            filter_by_folders=self.preferences["filter_by_folders"],
+        return items
+
+    @staticmethod
+    def create_item(name: str, url: str, icon: Optional[str]) -> ExtensionResultItem:
+        """
+        Builds the result item of a bookmark
+
+        Parameters:
+            name (str): The bookmark title
+            url (str): The bookmark URL
+            icon (Optional[str]): The path to the icon
+
+        Returns:
+            ExtensionResultItem: The item opening the URL
+        """
+        return ExtensionResultItem(
+            icon=icon,
+            name=name,
+            description=url,
+            on_enter=OpenUrlAction(url),
         )
 
-        for bookmarks_path, browser in self.bookmarks_paths:
-            matches: List[Dict[str, str | Dict[str, str]]] = []
-
-            with open(bookmarks_path) as data_file:
-                data = json.load(data_file)
-                querier.search(data["roots"]["bookmark_bar"], query, matches)
-                querier.search(data["roots"]["synced"], query, matches)
-                querier.search(data["roots"]["other"], query, matches)
-
-            for bookmark in matches:
-                bookmark_name: bytes = str(bookmark["name"]).encode("utf-8")
-                bookmark_url: bytes = str(bookmark["url"]).encode("utf-8")
-                item = ExtensionResultItem(
-                    icon=browser_imgs.get(browser),
-                    name=str(bookmark_name.decode("utf-8")),
-                    description=str(bookmark_url.decode("utf-8")),
-                    on_enter=OpenUrlAction(bookmark_url.decode("utf-8")),
-                )
-                items.append(item)
+    def get_stats_items(self) -> List[ExtensionResultItem]:
+        """
+        Returns the query stats as ExtensionResultItems, selecting any of them copies the full report
 
-        return items
+        Returns:
+            List[ExtensionResultItem]: One item per line of the stats report
+        """
+        lines = self.stats.format_lines()
+        report = "\n".join(lines)
+
+        return [
+            ExtensionResultItem(
+                icon="images/chromium.png",
+                name=line,
+                description="Press enter to copy the full stats report",
+                on_enter=CopyToClipboardAction(report),
+            )
+            for line in lines
+        ]
@@ -0,0 +1,476 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from querier import Bookmark, FolderIndex, QueryStats, TrigramIndex
+from querier.Bookmark import Origins
+
+from .BookmarkLoader import BookmarkLoader, LoadedBookmarks
+from .FirefoxSource import FirefoxSource
+
+logger = logging.getLogger(__name__)
+
+Signature = Tuple[int, int, int]
+
+
+class BookmarkSource:
+    def __init__(
+        self,
+        path: str,
+        browser: str,
+        signature: Signature,
+        entries: List[Bookmark],
+        trigram_index: TrigramIndex,
+        folder_index: Optional[FolderIndex] = None,
+    ) -> None:
+        """
+        A single parsed Bookmarks file.
+
+        Parameters:
+            path (str): The path to the Bookmarks file
+            browser (str): The browser name (used to match the icon)
+            signature (Signature): The mtime, size and inode of the file when it was parsed
+            entries (List[Bookmark]): The flattened bookmarks of the file
+            trigram_index (TrigramIndex): The index over the entries
+            folder_index (Optional[FolderIndex]): The folders of the file and their entry intervals
+        """
+        self.path = path
+        self.browser = browser
+        self.signature = signature
+        self.entries = entries
+        self.trigram_index = trigram_index
+        self.folder_index = folder_index if folder_index is not None else FolderIndex()
+
+
+# The name, URL and folders of a bookmark, equal bookmarks share a record
+RecordKey = Tuple[str, str, str]
+
+
+class SharedRecords:
+    def __init__(self) -> None:
+        """
+        Initializes the SharedRecords class, which replaces equal bookmarks of different files
+        (e.g. synced into several browsers or profiles) by a single record, so every bookmark and URL string
+        is only kept once in memory. The origins of each record are the files containing its URL,
+        most recently modified first. Only the records of added and removed files are visited on an update.
+        """
+        # The files whose entries are shared, by path
+        self.sources: Dict[str, BookmarkSource] = {}
+        # The record of each bookmark and the number of entries it replaces
+        self.records: Dict[RecordKey, Bookmark] = {}
+        self.entry_counts: Dict[RecordKey, int] = {}
+        # The records of each URL and the files containing it
+        self.url_records: Dict[str, List[Bookmark]] = {}
+        self.url_origins: Dict[str, Origins] = {}
+        # Most URLs share the same few combinations of files, so the tuples are shared as well
+        self.shared_origins: Dict[Origins, Origins] = {}
+
+    def update(self, sources: Dict[str, "Source"]) -> None:
+        """
+        Shares the records of the files that were added or replaced since the last update,
+        and stops sharing the ones of the files that were dropped or replaced
+
+        Parameters:
+            sources (Dict[str, Source]): The parsed files by path
+        """
+        bookmark_sources = {
+            path: source
+            for path, source in sources.items()
+            if isinstance(source, BookmarkSource)
+        }
+        changed_urls: Set[str] = set()
+        for path, source in self.sources.items():
+            if bookmark_sources.get(path) is not source:
+                self.remove(source, changed_urls)
+
+        previous_sources, self.sources = self.sources, bookmark_sources
+        for path, source in bookmark_sources.items():
+            if previous_sources.get(path) is not source:
+                self.add(source, changed_urls)
+
+        for url in changed_urls:
+            self.update_origins(url)
+
+    def add(self, source: BookmarkSource, changed_urls: Set[str]) -> None:
+        """
+        Replaces the entries of a file by the records of equal bookmarks and adds the file to the origins of its URLs
+
+        Parameters:
+            source (BookmarkSource): The file
+            changed_urls (Set[str]): The URLs whose origins changed, extended by the ones of the file
+        """
+        origin = (source.path, source.browser)
+        records = self.records
+        entry_counts = self.entry_counts
+        url_records = self.url_records
+        url_origins = self.url_origins
+        entries = source.entries
+        for position, bookmark in enumerate(entries):
+            key = (bookmark.name, bookmark.url, bookmark.folder)
+            record = records.get(key)
+            if record is None:
+                records[key] = record = bookmark
+                entry_counts[key] = 1
+                same_url_records = url_records.get(bookmark.url)
+                if same_url_records is None:
+                    url_records[bookmark.url] = [bookmark]
+                else:
+                    bookmark.url = same_url_records[0].url
+                    same_url_records.append(bookmark)
+            else:
+                entry_counts[key] += 1
+                # Swapping in an equal record is safe while the entries are searched
+                entries[position] = record
+
+            origins = url_origins.get(record.url, ())
+            if origin not in origins:
+                url_origins[record.url] = origins + (origin,)
+                changed_urls.add(record.url)
+
+    def remove(self, source: BookmarkSource, changed_urls: Set[str]) -> None:
+        """
+        Drops the records only the entries of a file used and removes the file from the origins of its URLs.
+        The entries themselves are left as they are, as they may still be searched.
+
+        Parameters:
+            source (BookmarkSource): The file
+            changed_urls (Set[str]): The URLs whose origins changed, extended by the ones of the file
+        """
+        records = self.records
+        entry_counts = self.entry_counts
+        url_records = self.url_records
+        url_origins = self.url_origins
+        source_urls: Set[str] = set()
+        for bookmark in source.entries:
+            key = (bookmark.name, bookmark.url, bookmark.folder)
+            entry_counts[key] -= 1
+            if not entry_counts[key]:
+                del entry_counts[key]
+                record = records.pop(key)
+                same_url_records = url_records[bookmark.url]
+                same_url_records.remove(record)
+                if not same_url_records:
+                    del url_records[bookmark.url]
+
+            if bookmark.url not in source_urls:
+                source_urls.add(bookmark.url)
+                origins = url_origins[bookmark.url]
+                url_origins[bookmark.url] = (
+                    ()
+                    if len(origins) == 1
+                    else tuple(origin for origin in origins if origin[0] != source.path)
+                )
+        changed_urls.update(source_urls)
+
+    def update_origins(self, url: str) -> None:
+        """
+        Sorts the files containing a URL by their modification time and sets them as the origins of its records
+
+        Parameters:
+            url (str): The URL
+        """
+        origins = self.url_origins[url]
+        if not origins:
+            del self.url_origins[url]
+            return
+
+        if len(origins) > 1:
+            sources = self.sources
+            # The mtime comes first in the signature
+            origins = tuple(
+                sorted(
+                    origins,
+                    key=lambda origin: sources[origin[0]].signature,
+                    reverse=True,
+                )
+            )
+        origins = self.shared_origins.setdefault(origins, origins)
+        self.url_origins[url] = origins
+        for record in self.url_records[url]:
+            record.origins = origins
+
+
+# Firefox databases are searched through their own index instead of being kept in memory
+Source = Union[BookmarkSource, FirefoxSource]
+
+
+class BookmarkIndex:
+    def __init__(self, stats: Optional[QueryStats] = None) -> None:
+        """
+        Initializes the BookmarkIndex class, which keeps the parsed and flattened bookmarks
+        of every Bookmarks file in memory and only reparses a file once it changed on disk.
+
+        Parameters:
+            stats (Optional[QueryStats]): The stats to record the load times in
+        """
+        self.sources: Dict[str, Source] = {}
+        # Incremented whenever the sources change
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.loader = BookmarkLoader()
+        self.stats = stats
+        # The sources mapping and its values in search order, rebuilt whenever the mapping is swapped
+        self.prioritized: Tuple[Dict[str, Source], List[Source]] = ({}, [])
+        self.shared_records = SharedRecords()
+
+    def refresh(self, bookmarks_paths: List[Tuple[str, str]]) -> None:
+        """
+        Brings the index in line with the given bookmarks paths. Files whose signature did not
+        change are kept as they are, new or changed files are reparsed and missing files are dropped.
+        If a changed file can not be parsed, its previous entries are kept.
+
+        Parameters:
+            bookmarks_paths (List[Tuple[str, str]]): A list of tuples containing the path to the bookmarks and the browser name
+        """
+        with self.lock:
+            signatures: Dict[str, Signature] = {}
+            changed_paths: List[str] = []
+
+            firefox_sources: Dict[str, Optional[FirefoxSource]] = {}
+
+            for bookmarks_path, browser in bookmarks_paths:
+                signature = BookmarkIndex.stat_signature(bookmarks_path)
+                if signature is None or bookmarks_path in signatures:
+                    continue
+
+                signatures[bookmarks_path] = signature
+                source = self.sources.get(bookmarks_path)
+                if source is not None and source.signature == signature:
+                    continue
+                if FirefoxSource.is_places(bookmarks_path):
+                    firefox_sources[bookmarks_path] = self.load_firefox(
+                        bookmarks_path, browser, signature, source
+                    )
+                else:
+                    changed_paths.append(bookmarks_path)
+
+            # Parses all changed files at once, so they can be loaded concurrently
+            loaded = self.loader.load_many(changed_paths)
+            for bookmarks_path, duration in self.loader.durations.items():
+                self.record_load(bookmarks_path, duration, loaded[bookmarks_path])
+
+            sources: Dict[str, Source] = {}
+            for bookmarks_path, browser in bookmarks_paths:
+                if bookmarks_path not in signatures or bookmarks_path in sources:
+                    continue
+
+                if bookmarks_path in firefox_sources:
+                    firefox_source = firefox_sources[bookmarks_path]
+                    if firefox_source is not None:
+                        sources[bookmarks_path] = firefox_source
+                    continue
+
+                if bookmarks_path in loaded:
+                    loaded_bookmarks = loaded[bookmarks_path]
+                    if loaded_bookmarks is None:
+                        # Like refresh_path, keeps the previous entries of a file that could not be parsed
+                        # (e.g. while the browser is still writing it), its old signature has it parsed again
+                        previous_source = self.sources.get(bookmarks_path)
+                        if previous_source is not None:
+                            sources[bookmarks_path] = previous_source
+                        continue
+                    entries, trigram_index, folder_index = loaded_bookmarks
+                else:
+                    source = self.sources[bookmarks_path]
+                    if source.browser == browser or isinstance(source, FirefoxSource):
+                        sources[bookmarks_path] = source
+                        continue
+                    entries, trigram_index, folder_index = (
+                        source.entries,
+                        source.trigram_index,
+                        source.folder_index,
+                    )
+
+                sources[bookmarks_path] = BookmarkSource(
+                    bookmarks_path,
+                    browser,
+                    signatures[bookmarks_path],
+                    entries,
+                    trigram_index,
+                    folder_index,
+                )
+
+            if sources.keys() != self.sources.keys() or any(
+                source is not self.sources[path] for path, source in sources.items()
+            ):
+                self.shared_records.update(sources)
+                self.generation += 1
+
+            # Swap the whole mapping at once, so readers never see a half refreshed index
+            self.sources = sources
+
+    def prioritized_sources(self) -> List[Source]:
+        """
+        Returns the sources in the order they should be searched, most recently modified first,
+        so the profile in use is searched before the time budget of a query runs out
+
+        Returns:
+            List[Source]: The sources
+        """
+        sources, prioritized = self.prioritized
+        if sources is not self.sources:
+            sources = self.sources
+            # The mtime comes first in the signature
+            prioritized = sorted(
+                sources.values(), key=lambda source: source.signature[0], reverse=True
+            )
+            self.prioritized = (sources, prioritized)
+        return prioritized
+
+    def urls(self) -> Set[str]:
+        """
+        Returns the URLs of all bookmarks in the index
+
+        Returns:
+            Set[str]: The bookmarked URLs
+        """
+        return {
+            bookmark.url
+            for source in self.sources.values()
+            if isinstance(source, BookmarkSource)
+            for bookmark in source.entries
+        }
+
+    def restore(self, sources: Dict[str, Source]) -> None:
+        """
+        Replaces the sources with previously parsed ones, e.g. from a snapshot
+
+        Parameters:
+            sources (Dict[str, Source]): The parsed files by path
+        """
+        with self.lock:
+            self.shared_records.update(sources)
+            self.sources = sources
+
+    def refresh_path(self, bookmarks_path: str, browser: str) -> bool:
+        """
+        Reparses a single Bookmarks file if it changed and swaps it into the index.
+        If the file can not be parsed (e.g. while the browser is still writing it), the previous entries are kept.
+
+        Parameters:
+            bookmarks_path (str): The path to the bookmarks
+            browser (str): The browser name (used to match the icon)
+
+        Returns:
+            bool: True if the index changed, False otherwise
+        """
+        with self.lock:
+            signature = BookmarkIndex.stat_signature(bookmarks_path)
+            source = self.sources.get(bookmarks_path)
+
+            if signature is None:
+                if source is None:
+                    return False
+                sources = dict(self.sources)
+                del sources[bookmarks_path]
+                self.shared_records.update(sources)
+                self.sources = sources
+                self.generation += 1
+                return True
+
+            if source is not None and source.signature == signature:
+                return False
+
+            new_source: Optional[Source]
+            if FirefoxSource.is_places(bookmarks_path):
+                new_source = self.load_firefox(
+                    bookmarks_path, browser, signature, source
+                )
+                # Only the history changed, the signature of the source was updated in place
+                if new_source is None or new_source is source:
+                    return False
+            else:
+                duration, loaded_bookmarks = BookmarkLoader.timed_load(bookmarks_path)
+                self.record_load(bookmarks_path, duration, loaded_bookmarks)
+                if loaded_bookmarks is None:
+                    return False
+                entries, trigram_index, folder_index = loaded_bookmarks
+                new_source = BookmarkSource(
+                    bookmarks_path,
+                    browser,
+                    signature,
+                    entries,
+                    trigram_index,
+                    folder_index,
+                )
+
+            sources = dict(self.sources)
+            sources[bookmarks_path] = new_source
+            self.shared_records.update(sources)
+            self.sources = sources
+            self.generation += 1
+            return True
+
+    def load_firefox(
+        self,
+        places_path: str,
+        browser: str,
+        signature: Signature,
+        previous: Optional[Source],
+    ) -> Optional[FirefoxSource]:
+        """
+        Builds the source of a Firefox database and records its load in the stats, if any
+
+        Parameters:
+            places_path (str): The path to the places.sqlite database
+            browser (str): The browser name (used to match the icon)
+            signature (Signature): The signature of the database
+            previous (Optional[Source]): The source previously built from the database
+
+        Returns:
+            Optional[FirefoxSource]: The source, the previous one if the bookmarks did not change, or None if the database could not be read
+        """
+        previous_source = previous if isinstance(previous, FirefoxSource) else None
+        start = time.perf_counter()
+        source = FirefoxSource.load(places_path, browser, signature, previous_source)
+        if (
+            self.stats is not None
+            and source is not None
+            and source is not previous_source
+        ):
+            self.stats.record_load(
+                places_path, (time.perf_counter() - start) * 1000, source.marker[0]
+            )
+        return source
+
+    @staticmethod
+    def stat_signature(bookmarks_path: str) -> Optional[Signature]:
+        """
+        Returns the signature used to detect changes of a Bookmarks file
+
+        Parameters:
+            bookmarks_path (str): The path to the bookmarks
+
+        Returns:
+            Optional[Signature]: The mtime, size and inode of the file or None if it does not exist
+        """
+        if FirefoxSource.is_places(bookmarks_path):
+            return FirefoxSource.stat_signature(bookmarks_path)
+
+        try:
+            stat = os.stat(bookmarks_path)
+        except OSError:
+            logger.info("Bookmarks file %s is not accessible" % bookmarks_path)
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def record_load(
+        self,
+        bookmarks_path: str,
+        duration: float,
+        loaded_bookmarks: Optional[LoadedBookmarks],
+    ) -> None:
+        """
+        Records the load of a file in the stats, if any
+
+        Parameters:
+            bookmarks_path (str): The path to the bookmarks
+            duration (float): The duration of the load in milliseconds
+            loaded_bookmarks (Optional[LoadedBookmarks]): The result of the load
+        """
+        if self.stats is None:
+            return
+        entries = 0 if loaded_bookmarks is None else len(loaded_bookmarks[0])
+        self.stats.record_load(bookmarks_path, duration, entries)
@@ -0,0 +1,210 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from querier import Bookmark, BookmarkQuerier, FolderIndex, TrigramIndex
+
+logger = logging.getLogger(__name__)
+
+# The only node fields the querier uses, everything else (meta_info, guid, date_added, ...) is dropped while decoding
+kept_keys = {"type", "name", "url", "children", "roots"}
+
+LoadedBookmarks = Tuple[List[Bookmark], TrigramIndex, FolderIndex]
+
+
+class BookmarkLoader:
+    known_root_names = ["bookmark_bar", "synced", "other"]
+    # Below this total size, starting worker processes takes longer than parsing the files serially
+    parallel_threshold = 4 * 1024 * 1024
+    max_workers = min(os.cpu_count() or 1, 8)
+
+    def __init__(self) -> None:
+        """
+        Initializes the BookmarkLoader class.
+        """
+        # The load duration in milliseconds of each file of the last load_many call
+        self.durations: Dict[str, float] = {}
+
+    def load_many(
+        self, bookmarks_paths: List[str]
+    ) -> Dict[str, Optional[LoadedBookmarks]]:
+        """
+        Parses and indexes several Bookmarks files, in parallel worker processes if they are large enough
+
+        Parameters:
+            bookmarks_paths (List[str]): The paths to the bookmarks
+
+        Returns:
+            Dict[str, Optional[LoadedBookmarks]]: The flattened bookmarks and their indexes by path, None for files that could not be parsed
+        """
+        if len(bookmarks_paths) > 1 and self.max_workers > 1:
+            total_size = 0
+            for bookmarks_path in bookmarks_paths:
+                try:
+                    total_size += os.path.getsize(bookmarks_path)
+                except OSError:
+                    pass
+
+            if total_size >= self.parallel_threshold:
+                try:
+                    return self.collect(
+                        bookmarks_paths, self.load_parallel(bookmarks_paths)
+                    )
+                except (OSError, BrokenProcessPool):
+                    logger.exception(
+                        "Could not load bookmarks in parallel, falling back to serial loading"
+                    )
+
+        return self.collect(
+            bookmarks_paths,
+            [
+                BookmarkLoader.timed_load(bookmarks_path)
+                for bookmarks_path in bookmarks_paths
+            ],
+        )
+
+    def collect(
+        self,
+        bookmarks_paths: List[str],
+        results: List[Tuple[float, Optional[LoadedBookmarks]]],
+    ) -> Dict[str, Optional[LoadedBookmarks]]:
+        """
+        Remembers the load durations and returns the loaded bookmarks by path
+
+        Parameters:
+            bookmarks_paths (List[str]): The paths to the bookmarks
+            results (List[Tuple[float, Optional[LoadedBookmarks]]]): The duration and result of each load
+
+        Returns:
+            Dict[str, Optional[LoadedBookmarks]]: The flattened bookmarks and their indexes by path, None for files that could not be parsed
+        """
+        self.durations = {}
+        loaded: Dict[str, Optional[LoadedBookmarks]] = {}
+        for bookmarks_path, (duration, loaded_bookmarks) in zip(
+            bookmarks_paths, results
+        ):
+            self.durations[bookmarks_path] = duration
+            loaded[bookmarks_path] = loaded_bookmarks
+        return loaded
+
+    def load_parallel(
+        self, bookmarks_paths: List[str]
+    ) -> List[Tuple[float, Optional[LoadedBookmarks]]]:
+        """
+        Parses and indexes several Bookmarks files in worker processes
+
+        Parameters:
+            bookmarks_paths (List[str]): The paths to the bookmarks
+
+        Returns:
+            List[Tuple[float, Optional[LoadedBookmarks]]]: The duration and result of each load
+        """
+        # Spawned workers do not inherit the threads and locks of the extension process
+        with ProcessPoolExecutor(
+            max_workers=min(self.max_workers, len(bookmarks_paths)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            return list(executor.map(BookmarkLoader.timed_load, bookmarks_paths))
+
+    @staticmethod
+    def timed_load(bookmarks_path: str) -> Tuple[float, Optional[LoadedBookmarks]]:
+        """
+        Parses and indexes a single Bookmarks file and measures how long it took
+
+        Parameters:
+            bookmarks_path (str): The path to the bookmarks
+
+        Returns:
+            Tuple[float, Optional[LoadedBookmarks]]: The duration in milliseconds and the result of try_load
+        """
+        start = time.perf_counter()
+        loaded_bookmarks = BookmarkLoader.try_load(bookmarks_path)
+        return (time.perf_counter() - start) * 1000, loaded_bookmarks
+
+    @staticmethod
+    def try_load(bookmarks_path: str) -> Optional[LoadedBookmarks]:
+        """
+        Parses and indexes a single Bookmarks file and logs any failure
+
+        Parameters:
+            bookmarks_path (str): The path to the bookmarks
+
+        Returns:
+            Optional[LoadedBookmarks]: The flattened bookmarks and their indexes or None if the file could not be parsed
+        """
+        try:
+            return BookmarkLoader.load(bookmarks_path)
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.exception("Could not parse bookmarks file %s" % bookmarks_path)
+            return None
+
+    @staticmethod
+    def load(bookmarks_path: str) -> LoadedBookmarks:
+        """
+        Parses and indexes a single Bookmarks file.
+        Unused fields are dropped while decoding, so the full tree with all its metadata is never held in memory.
+
+        Parameters:
+            bookmarks_path (str): The path to the bookmarks
+
+        Returns:
+            LoadedBookmarks: The flattened bookmarks, their index and their folders
+
+        Raises:
+            OSError: If the file can not be read
+            ValueError: If the file is not valid JSON
+            KeyError: If the file has no roots
+        """
+        logger.debug("Loading bookmarks from %s" % bookmarks_path)
+
+        with open(bookmarks_path, encoding="utf-8") as data_file:
+            data = json.load(data_file, object_pairs_hook=BookmarkLoader.slim_object)
+
+        entries: List[Bookmark] = []
+        folder_index = FolderIndex()
+        for root in BookmarkLoader.roots(data["roots"]):
+            BookmarkQuerier.flatten(root, entries, folder_index=folder_index)
+
+        return entries, BookmarkQuerier.build_index(entries), folder_index
+
+    @staticmethod
+    def roots(roots: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Returns the root folders of a Bookmarks file, the well known ones first
+
+        Parameters:
+            roots (Dict[str, Any]): The roots object of the Bookmarks file
+
+        Returns:
+            List[Dict[str, Any]]: The root folders
+        """
+        root_names = [name for name in BookmarkLoader.known_root_names if name in roots]
+        root_names.extend(name for name in roots if name not in root_names)
+
+        return [
+            roots[name]
+            for name in root_names
+            if isinstance(roots[name], dict) and "type" in roots[name]
+        ]
+
+    @staticmethod
+    def slim_object(pairs: List[Tuple[str, Any]]) -> Dict[str, Any]:
+        """
+        Keeps the fields of a decoded JSON object that are needed to flatten the bookmarks
+
+        Parameters:
+            pairs (List[Tuple[str, Any]]): The key value pairs of the object
+
+        Returns:
+            Dict[str, Any]: The object with the used fields and nested bookmark nodes only
+        """
+        return {
+            key: value
+            for key, value in pairs
+            if key in kept_keys or (isinstance(value, dict) and "type" in value)
+        }
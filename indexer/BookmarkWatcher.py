@@ -0,0 +1,347 @@
+import logging
+import math
+import os
+import select
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .BookmarkIndex import BookmarkIndex
+from .FirefoxSource import FirefoxSource
+from .IndexSnapshot import IndexSnapshot
+from .Inotify import (
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_DELETE,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    Inotify,
+)
+
+logger = logging.getLogger(__name__)
+
+# Chrome replaces the Bookmarks file by writing a temporary file and renaming it,
+# so the parent directory is watched instead of the file itself
+watch_mask = IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+
+class BookmarkWatcher(threading.Thread):
+    poll_interval = 2.0
+    settle_delay = 0.2
+    # Firefox writes its database on every visit, which is copied to be read, so it is revalidated at most this often
+    firefox_interval = 30.0
+
+    def __init__(
+        self,
+        index: BookmarkIndex,
+        use_inotify: bool = True,
+        snapshot: Optional[IndexSnapshot] = None,
+    ) -> None:
+        """
+        Initializes the BookmarkWatcher thread, which keeps the bookmark index up to date
+        in the background, so queries never have to touch the disk.
+        Once started, an empty index is restored from the snapshot first, so queries are served from it
+        while the bookmarks files are found and revalidated.
+
+        Parameters:
+            index (BookmarkIndex): The index to refresh
+            use_inotify (bool): Whether to use inotify, falls back to polling if disabled or unavailable
+            snapshot (Optional[IndexSnapshot]): The snapshot to restore from and to update whenever the index changed
+        """
+        super(BookmarkWatcher, self).__init__(name="BookmarkWatcher", daemon=True)
+        self.index = index
+        self.use_inotify = use_inotify
+        self.snapshot = snapshot
+        self.saved_generation = index.generation
+        self.bookmarks_paths: Dict[str, str] = {}
+        # Finds the bookmarks paths to watch and whether it only finds some of them, set by discover
+        # and run on this thread
+        self.discovery: Optional[Tuple[Callable[[], List[Tuple[str, str]]], bool]] = (
+            None
+        )
+        # Callbacks run periodically on this thread with the current bookmarks paths, with their interval and next run
+        self.tasks: List[
+            Tuple[Callable[[List[Tuple[str, str]]], None], float, List[float]]
+        ] = []
+        # When each Firefox database was last revalidated, and the ones whose changes wait for the next revalidation
+        self.revalidated_at: Dict[str, float] = {}
+        self.deferred_paths: Dict[str, str] = {}
+        self.paths_changed = threading.Event()
+        self.stopped = threading.Event()
+
+    def watch(self, bookmarks_paths: List[Tuple[str, str]]) -> None:
+        """
+        Replaces the watched bookmarks files and revalidates all of them in the background
+
+        Parameters:
+            bookmarks_paths (List[Tuple[str, str]]): A list of tuples containing the path to the bookmarks and the browser name
+        """
+        self.bookmarks_paths = dict(bookmarks_paths)
+        self.paths_changed.set()
+
+    def discover(
+        self, find_paths: Callable[[], List[Tuple[str, str]]], partial: bool = False
+    ) -> None:
+        """
+        Finds the bookmarks files in the background and then watches and revalidates them,
+        so scanning the browser profiles never blocks the extension.
+        A partial discovery does not replace a pending full one, which finds its files as well.
+
+        Parameters:
+            find_paths (Callable[[], List[Tuple[str, str]]]): Returns the paths to the bookmarks and their browser names
+            partial (bool): Whether find_paths only searches some of the files again, e.g. the custom paths
+        """
+        discovery = self.discovery
+        if partial and discovery is not None and not discovery[1]:
+            return
+        self.discovery = (find_paths, partial)
+        self.paths_changed.set()
+
+    def update_paths(self) -> None:
+        """
+        Replaces the watched bookmarks files by the ones found by the pending discover call, if any
+        """
+        discovery, self.discovery = self.discovery, None
+        if discovery is None:
+            return
+        try:
+            self.bookmarks_paths = dict(discovery[0]())
+        except Exception:
+            logger.exception("Could not find the bookmarks files")
+
+    def restore_snapshot(self) -> None:
+        """
+        Fills an empty index from the snapshot, the restored files are revalidated once they are watched
+        """
+        if self.snapshot is None or self.index.sources:
+            return
+        sources = self.snapshot.load()
+        if sources:
+            self.index.restore(sources)
+            self.saved_generation = self.index.generation
+
+    def schedule(
+        self, callback: Callable[[List[Tuple[str, str]]], None], interval: float
+    ) -> None:
+        """
+        Runs a callback on the watcher thread as soon as bookmarks paths are set and then periodically,
+        so slow background work never runs on the query path
+
+        Parameters:
+            callback (Callable[[List[Tuple[str, str]]], None]): The callback, called with the bookmarks paths
+            interval (float): The number of seconds between two runs
+        """
+        self.tasks.append((callback, interval, [0.0]))
+
+    def run_due_tasks(self) -> None:
+        """
+        Runs all scheduled callbacks whose interval passed
+        """
+        bookmarks_paths = list(self.bookmarks_paths.items())
+        if not bookmarks_paths:
+            return
+
+        for callback, interval, next_run in self.tasks:
+            now = time.monotonic()
+            if now < next_run[0]:
+                continue
+            next_run[0] = now + interval
+            try:
+                callback(bookmarks_paths)
+            except Exception:
+                logger.exception("Scheduled task %s failed" % callback)
+
+    def stop(self) -> None:
+        """
+        Stops the watcher thread
+        """
+        self.stopped.set()
+        # Wakes up the polling loop
+        self.paths_changed.set()
+
+    def run(self) -> None:
+        self.restore_snapshot()
+
+        inotify: Optional[Inotify] = None
+        if self.use_inotify:
+            try:
+                inotify = Inotify()
+            except OSError:
+                logger.info("inotify is not available, polling bookmarks instead")
+
+        if inotify is None:
+            self.poll()
+            return
+
+        try:
+            self.listen(inotify)
+        finally:
+            inotify.close()
+
+    def poll(self) -> None:
+        """
+        Checks the signature of every watched file in a fixed interval
+        """
+        while not self.stopped.is_set():
+            if self.paths_changed.is_set():
+                self.paths_changed.clear()
+                self.update_paths()
+                self.refresh_all()
+            else:
+                for bookmarks_path, browser in list(self.bookmarks_paths.items()):
+                    self.refresh_path(bookmarks_path, browser)
+                self.save_snapshot()
+            self.run_due_tasks()
+            # Newly set paths are refreshed right away instead of after the interval
+            self.paths_changed.wait(self.poll_interval)
+
+    def listen(self, inotify: Inotify) -> None:
+        """
+        Refreshes the watched files whenever inotify reports a change in their directory
+
+        Parameters:
+            inotify (Inotify): The inotify instance to listen on
+        """
+        watched_dirs: Dict[str, int] = {}
+
+        while not self.stopped.is_set():
+            if self.paths_changed.is_set():
+                self.paths_changed.clear()
+                self.update_paths()
+                watched_dirs = self.update_watches(inotify, watched_dirs)
+                # Picks up changes that happened before the directories were watched
+                self.refresh_all()
+
+            self.run_due_tasks()
+            self.refresh_deferred()
+            readable, _, _ = select.select([inotify.fd], [], [], 0.5)
+            if not readable:
+                continue
+
+            # Wait for the browser to finish its write, so a burst of events causes a single reload
+            time.sleep(self.settle_delay)
+            changed_paths = set()
+            for directory, _mask, name in inotify.read_events():
+                # Firefox writes most changes to the write-ahead log of its database
+                if name.endswith("-wal"):
+                    name = name[: -len("-wal")]
+                changed_paths.add(os.path.join(directory, name))
+
+            bookmarks_paths = self.bookmarks_paths
+            for changed_path in changed_paths:
+                browser = bookmarks_paths.get(changed_path)
+                if browser is not None:
+                    self.refresh_path(changed_path, browser)
+            self.save_snapshot()
+
+    def refresh_all(self) -> None:
+        """
+        Revalidates all watched files and saves the snapshot, logging instead of ending the thread on failures
+        """
+        try:
+            self.index.refresh(list(self.bookmarks_paths.items()))
+        except Exception:
+            logger.exception("Could not refresh the bookmarks files")
+        self.save_snapshot()
+
+    def refresh_path(self, bookmarks_path: str, browser: str) -> None:
+        """
+        Revalidates a single watched file, logging instead of ending the thread if it fails,
+        as the file is revalidated again on its next change
+
+        Parameters:
+            bookmarks_path (str): The path to the bookmarks
+            browser (str): The browser name (used to match the icon)
+        """
+        if FirefoxSource.is_places(bookmarks_path) and self.defer_revalidation(
+            bookmarks_path, browser
+        ):
+            return
+        try:
+            self.index.refresh_path(bookmarks_path, browser)
+        except Exception:
+            logger.exception("Could not refresh %s" % bookmarks_path)
+
+    def defer_revalidation(self, places_path: str, browser: str) -> bool:
+        """
+        Checks if a changed Firefox database was copied too recently and remembers it to be revalidated later if so
+
+        Parameters:
+            places_path (str): The path to the places.sqlite database
+            browser (str): The browser name (used to match the icon)
+
+        Returns:
+            bool: True if the revalidation is deferred, False if it should happen now
+        """
+        source = self.index.sources.get(places_path)
+        # New databases are read right away, unchanged ones are not copied at all
+        if source is None or source.signature == FirefoxSource.stat_signature(
+            places_path
+        ):
+            self.deferred_paths.pop(places_path, None)
+            return False
+
+        now = time.monotonic()
+        if (
+            now
+            < self.revalidated_at.get(places_path, -math.inf) + self.firefox_interval
+        ):
+            self.deferred_paths[places_path] = browser
+            return True
+        self.revalidated_at[places_path] = now
+        self.deferred_paths.pop(places_path, None)
+        return False
+
+    def refresh_deferred(self) -> None:
+        """
+        Revalidates the Firefox databases whose changes were deferred, once their interval passed
+        """
+        if not self.deferred_paths:
+            return
+        bookmarks_paths = self.bookmarks_paths
+        for bookmarks_path, browser in list(self.deferred_paths.items()):
+            if bookmarks_paths.get(bookmarks_path) != browser:
+                # No longer watched
+                del self.deferred_paths[bookmarks_path]
+                continue
+            self.refresh_path(bookmarks_path, browser)
+        self.save_snapshot()
+
+    def save_snapshot(self) -> None:
+        """
+        Writes the snapshot if the index changed since it was last written
+        """
+        generation = self.index.generation
+        if self.snapshot is None or generation == self.saved_generation:
+            return
+        self.snapshot.save(self.index.sources)
+        self.saved_generation = generation
+
+    def update_watches(
+        self, inotify: Inotify, watched_dirs: Dict[str, int]
+    ) -> Dict[str, int]:
+        """
+        Watches the directories of the current bookmarks files and stops watching all others
+
+        Parameters:
+            inotify (Inotify): The inotify instance
+            watched_dirs (Dict[str, int]): The currently watched directories and their watch descriptors
+
+        Returns:
+            Dict[str, int]: The watched directories and their watch descriptors
+        """
+        dirs = {os.path.dirname(path) for path in self.bookmarks_paths}
+        updated_dirs: Dict[str, int] = {}
+
+        for directory, wd in watched_dirs.items():
+            if directory in dirs and wd in inotify.watches:
+                updated_dirs[directory] = wd
+            else:
+                inotify.remove_watch(wd)
+
+        for directory in dirs - set(updated_dirs):
+            wd = inotify.add_watch(directory, watch_mask)
+            if wd is not None:
+                updated_dirs[directory] = wd
+
+        return updated_dirs
@@ -0,0 +1,341 @@
+import hashlib
+import logging
+import marshal
+import os
+import shutil
+import sqlite3
+import tempfile
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# The bitmap id, width and page URL of a favicon
+IconRow = Tuple[int, int, str]
+
+hosts_file_name = "hosts.marshal"
+
+
+class FaviconStore:
+    sync_interval = 600.0
+    # The total size of the cached PNG files, no new icons are extracted once it is reached
+    max_cache_size = 16 * 1024 * 1024
+    # The width of the bitmap preferred for a result item, larger bitmaps are only used if there is no smaller one
+    preferred_width = 32
+    query_chunk_size = 500
+
+    def __init__(self, icons_dir: str, max_cache_size: Optional[int] = None) -> None:
+        """
+        Initializes the FaviconStore class, which extracts the favicons of the bookmarked sites from the
+        Favicons database next to each Bookmarks file into a content-addressed PNG cache.
+        Looking up the icon of a bookmark is a single lookup of its host in memory.
+
+        Parameters:
+            icons_dir (str): The directory to store the PNG files and the hosts mapping in
+            max_cache_size (Optional[int]): The total size of the PNG files in bytes, max_cache_size if None
+        """
+        self.icons_dir = icons_dir
+        if max_cache_size is not None:
+            self.max_cache_size = max_cache_size
+        # The mtime of each Favicons database at the last sync
+        self.mtimes: Dict[str, int] = {}
+        # Swapped as a whole after each sync, so readers can look up hosts without locking
+        self.icons: Dict[str, str] = {}
+        self.load()
+
+    @staticmethod
+    def host(url: str) -> str:
+        """
+        Returns the host of a URL, which the icons are keyed by
+
+        Parameters:
+            url (str): The URL
+
+        Returns:
+            str: The lower case host or an empty string if the URL has none
+        """
+        try:
+            return urlsplit(url).hostname or ""
+        except ValueError:
+            return ""
+
+    def icon(self, url: str) -> Optional[str]:
+        """
+        Returns the cached favicon of the site of a URL
+
+        Parameters:
+            url (str): The URL of the bookmark
+
+        Returns:
+            Optional[str]: The path to the PNG file or None if there is no favicon of the site
+        """
+        return self.icons.get(FaviconStore.host(url))
+
+    def sync(
+        self, bookmarks_paths: List[Tuple[str, str]], bookmarked_urls: Set[str]
+    ) -> None:
+        """
+        Extracts the favicons of newly bookmarked sites and of changed Favicons databases, then evicts unused icons
+
+        Parameters:
+            bookmarks_paths (List[Tuple[str, str]]): A list of tuples containing the path to the bookmarks and the browser name
+            bookmarked_urls (Set[str]): The URLs of all bookmarks
+        """
+        hosts = {FaviconStore.host(url) for url in bookmarked_urls}
+        hosts.discard("")
+        icons = {host: path for host, path in self.icons.items() if host in hosts}
+        missing_hosts = hosts - set(icons)
+
+        favicons_paths = {
+            os.path.join(os.path.dirname(bookmarks_path), "Favicons")
+            for bookmarks_path, _browser in bookmarks_paths
+        }
+        mtimes: Dict[str, int] = {}
+        for favicons_path in sorted(favicons_paths):
+            try:
+                if not os.path.isfile(favicons_path):
+                    continue
+                mtime = os.stat(favicons_path).st_mtime_ns
+                mtimes[favicons_path] = mtime
+                if mtime != self.mtimes.get(favicons_path):
+                    # Icons of known sites may have changed as well
+                    icons.update(self.extract(favicons_path, hosts, icons))
+                elif missing_hosts:
+                    icons.update(self.extract(favicons_path, missing_hosts, icons))
+                missing_hosts = hosts - set(icons)
+            except (OSError, sqlite3.Error):
+                logger.exception("Could not read favicons %s" % favicons_path)
+                mtimes.pop(favicons_path, None)
+
+        self.mtimes = mtimes
+        self.icons = self.evict(icons)
+        self.save()
+
+    def extract(
+        self, favicons_path: str, hosts: Set[str], icons: Dict[str, str]
+    ) -> Dict[str, str]:
+        """
+        Writes the favicons of the given hosts from a snapshot copy of a Favicons database, as the browser keeps it locked
+
+        Parameters:
+            favicons_path (str): The path to the Favicons database
+            hosts (Set[str]): The hosts to extract the favicons of
+            icons (Dict[str, str]): The icons extracted so far, used to keep the cache within its size
+
+        Returns:
+            Dict[str, str]: The paths to the written PNG files by host
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            snapshot_path = os.path.join(tmp_dir, "Favicons")
+            shutil.copyfile(favicons_path, snapshot_path)
+            for suffix in ("-wal", "-journal"):
+                if os.path.isfile(favicons_path + suffix):
+                    shutil.copyfile(favicons_path + suffix, snapshot_path + suffix)
+
+            connection = sqlite3.connect("file:%s?mode=ro" % snapshot_path, uri=True)
+            try:
+                rows: List[IconRow] = connection.execute(
+                    "SELECT b.id, b.width, m.page_url FROM icon_mapping m "
+                    "JOIN favicon_bitmaps b ON b.icon_id = m.icon_id WHERE length(b.image_data) > 0"
+                ).fetchall()
+
+                bitmap_ids = FaviconStore.best_bitmaps(
+                    rows, hosts, self.preferred_width
+                )
+                ids = sorted(set(bitmap_ids.values()))
+                images: Dict[int, bytes] = {}
+                for start in range(0, len(ids), self.query_chunk_size):
+                    chunk = ids[start : start + self.query_chunk_size]
+                    images.update(
+                        connection.execute(
+                            "SELECT id, image_data FROM favicon_bitmaps WHERE id IN (%s)"
+                            % ",".join("?" * len(chunk)),
+                            chunk,
+                        ).fetchall()
+                    )
+            finally:
+                connection.close()
+
+        os.makedirs(self.icons_dir, exist_ok=True)
+        cache_size = self.cache_size(set(icons.values()))
+        extracted: Dict[str, str] = {}
+        written: Dict[int, str] = {}
+        for host, bitmap_id in bitmap_ids.items():
+            icon_path = written.get(bitmap_id)
+            if icon_path is None:
+                image_data = bytes(images[bitmap_id])
+                icon_path = self.icon_path(image_data)
+                if not os.path.isfile(icon_path):
+                    if cache_size + len(image_data) > self.max_cache_size:
+                        continue
+                    self.write_icon(icon_path, image_data)
+                    cache_size += len(image_data)
+                written[bitmap_id] = icon_path
+            extracted[host] = icon_path
+        return extracted
+
+    @staticmethod
+    def best_bitmaps(
+        rows: List[IconRow], hosts: Set[str], preferred_width: int
+    ) -> Dict[str, int]:
+        """
+        Picks a bitmap per host, the smallest one at least preferred_width wide or else the widest one
+
+        Parameters:
+            rows (List[IconRow]): The bitmap id, width and page URL of every favicon
+            hosts (Set[str]): The hosts to pick a bitmap for
+            preferred_width (int): The width of the bitmap preferred for a result item
+
+        Returns:
+            Dict[str, int]: The bitmap id by host
+        """
+        best: Dict[str, Tuple[int, int]] = {}
+        for bitmap_id, width, page_url in rows:
+            host = FaviconStore.host(page_url)
+            if host not in hosts:
+                continue
+            # Sorts the widths from preferred_width upwards, followed by the smaller ones from the widest down
+            rank = (
+                width - preferred_width
+                if width >= preferred_width
+                else preferred_width - width + (1 << 16)
+            )
+            previous = best.get(host)
+            if previous is None or rank < previous[0]:
+                best[host] = (rank, bitmap_id)
+        return {host: bitmap_id for host, (_rank, bitmap_id) in best.items()}
+
+    def icon_path(self, image_data: bytes) -> str:
+        """
+        Returns the path of the PNG file of an image, named by the hash of its content,
+        so sites sharing an icon (e.g. the subdomains of a site) share a single file
+
+        Parameters:
+            image_data (bytes): The PNG image
+
+        Returns:
+            str: The path to the PNG file
+        """
+        return os.path.join(
+            self.icons_dir, "%s.png" % hashlib.sha1(image_data).hexdigest()
+        )
+
+    @staticmethod
+    def write_icon(icon_path: str, image_data: bytes) -> None:
+        """
+        Writes a PNG file atomically, so a result item never shows a partially written icon
+
+        Parameters:
+            icon_path (str): The path to the PNG file
+            image_data (bytes): The PNG image
+        """
+        tmp_path = "%s.tmp" % icon_path
+        with open(tmp_path, "wb") as icon_file:
+            icon_file.write(image_data)
+        os.replace(tmp_path, icon_path)
+
+    def cached_files(self) -> List[Tuple[str, int, int]]:
+        """
+        Returns the PNG files of the cache
+
+        Returns:
+            List[Tuple[str, int, int]]: The path, size and mtime of each file
+        """
+        files: List[Tuple[str, int, int]] = []
+        try:
+            with os.scandir(self.icons_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".png"):
+                        stat = entry.stat()
+                        files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            pass
+        return files
+
+    def cache_size(self, icon_paths: Set[str]) -> int:
+        """
+        Returns the total size of the given cached PNG files
+
+        Parameters:
+            icon_paths (Set[str]): The paths to the PNG files
+
+        Returns:
+            int: The size in bytes
+        """
+        return sum(
+            size for path, size, _mtime in self.cached_files() if path in icon_paths
+        )
+
+    def evict(self, icons: Dict[str, str]) -> Dict[str, str]:
+        """
+        Removes the PNG files no host uses anymore, then the oldest ones until the cache fits into max_cache_size
+
+        Parameters:
+            icons (Dict[str, str]): The paths to the PNG files by host
+
+        Returns:
+            Dict[str, str]: The icons whose files were kept
+        """
+        used_paths = set(icons.values())
+        kept_files: List[Tuple[str, int, int]] = []
+        removed_paths: Set[str] = set()
+        for path, size, mtime in self.cached_files():
+            if path in used_paths:
+                kept_files.append((path, size, mtime))
+            else:
+                removed_paths.add(path)
+
+        cache_size = sum(size for _path, size, _mtime in kept_files)
+        # Oldest first
+        kept_files.sort(key=lambda cached_file: cached_file[2])
+        for path, size, _mtime in kept_files:
+            if cache_size <= self.max_cache_size:
+                break
+            removed_paths.add(path)
+            cache_size -= size
+
+        for path in removed_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                logger.exception("Could not remove favicon %s" % path)
+
+        kept_paths = {
+            path for path, _size, _mtime in kept_files if path not in removed_paths
+        }
+        return {host: path for host, path in icons.items() if path in kept_paths}
+
+    def load(self) -> None:
+        """
+        Loads the persisted hosts mapping, dropping hosts whose PNG file is gone
+        """
+        hosts_path = os.path.join(self.icons_dir, hosts_file_name)
+        if not os.path.isfile(hosts_path):
+            return
+
+        try:
+            with open(hosts_path, "rb") as hosts_file:
+                mtimes, icons = marshal.loads(hosts_file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            logger.exception("Could not read favicons cache %s" % hosts_path)
+            return
+
+        cached_paths = {path for path, _size, _mtime in self.cached_files()}
+        self.mtimes = mtimes
+        self.icons = {
+            host: path for host, path in icons.items() if path in cached_paths
+        }
+
+    def save(self) -> None:
+        """
+        Persists the hosts mapping
+        """
+        hosts_path = os.path.join(self.icons_dir, hosts_file_name)
+        tmp_path = "%s.tmp" % hosts_path
+        try:
+            os.makedirs(self.icons_dir, exist_ok=True)
+            with open(tmp_path, "wb") as hosts_file:
+                marshal.dump((self.mtimes, self.icons), hosts_file)
+            os.replace(tmp_path, hosts_path)
+        except (OSError, ValueError):
+            logger.exception("Could not write favicons cache %s" % hosts_path)
@@ -0,0 +1,47 @@
+import configparser
+import logging
+import os
+from typing import List
+
+from .FirefoxSource import places_file_name
+
+logger = logging.getLogger(__name__)
+
+
+class FirefoxProfiles:
+    @staticmethod
+    def find(root: str) -> List[str]:
+        """
+        Finds the bookmarks databases of all profiles listed in the profiles.ini of a Firefox based browser
+
+        Parameters:
+            root (str): The directory containing profiles.ini, e.g. ~/.mozilla/firefox
+
+        Returns:
+            List[str]: The paths to the places.sqlite databases of the profiles
+        """
+        profiles_ini = os.path.join(root, "profiles.ini")
+        if not os.path.isfile(profiles_ini):
+            return []
+
+        parser = configparser.ConfigParser(interpolation=None)
+        try:
+            parser.read(profiles_ini, encoding="utf-8")
+        except (configparser.Error, UnicodeDecodeError):
+            logger.exception("Could not read %s" % profiles_ini)
+            return []
+
+        places_paths: List[str] = []
+        for section in parser.sections():
+            if not section.startswith("Profile") or "Path" not in parser[section]:
+                continue
+
+            profile_path = parser[section]["Path"]
+            if parser[section].get("IsRelative", "1") == "1":
+                profile_path = os.path.join(root, profile_path)
+
+            places_path = os.path.join(profile_path, places_file_name)
+            if os.path.isfile(places_path) and places_path not in places_paths:
+                places_paths.append(places_path)
+
+        return places_paths
@@ -0,0 +1,426 @@
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from querier import Bookmark, Scorer
+from querier.FuzzyMatcher import FuzzyMatcher
+from querier.QueryCache import Terms
+
+logger = logging.getLogger(__name__)
+
+Signature = Tuple[int, int, int]
+
+places_file_name = "places.sqlite"
+
+# The folder names shown for the roots of the bookmarks tree, which are stored untranslated
+root_names = {
+    "menu________": "Bookmarks Menu",
+    "toolbar_____": "Bookmarks Toolbar",
+    "unfiled_____": "Other Bookmarks",
+    "mobile______": "Mobile Bookmarks",
+}
+# Tags are stored as folders below this root, their entries are not bookmarks of their own
+tags_root = "tags________"
+
+bookmark_type = 1
+folder_type = 2
+
+# The folder tree is not kept for databases, so a scope segment is matched against the parent folder names
+scope_condition = "instr(substr(folder_search_text, 1, length(folder_search_text) - length(search_text)), ?) > 0"
+
+
+class FirefoxSource:
+    # The number of matches fetched first, which are ranked with the matches of all other files before fetching more
+    fetch_size = 200
+    # How many times as many matches each following query fetches
+    fetch_growth = 8
+    # FTS5 only looks up terms with at least one trigram, shorter terms are checked by scanning
+    min_indexed_term_len = 3
+
+    def __init__(
+        self,
+        path: str,
+        browser: str,
+        signature: Signature,
+        connection: sqlite3.Connection,
+        marker: Tuple[int, int],
+        fts: bool,
+    ) -> None:
+        """
+        Initializes the FirefoxSource class, a single places.sqlite database. Instead of keeping the bookmarks in memory,
+        they are kept in a local database with a full text index, which answers the queries.
+
+        Parameters:
+            path (str): The path to the places.sqlite database
+            browser (str): The browser name (used to match the icon)
+            signature (Signature): The mtime, size and inode of the database when it was read
+            connection (sqlite3.Connection): The connection to the local database, kept open for all queries
+            marker (Tuple[int, int]): The number and last modification time of the bookmarks, used to skip rebuilds
+            fts (bool): Whether the local database has a full text index, otherwise all rows are scanned
+        """
+        self.path = path
+        self.browser = browser
+        self.signature = signature
+        self.connection = connection
+        self.marker = marker
+        self.fts = fts
+        # The connection is shared by the query thread and the watcher thread
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_places(bookmarks_path: str) -> bool:
+        """
+        Checks if a bookmarks path points to a Firefox database instead of a Chromium Bookmarks file
+
+        Parameters:
+            bookmarks_path (str): The path to the bookmarks
+
+        Returns:
+            bool: True if the path is a places.sqlite database, False otherwise
+        """
+        return os.path.basename(bookmarks_path) == places_file_name
+
+    @staticmethod
+    def stat_signature(places_path: str) -> Optional[Signature]:
+        """
+        Returns the signature used to detect changes of the database, which includes its write-ahead log
+
+        Parameters:
+            places_path (str): The path to the places.sqlite database
+
+        Returns:
+            Optional[Signature]: The mtime, size and inode of the database or None if it does not exist
+        """
+        try:
+            stat = os.stat(places_path)
+        except OSError:
+            logger.info("Bookmarks database %s is not accessible" % places_path)
+            return None
+
+        mtime, size = stat.st_mtime_ns, stat.st_size
+        try:
+            wal_stat = os.stat(places_path + "-wal")
+            mtime, size = max(mtime, wal_stat.st_mtime_ns), size + wal_stat.st_size
+        except OSError:
+            pass
+        return (mtime, size, stat.st_ino)
+
+    @staticmethod
+    def load(
+        places_path: str,
+        browser: str,
+        signature: Signature,
+        previous: Optional["FirefoxSource"] = None,
+    ) -> Optional["FirefoxSource"]:
+        """
+        Reads the bookmarks from a snapshot copy of the database, as the browser keeps it locked.
+        If the bookmarks did not change since the previous source was built (e.g. only the history changed),
+        the previous source is kept.
+
+        Parameters:
+            places_path (str): The path to the places.sqlite database
+            browser (str): The browser name (used to match the icon)
+            signature (Signature): The signature of the database
+            previous (Optional[FirefoxSource]): The source previously built from the database
+
+        Returns:
+            Optional[FirefoxSource]: The source or None if the database could not be read
+        """
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                snapshot_path = os.path.join(tmp_dir, places_file_name)
+                shutil.copyfile(places_path, snapshot_path)
+                if os.path.isfile(places_path + "-wal"):
+                    shutil.copyfile(places_path + "-wal", snapshot_path + "-wal")
+
+                places = sqlite3.connect("file:%s?mode=ro" % snapshot_path, uri=True)
+                try:
+                    count, last_modified = places.execute(
+                        "SELECT COUNT(*), COALESCE(MAX(lastModified), 0) FROM moz_bookmarks"
+                    ).fetchone()
+                    marker = (count, last_modified)
+                    if (
+                        previous is not None
+                        and previous.marker == marker
+                        and previous.browser == browser
+                    ):
+                        previous.signature = signature
+                        return previous
+
+                    rows = places.execute(
+                        "SELECT b.id, b.parent, b.type, b.title, b.guid, p.url, COALESCE(p.frecency, 0) "
+                        "FROM moz_bookmarks b LEFT JOIN moz_places p ON b.fk = p.id ORDER BY b.parent, b.position"
+                    ).fetchall()
+                finally:
+                    places.close()
+        except (OSError, sqlite3.Error):
+            logger.exception("Could not read bookmarks database %s" % places_path)
+            return None
+
+        connection, fts = FirefoxSource.build(FirefoxSource.bookmarks(rows))
+        return FirefoxSource(places_path, browser, signature, connection, marker, fts)
+
+    @staticmethod
+    def bookmarks(
+        rows: List[Tuple[int, int, int, Optional[str], str, Optional[str], int]],
+    ) -> List[Tuple[Bookmark, int]]:
+        """
+        Turns the rows of moz_bookmarks into bookmarks with the names of their parent folders
+
+        Parameters:
+            rows (List[Tuple[int, int, int, Optional[str], str, Optional[str], int]]): The id, parent, type, title,
+                guid, URL and frecency of each row
+
+        Returns:
+            List[Tuple[Bookmark, int]]: The bookmarks and their frecency
+        """
+        folders: Dict[int, Tuple[int, str, str]] = {}
+        for row_id, parent, row_type, title, guid, _url, _frecency in rows:
+            if row_type == folder_type or parent == 0:
+                folders[row_id] = (parent, root_names.get(guid, title or ""), guid)
+
+        # Same format as the Chromium folders, e.g. " Bookmarks Toolbar Python"
+        folder_names: Dict[int, Optional[str]] = {}
+
+        def folder_name(folder_id: int) -> Optional[str]:
+            if folder_id in folder_names:
+                return folder_names[folder_id]
+            folder = folders.get(folder_id)
+            if folder is None or folder[0] == 0:
+                # The invisible root folder
+                name: Optional[str] = ""
+            elif folder[2] == tags_root:
+                name = None
+            else:
+                parent_name = folder_name(folder[0])
+                name = None if parent_name is None else f"{parent_name} {folder[1]}"
+            folder_names[folder_id] = name
+            return name
+
+        bookmarks: List[Tuple[Bookmark, int]] = []
+        for _row_id, parent, row_type, title, _guid, url, frecency in rows:
+            # Skips separators and smart folders (place: URLs)
+            if row_type != bookmark_type or not url or url.startswith("place:"):
+                continue
+            folder = folder_name(parent)
+            if folder is None:
+                continue
+            bookmarks.append((Bookmark(title or url, url, folder), frecency))
+        return bookmarks
+
+    @staticmethod
+    def build(bookmarks: List[Tuple[Bookmark, int]]) -> Tuple[sqlite3.Connection, bool]:
+        """
+        Writes the bookmarks into a new in-memory database with a trigram full text index over the search texts
+
+        Parameters:
+            bookmarks (List[Tuple[Bookmark, int]]): The bookmarks and their frecency
+
+        Returns:
+            Tuple[sqlite3.Connection, bool]: The connection and whether the full text index is available
+        """
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+        columns = (
+            "search_text, folder_search_text, name, url, folder, name_end, frecency"
+        )
+        try:
+            connection.execute(
+                "CREATE VIRTUAL TABLE bookmarks USING fts5("
+                "search_text, folder_search_text, name UNINDEXED, url UNINDEXED, folder UNINDEXED, "
+                "name_end UNINDEXED, frecency UNINDEXED, tokenize='trigram')"
+            )
+            fts = True
+        except sqlite3.OperationalError:
+            # The trigram tokenizer needs SQLite 3.34
+            logger.info(
+                "SQLite has no FTS5 trigram tokenizer, Firefox bookmarks are scanned instead"
+            )
+            connection.execute("CREATE TABLE bookmarks (%s)" % columns)
+            fts = False
+
+        connection.executemany(
+            "INSERT INTO bookmarks (%s) VALUES (?, ?, ?, ?, ?, ?, ?)" % columns,
+            [
+                (
+                    bookmark.search_text,
+                    bookmark.folder_search_text,
+                    bookmark.name,
+                    bookmark.url,
+                    bookmark.folder,
+                    bookmark.name_end,
+                    frecency,
+                )
+                for bookmark, frecency in bookmarks
+            ],
+        )
+        connection.commit()
+        return connection, fts
+
+    def has_folder(self, scope: List[str]) -> bool:
+        """
+        Returns whether any bookmark lies below folders matching a scope, as search would return
+
+        Parameters:
+            scope (List[str]): Normalized folder name prefixes, each has to be contained in the parent folder names
+
+        Returns:
+            bool: True if a bookmark lies below matching folders
+        """
+        sql = "SELECT 1 FROM bookmarks WHERE %s LIMIT 1" % " AND ".join(
+            [scope_condition] * len(scope)
+        )
+        with self.lock:
+            return self.connection.execute(sql, scope).fetchone() is not None
+
+    def search(
+        self,
+        terms: Terms,
+        filter_by_folders: bool = False,
+        scope: Optional[List[str]] = None,
+        fuzzy: bool = False,
+        scorer: Optional[Scorer] = None,
+        boosts: Optional[Dict[str, float]] = None,
+        rank: Optional[Callable[[List[Bookmark]], float]] = None,
+    ) -> List[Bookmark]:
+        """
+        Looks up the bookmarks that match all terms, ordered by an upper bound of their score computed in SQL,
+        the staged bound rank_entries checks first: whether each term starts the title, occurs in the title or URL,
+        or only in the folders or with a typo, plus the URL length and frecency bonuses.
+        The first fetch_size bookmarks are passed to rank, which returns the score a bookmark has to beat to be kept.
+        No more bookmarks are fetched once the bound of the last one does not beat it, as no later one can be kept
+        either, so the best bookmarks are never cut off. Otherwise fetch_growth times as many are fetched next.
+        All matches are fetched at once if rank is not given.
+
+        Parameters:
+            terms (Terms): The normalized query terms
+            filter_by_folders (bool, optional): Whether the parent folder names are matched as well
+            scope (Optional[List[str]], optional): Normalized folder name prefixes, each has to be contained
+                in the parent folder names if given
+            fuzzy (bool, optional): Whether terms of at least FuzzyMatcher.min_term_len characters also match with a typo
+            scorer (Optional[Scorer], optional): The scorer whose weights the bound is computed with
+            boosts (Optional[Dict[str, float]], optional): The frecency boost of each URL between 0 and 1, if any
+            rank (Optional[Callable[[List[Bookmark]], float]], optional): Ranks a batch of fetched bookmarks
+                and returns the score a later bookmark has to beat
+
+        Returns:
+            List[Bookmark]: The fetched bookmarks, best bound first
+        """
+        column = "folder_search_text" if filter_by_folders else "search_text"
+        conditions: List[str] = []
+        parameters: List[object] = []
+
+        for segment in scope or ():
+            conditions.append(scope_condition)
+            parameters.append(segment)
+
+        matcher = FuzzyMatcher(terms) if fuzzy else None
+        if matcher is not None and not matcher.is_fuzzy():
+            matcher = None
+
+        if matcher is not None:
+            # The candidates are looked up by the spellings of the terms and verified in Python
+            match_expression = matcher.match_expression(column) if self.fts else None
+            if match_expression is not None:
+                conditions.append("bookmarks MATCH ?")
+                parameters.append(match_expression)
+            conditions.append("fuzzy_match(%s)" % column)
+        else:
+            indexed_terms = [
+                term for term in terms if len(term) >= self.min_indexed_term_len
+            ]
+            if self.fts and indexed_terms:
+                conditions.append("bookmarks MATCH ?")
+                parameters.append(
+                    " AND ".join(
+                        '%s : "%s"' % (column, term.replace('"', '""'))
+                        for term in indexed_terms
+                    )
+                )
+            for term in terms:
+                if not self.fts or term not in indexed_terms:
+                    conditions.append("instr(%s, ?) > 0" % column)
+                    parameters.append(term)
+
+        if scorer is None:
+            scorer = Scorer()
+        bound, bound_parameters = FirefoxSource.bound_expression(
+            terms, scorer, bool(boosts)
+        )
+        sql = (
+            "SELECT name, url, folder, search_text, folder_search_text, name_end, %s AS bound FROM bookmarks"
+            % bound
+            + (" WHERE " + " AND ".join(conditions) if conditions else "")
+            # Firefox's own frecency orders bookmarks with the same bound, as earlier matches win ties
+            + " ORDER BY bound DESC, frecency DESC, rowid LIMIT ? OFFSET ?"
+        )
+
+        bookmarks: List[Bookmark] = []
+        with self.lock:
+            if matcher is not None:
+                # Registering the function again replaces the one of the previous query
+                self.connection.create_function("fuzzy_match", 1, matcher.matches)
+            if boosts:
+                self.connection.create_function(
+                    "frecency_score",
+                    1,
+                    lambda url: scorer.frecency_score(boosts.get(url, 0.0)),
+                )
+            # Each query only sorts the bookmarks it returns, so the limit grows until no more of them can be kept
+            limit = self.fetch_size if rank is not None else -1
+            while True:
+                rows = self.connection.execute(
+                    sql, bound_parameters + parameters + [limit, len(bookmarks)]
+                ).fetchall()
+                batch = [Bookmark.restore(*row[:-1]) for row in rows]
+                bookmarks.extend(batch)
+                if rank is None:
+                    break
+                threshold = rank(batch)
+                # The bounds only decrease, so no later bookmark can be kept once the last one can not
+                if len(rows) < limit or rows[-1][-1] <= threshold:
+                    break
+                limit *= self.fetch_growth
+        return bookmarks
+
+    @staticmethod
+    def bound_expression(
+        terms: Terms, scorer: Scorer, boosted: bool
+    ) -> Tuple[str, List[object]]:
+        """
+        Returns the SQL expression of an upper bound of the score of a bookmark, like the staged bound of rank_entries.
+        A term starting the title adds at most max_term_score, one found elsewhere in the title or URL at most
+        max_later_term_score and any other one at most max_inner_term_score, as it is only in the folders or has a typo.
+
+        Parameters:
+            terms (Terms): The normalized query terms
+            scorer (Scorer): The scorer whose weights are used
+            boosted (bool): Whether the frecency_score function is registered and added
+
+        Returns:
+            Tuple[str, List[object]]: The expression and its parameters
+        """
+        # The URL follows the title and a space in the search text
+        parts = [
+            "1.0 - min(length(search_text) - name_end - 1, %d) / %r"
+            % (scorer.url_length_limit, float(scorer.url_length_limit))
+        ]
+        parameters: List[object] = []
+        for term in terms:
+            parts.append(
+                "CASE WHEN substr(search_text, 1, %d) = ? THEN %r "
+                "WHEN instr(search_text, ?) > 0 THEN %r ELSE %r END"
+                % (
+                    len(term),
+                    scorer.max_term_score(),
+                    scorer.max_later_term_score(),
+                    scorer.max_inner_term_score(),
+                )
+            )
+            parameters.extend([term, term])
+        if boosted:
+            parts.append("frecency_score(url)")
+        return "(%s)" % " + ".join(parts), parameters
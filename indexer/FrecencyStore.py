@@ -0,0 +1,222 @@
+import logging
+import marshal
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Chromium stores times as microseconds since 1601-01-01
+chromium_epoch_offset = 11644473600
+
+Visits = Tuple[int, int]
+
+
+class HistoryProfile:
+    def __init__(self) -> None:
+        """
+        Initializes the HistoryProfile class, the synced visits of a single History database.
+        """
+        # The mtime of the History file at the last sync
+        self.mtime = -1
+        # The highest last_visit_time read so far, later syncs only read rows visited after it
+        self.watermark = 0
+        # The bookmarked URLs that were looked up in this database
+        self.known_urls: Set[str] = set()
+        # The visit count and last visit time of each bookmarked URL
+        self.visits: Dict[str, Visits] = {}
+
+
+class FrecencyStore:
+    sync_interval = 300.0
+    # A URL visited this often gets the full visit factor
+    max_visits = 200
+    half_life_days = 30.0
+    query_chunk_size = 500
+
+    def __init__(self, cache_path: Optional[str] = None) -> None:
+        """
+        Initializes the FrecencyStore class, which syncs the visits of bookmarked URLs from the History database
+        next to each Bookmarks file and turns them into a boost between 0 and 1 per URL.
+
+        Parameters:
+            cache_path (Optional[str]): The file to persist the synced visits in, nothing is persisted if None
+        """
+        self.cache_path = cache_path
+        self.profiles: Dict[str, HistoryProfile] = {}
+        # Swapped as a whole after each sync, so readers can look up URLs without locking
+        self.boosts: Dict[str, float] = {}
+        self.load()
+
+    def sync(
+        self, bookmarks_paths: List[Tuple[str, str]], bookmarked_urls: Set[str]
+    ) -> None:
+        """
+        Reads the visits that changed since the last sync and recomputes the boosts
+
+        Parameters:
+            bookmarks_paths (List[Tuple[str, str]]): A list of tuples containing the path to the bookmarks and the browser name
+            bookmarked_urls (Set[str]): The URLs of all bookmarks
+        """
+        history_paths = {
+            os.path.join(os.path.dirname(bookmarks_path), "History")
+            for bookmarks_path, _browser in bookmarks_paths
+        }
+        profiles = {
+            path: self.profiles.get(path) or HistoryProfile() for path in history_paths
+        }
+
+        for history_path, profile in profiles.items():
+            try:
+                self.sync_profile(history_path, profile, bookmarked_urls)
+            except (OSError, sqlite3.Error):
+                logger.exception("Could not read history %s" % history_path)
+
+        self.profiles = profiles
+        self.boosts = self.compute_boosts(time.time())
+        self.save()
+
+    def sync_profile(
+        self, history_path: str, profile: HistoryProfile, bookmarked_urls: Set[str]
+    ) -> None:
+        """
+        Syncs the visits of a single History database from a snapshot copy, as the browser keeps it locked
+
+        Parameters:
+            history_path (str): The path to the History database
+            profile (HistoryProfile): The previously synced visits of the database
+            bookmarked_urls (Set[str]): The URLs of all bookmarks
+        """
+        if not os.path.isfile(history_path):
+            return
+
+        new_urls = bookmarked_urls - profile.known_urls
+        if len(profile.known_urls - bookmarked_urls) > 0:
+            profile.visits = {
+                url: visits
+                for url, visits in profile.visits.items()
+                if url in bookmarked_urls
+            }
+            profile.known_urls = profile.known_urls & bookmarked_urls
+
+        mtime = os.stat(history_path).st_mtime_ns
+        if mtime == profile.mtime and not new_urls:
+            return
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            snapshot_path = os.path.join(tmp_dir, "History")
+            shutil.copyfile(history_path, snapshot_path)
+            for suffix in ("-wal", "-journal"):
+                if os.path.isfile(history_path + suffix):
+                    shutil.copyfile(history_path + suffix, snapshot_path + suffix)
+
+            connection = sqlite3.connect("file:%s?mode=ro" % snapshot_path, uri=True)
+            try:
+                rows: List[Tuple[str, int, int]] = connection.execute(
+                    "SELECT url, visit_count, last_visit_time FROM urls WHERE last_visit_time > ?",
+                    (profile.watermark,),
+                ).fetchall()
+                # URLs bookmarked since the last sync may have been visited before the watermark
+                old_urls = list(new_urls)
+                for start in range(0, len(old_urls), self.query_chunk_size):
+                    chunk = old_urls[start : start + self.query_chunk_size]
+                    rows.extend(
+                        connection.execute(
+                            "SELECT url, visit_count, last_visit_time FROM urls WHERE url IN (%s)"
+                            % ",".join("?" * len(chunk)),
+                            chunk,
+                        ).fetchall()
+                    )
+            finally:
+                connection.close()
+
+        for url, visit_count, last_visit_time in rows:
+            profile.watermark = max(profile.watermark, last_visit_time)
+            if url in bookmarked_urls:
+                profile.visits[url] = (visit_count, last_visit_time)
+
+        profile.known_urls = set(bookmarked_urls)
+        profile.mtime = mtime
+
+    def compute_boosts(self, now: float) -> Dict[str, float]:
+        """
+        Combines the visits of all profiles into a boost per URL, which grows with the visit count
+        and halves every half_life_days since the last visit
+
+        Parameters:
+            now (float): The current unix time
+
+        Returns:
+            Dict[str, float]: The boost between 0 and 1 by URL
+        """
+        visits: Dict[str, Visits] = {}
+        for profile in self.profiles.values():
+            for url, (visit_count, last_visit_time) in profile.visits.items():
+                previous_count, previous_time = visits.get(url, (0, 0))
+                visits[url] = (
+                    previous_count + visit_count,
+                    max(previous_time, last_visit_time),
+                )
+
+        boosts: Dict[str, float] = {}
+        max_visit_factor = math.log1p(self.max_visits)
+        for url, (visit_count, last_visit_time) in visits.items():
+            if visit_count <= 0:
+                continue
+            age_days = (
+                max(0.0, now - (last_visit_time / 1e6 - chromium_epoch_offset)) / 86400
+            )
+            visit_factor = min(1.0, math.log1p(visit_count) / max_visit_factor)
+            boosts[url] = visit_factor * 0.5 ** (age_days / self.half_life_days)
+        return boosts
+
+    def load(self) -> None:
+        """
+        Loads the persisted visits
+        """
+        if self.cache_path is None or not os.path.isfile(self.cache_path):
+            return
+
+        try:
+            with open(self.cache_path, "rb") as cache_file:
+                data = marshal.loads(cache_file.read())
+            for history_path, (mtime, watermark, known_urls, visits) in data.items():
+                profile = HistoryProfile()
+                profile.mtime = mtime
+                profile.watermark = watermark
+                profile.known_urls = set(known_urls)
+                profile.visits = visits
+                self.profiles[history_path] = profile
+        except (OSError, EOFError, ValueError, TypeError):
+            logger.exception("Could not read frecency cache %s" % self.cache_path)
+            self.profiles = {}
+
+        self.boosts = self.compute_boosts(time.time())
+
+    def save(self) -> None:
+        """
+        Persists the synced visits
+        """
+        if self.cache_path is None:
+            return
+
+        data = {
+            history_path: (
+                profile.mtime,
+                profile.watermark,
+                list(profile.known_urls),
+                profile.visits,
+            )
+            for history_path, profile in self.profiles.items()
+        }
+        tmp_path = "%s.tmp" % self.cache_path
+        try:
+            with open(tmp_path, "wb") as cache_file:
+                marshal.dump(data, cache_file)
+            os.replace(tmp_path, self.cache_path)
+        except (OSError, ValueError):
+            logger.exception("Could not write frecency cache %s" % self.cache_path)
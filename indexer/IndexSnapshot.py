@@ -0,0 +1,135 @@
+import logging
+import marshal
+import mmap
+import os
+from typing import Dict, Mapping
+
+from querier import Bookmark, FolderIndex, TrigramIndex
+
+from .BookmarkIndex import BookmarkSource
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSnapshot:
+    # Bump whenever the layout of the snapshot or of the search texts changes
+    version = 3
+
+    def __init__(self, snapshot_path: str) -> None:
+        """
+        Initializes the IndexSnapshot class, which persists the flattened bookmarks, trigram and folder indexes
+        of all files as parallel arrays in a marshal file, so a restarted extension can serve queries right away.
+
+        Parameters:
+            snapshot_path (str): The file to store the snapshot in
+        """
+        self.snapshot_path = snapshot_path
+
+    def save(self, sources: Mapping[str, object]) -> None:
+        """
+        Writes the snapshot, replacing the previous one atomically.
+        Only parsed Bookmarks files are stored, Firefox databases are read again on startup.
+
+        Parameters:
+            sources (Mapping[str, object]): The sources of the index by path
+        """
+        data = {
+            "version": IndexSnapshot.version,
+            "sources": [
+                (
+                    source.path,
+                    source.browser,
+                    source.signature,
+                    [bookmark.name for bookmark in source.entries],
+                    [bookmark.url for bookmark in source.entries],
+                    [bookmark.folder for bookmark in source.entries],
+                    [bookmark.search_text for bookmark in source.entries],
+                    [bookmark.folder_search_text for bookmark in source.entries],
+                    [bookmark.name_end for bookmark in source.entries],
+                    # marshal writes the posting arrays as raw bytes
+                    source.trigram_index.postings,
+                    source.folder_index.names,
+                    source.folder_index.parents,
+                    source.folder_index.starts,
+                    source.folder_index.ends,
+                )
+                for source in sources.values()
+                if isinstance(source, BookmarkSource)
+            ],
+        }
+
+        tmp_path = "%s.tmp" % self.snapshot_path
+        try:
+            with open(tmp_path, "wb") as snapshot_file:
+                marshal.dump(data, snapshot_file)
+            os.replace(tmp_path, self.snapshot_path)
+        except (OSError, ValueError):
+            logger.exception("Could not write index snapshot %s" % self.snapshot_path)
+
+    def load(self) -> Dict[str, BookmarkSource]:
+        """
+        Reads the snapshot. The sources keep the signature of the files they were built from,
+        so files that changed since are detected and reparsed by the next refresh of the index.
+
+        Returns:
+            Dict[str, BookmarkSource]: The parsed files by path, empty if there is no valid snapshot
+        """
+        if not os.path.isfile(self.snapshot_path):
+            return {}
+
+        try:
+            # marshal.load reads the file in many small chunks, decoding a memory map is an order of magnitude faster
+            with open(self.snapshot_path, "rb") as snapshot_file:
+                with mmap.mmap(
+                    snapshot_file.fileno(), 0, access=mmap.ACCESS_READ
+                ) as snapshot_map:
+                    if hasattr(mmap, "MADV_WILLNEED"):
+                        # Reads the whole file ahead after a cold start, instead of faulting it in page by page
+                        snapshot_map.madvise(mmap.MADV_WILLNEED)
+                    data = marshal.loads(snapshot_map)
+
+            if data["version"] != IndexSnapshot.version:
+                return {}
+
+            sources: Dict[str, BookmarkSource] = {}
+            for (
+                path,
+                browser,
+                signature,
+                names,
+                urls,
+                folders,
+                search_texts,
+                folder_search_texts,
+                name_ends,
+                postings,
+                folder_names,
+                folder_parents,
+                folder_starts,
+                folder_ends,
+            ) in data["sources"]:
+                entries = list(
+                    map(
+                        Bookmark.restore,
+                        names,
+                        urls,
+                        folders,
+                        search_texts,
+                        folder_search_texts,
+                        name_ends,
+                    )
+                )
+                sources[path] = BookmarkSource(
+                    path,
+                    browser,
+                    tuple(signature),
+                    entries,
+                    TrigramIndex.restore(postings, len(entries)),
+                    FolderIndex.restore(
+                        folder_names, folder_parents, folder_starts, folder_ends
+                    ),
+                )
+            return sources
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            logger.exception("Could not read index snapshot %s" % self.snapshot_path)
+            return {}
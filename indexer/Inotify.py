@@ -0,0 +1,109 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+event_header = struct.Struct("iIII")
+
+
+class Inotify:
+    def __init__(self) -> None:
+        """
+        Initializes a thin ctypes wrapper around the Linux inotify API.
+
+        Raises:
+            OSError: If inotify is not available on this system
+        """
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc could not be found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not supported by libc")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.watches: Dict[int, str] = {}
+
+    def add_watch(self, path: str, mask: int) -> Optional[int]:
+        """
+        Watches a path for the given events
+
+        Parameters:
+            path (str): The path to watch
+            mask (int): The events to watch for
+
+        Returns:
+            Optional[int]: The watch descriptor or None if the path could not be watched
+        """
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            logger.info("Could not watch %s: %s" % (path, os.strerror(errno)))
+            return None
+        self.watches[wd] = path
+        return wd
+
+    def remove_watch(self, wd: int) -> None:
+        """
+        Stops watching the path of a watch descriptor
+
+        Parameters:
+            wd (int): The watch descriptor
+        """
+        if self.watches.pop(wd, None) is not None:
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> List[Tuple[str, int, str]]:
+        """
+        Reads all pending events without blocking
+
+        Returns:
+            List[Tuple[str, int, str]]: A list of tuples containing the watched path, the event mask and the file name
+        """
+        events: List[Tuple[str, int, str]] = []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return events
+
+        offset = 0
+        while offset + event_header.size <= len(buffer):
+            wd, mask, _cookie, name_len = event_header.unpack_from(buffer, offset)
+            offset += event_header.size
+            name = os.fsdecode(buffer[offset : offset + name_len].rstrip(b"\0"))
+            offset += name_len
+
+            path = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+            if path is not None:
+                events.append((path, mask, name))
+
+        return events
+
+    def close(self) -> None:
+        """
+        Closes the inotify file descriptor and with it all watches
+        """
+        os.close(self.fd)
+        self.watches = {}
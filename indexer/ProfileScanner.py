@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Directories of chromium based browsers, which never contain bookmarks but can be huge
+pruned_dirs = {
+    "AutofillStrikeDatabase",
+    "blob_storage",
+    "BudgetDatabase",
+    "Cache",
+    "CacheStorage",
+    "Code Cache",
+    "component_crx_cache",
+    "Crash Reports",
+    "Crashpad",
+    "databases",
+    "DawnCache",
+    "DawnGraphiteCache",
+    "Download Service",
+    "Extension Rules",
+    "Extension State",
+    "Extensions",
+    "Feature Engagement Tracker",
+    "File System",
+    "GCM Store",
+    "GPUCache",
+    "GraphiteDawnCache",
+    "GrShaderCache",
+    "IndexedDB",
+    "Local Extension Settings",
+    "Local Storage",
+    "optimization_guide_model_store",
+    "OptimizationGuidePredictionModels",
+    "Platform Notifications",
+    "Safe Browsing",
+    "Service Worker",
+    "Session Storage",
+    "Sessions",
+    "ShaderCache",
+    "shared_proto_db",
+    "Site Characteristics Database",
+    "Snapshots",
+    "Storage",
+    "Sync Data",
+    "Sync Extension Settings",
+    "VideoDecodeStats",
+    "Web Applications",
+    "WidevineCdm",
+    "node_modules",
+}
+
+
+class ProfileScanner:
+    max_depth = 5
+
+    def __init__(self, cache_path: Optional[str] = None) -> None:
+        """
+        Initializes the ProfileScanner class, which finds Bookmarks files below a root directory
+        and remembers them, so a root is only walked again once its directories changed.
+
+        Parameters:
+            cache_path (Optional[str]): The file to persist discovered paths in, nothing is persisted if None
+        """
+        self.cache_path = cache_path
+        # Maps each scanned root to the mtimes of the directories its result depends on and the result
+        self.roots: Dict[str, Tuple[Dict[str, int], List[str]]] = {}
+        self.dirty = False
+        self.load()
+
+    def scan(self, root: str) -> List[str]:
+        """
+        Returns the paths of all Bookmarks files below the root directory
+
+        Parameters:
+            root (str): The directory to search in
+
+        Returns:
+            List[str]: The paths to the Bookmarks files
+        """
+        cached = self.roots.get(root)
+        if cached is not None and ProfileScanner.is_unchanged(*cached):
+            return cached[1]
+
+        dir_mtimes: Dict[str, int] = {}
+        bookmarks_paths: List[str] = []
+        self.walk(root, 0, dir_mtimes, bookmarks_paths)
+
+        self.roots[root] = (dir_mtimes, bookmarks_paths)
+        self.dirty = True
+        return bookmarks_paths
+
+    def walk(
+        self,
+        directory: str,
+        depth: int,
+        dir_mtimes: Dict[str, int],
+        bookmarks_paths: List[str],
+    ) -> None:
+        """
+        Recursively searches a directory for Bookmarks files
+
+        Parameters:
+            directory (str): The directory to search in
+            depth (int): The depth of the directory below the root
+            dir_mtimes (Dict[str, int]): The mtimes of all listed directories
+            bookmarks_paths (List[str]): The list to append found Bookmarks files to
+        """
+        try:
+            dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as it:
+                dir_entries = list(it)
+        except OSError:
+            dir_mtimes[directory] = -1
+            return
+
+        names = {dir_entry.name for dir_entry in dir_entries}
+        if "Bookmarks" in names:
+            bookmarks_paths.append(os.path.join(directory, "Bookmarks"))
+
+        if depth >= self.max_depth:
+            return
+
+        # A chromium user data directory holds the profiles (Default, Profile 1, ...) as direct children,
+        # so there is no need to walk any deeper than the profile directories themselves
+        is_user_data_dir = "Local State" in names
+
+        for dir_entry in sorted(dir_entries, key=lambda dir_entry: dir_entry.name):
+            if dir_entry.name in pruned_dirs:
+                continue
+            try:
+                if not dir_entry.is_dir(follow_symlinks=False):
+                    continue
+            except OSError:
+                continue
+
+            if not is_user_data_dir:
+                self.walk(dir_entry.path, depth + 1, dir_mtimes, bookmarks_paths)
+                continue
+
+            profile_bookmarks = os.path.join(dir_entry.path, "Bookmarks")
+            if os.path.isfile(profile_bookmarks):
+                bookmarks_paths.append(profile_bookmarks)
+            else:
+                # Notice once this profile gets its first Bookmarks file
+                try:
+                    dir_mtimes[dir_entry.path] = dir_entry.stat().st_mtime_ns
+                except OSError:
+                    dir_mtimes[dir_entry.path] = -1
+
+    @staticmethod
+    def is_unchanged(dir_mtimes: Dict[str, int], bookmarks_paths: List[str]) -> bool:
+        """
+        Checks if a previous scan result is still valid
+
+        Parameters:
+            dir_mtimes (Dict[str, int]): The mtimes of the directories the result depends on
+            bookmarks_paths (List[str]): The previously found Bookmarks files
+
+        Returns:
+            bool: True if no directory changed and all Bookmarks files still exist, False otherwise
+        """
+        for directory, mtime in dir_mtimes.items():
+            try:
+                current_mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                current_mtime = -1
+            if current_mtime != mtime:
+                return False
+
+        return all(os.path.isfile(path) for path in bookmarks_paths)
+
+    def load(self) -> None:
+        """
+        Loads the persisted scan results
+        """
+        if self.cache_path is None or not os.path.isfile(self.cache_path):
+            return
+
+        try:
+            with open(self.cache_path) as cache_file:
+                data = json.load(cache_file)
+            for root, (dir_mtimes, bookmarks_paths) in data["roots"].items():
+                self.roots[root] = (dir_mtimes, bookmarks_paths)
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.exception("Could not read profile cache %s" % self.cache_path)
+            self.roots = {}
+
+    def save(self) -> None:
+        """
+        Persists the scan results if they changed since they were loaded
+        """
+        if self.cache_path is None or not self.dirty:
+            return
+
+        tmp_path = "%s.tmp" % self.cache_path
+        try:
+            with open(tmp_path, "w") as cache_file:
+                json.dump({"roots": self.roots}, cache_file)
+            os.replace(tmp_path, self.cache_path)
+            self.dirty = False
+        except OSError:
+            logger.exception("Could not write profile cache %s" % self.cache_path)
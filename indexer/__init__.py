@@ -0,0 +1,10 @@
+from .BookmarkIndex import BookmarkIndex as BookmarkIndex
+from .BookmarkIndex import BookmarkSource as BookmarkSource
+from .BookmarkLoader import BookmarkLoader as BookmarkLoader
+from .BookmarkWatcher import BookmarkWatcher as BookmarkWatcher
+from .FaviconStore import FaviconStore as FaviconStore
+from .FirefoxProfiles import FirefoxProfiles as FirefoxProfiles
+from .FirefoxSource import FirefoxSource as FirefoxSource
+from .FrecencyStore import FrecencyStore as FrecencyStore
+from .IndexSnapshot import IndexSnapshot as IndexSnapshot
+from .ProfileScanner import ProfileScanner as ProfileScanner
@@ -0,0 +1,14 @@
+import os
+
+
+def get_cache_dir() -> str:
+    """
+    Returns the directory the extension stores its caches in and creates it if needed
+
+    Returns:
+        str: The path to the cache directory
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    cache_dir = os.path.join(cache_home, "ulauncher-browser-bookmarks")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
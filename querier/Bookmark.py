@@ -0,0 +1,109 @@
+import unicodedata
+from typing import Tuple
+
+Origins = Tuple[Tuple[str, str], ...]
+
+
+class Bookmark:
+    __slots__ = (
+        "name",
+        "url",
+        "folder",
+        "search_text",
+        "folder_search_text",
+        "name_end",
+        "origins",
+    )
+
+    def __init__(self, name: str, url: str, folder: str) -> None:
+        """
+        Initializes the Bookmark class, a flat bookmark record with its search texts precomputed once per load.
+
+        Parameters:
+            name (str): The bookmark title
+            url (str): The bookmark URL
+            folder (str): The names of the parent folders, separated by spaces
+        """
+        self.name = name
+        self.url = url
+        self.folder = folder
+
+        normalized_name = Bookmark.normalize(name)
+        self.name_end = len(normalized_name)
+        # The normalized name and URL, used when not filtering by folders
+        self.search_text = f"{normalized_name} {Bookmark.normalize(url)}"
+        # The normalized folders, name and URL, used when filtering by folders
+        self.folder_search_text = f"{Bookmark.normalize(folder)} {self.search_text}"
+        # The paths and browser names of the files containing the URL, most recently modified first
+        self.origins: Origins = ()
+
+    def normalized_name(self) -> str:
+        """
+        Returns:
+            str: The normalized title
+        """
+        return self.search_text[: self.name_end]
+
+    def normalized_url(self) -> str:
+        """
+        Returns:
+            str: The normalized URL
+        """
+        return self.search_text[self.name_end + 1 :]
+
+    def normalized_folder(self) -> str:
+        """
+        Returns:
+            str: The normalized parent folder names
+        """
+        return self.folder_search_text[: -len(self.search_text) - 1]
+
+    @staticmethod
+    def restore(
+        name: str,
+        url: str,
+        folder: str,
+        search_text: str,
+        folder_search_text: str,
+        name_end: int,
+    ) -> "Bookmark":
+        """
+        Creates a record from previously computed search texts, without normalizing again
+
+        Parameters:
+            name (str): The bookmark title
+            url (str): The bookmark URL
+            folder (str): The names of the parent folders, separated by spaces
+            search_text (str): The normalized name and URL
+            folder_search_text (str): The normalized folders, name and URL
+            name_end (int): The length of the normalized name
+
+        Returns:
+            Bookmark: The record
+        """
+        bookmark = Bookmark.__new__(Bookmark)
+        bookmark.name = name
+        bookmark.url = url
+        bookmark.folder = folder
+        bookmark.search_text = search_text
+        bookmark.folder_search_text = folder_search_text
+        bookmark.name_end = name_end
+        bookmark.origins = ()
+        return bookmark
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalizes a text for case and accent insensitive matching
+
+        Parameters:
+            text (str): The text to normalize
+
+        Returns:
+            str: The casefolded text without accents
+        """
+        text = text.casefold()
+        if text.isascii():
+            return text
+        decomposed = unicodedata.normalize("NFKD", text)
+        return "".join(char for char in decomposed if not unicodedata.combining(char))
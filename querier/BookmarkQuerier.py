@@ -1,21 +1,78 @@
-from typing import Any, List, Dict
+import math
+import time
+from functools import partial
+from operator import attrgetter
+from typing import Any, Callable, List, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from .Bookmark import Bookmark
+from .FolderIndex import FolderIndex, Interval
+from .FuzzyMatcher import FuzzyMatcher
+from .QueryCache import QueryCache, Terms
+from .RankedMatches import RankedMatches
+from .Scorer import Scorer
+from .TrigramIndex import TrigramIndex
+
+
+class QueryCancelled(Exception):
+    """
+    Raised inside a search once the query was superseded by a newer one
+    """
+
 
 class BookmarkQuerier:
-    def __init__(self, filter_by_folders: bool = False) -> None:
+    # The number of entries checked between two checks for cancellation
+    cancel_check_interval = 4096
+    # The share of the matches bounded by their title and URL before the word starts of the terms are looked up,
+    # as looking them up costs about as much as bounding a share of the matches
+    word_start_lookup_share = 1 / 32
+
+    def __init__(
+        self,
+        filter_by_folders: bool = False,
+        frecency: Any = None,
+        time_budget: Optional[float] = None,
+        fuzzy: bool = False,
+    ) -> None:
         """
         Initializes the BookmarkQuerier class.
         Parameters:
             filter_by_folders (bool): Whether to filter by folders
+            frecency (Any): An object whose boosts attribute maps URLs to a frecency boost between 0 and 1, used for ranking
+            time_budget (Optional[float]): The milliseconds search_sources may take, after which the best matches
+                found so far are returned, unbounded if None
+            fuzzy (bool): Whether terms of at least FuzzyMatcher.min_term_len characters also match with a single typo
         """
         self.filter_by_folders = filter_by_folders
+        self.fuzzy = fuzzy
+        # The matcher of the last fuzzy query, shared by all files it searches
+        self.last_matcher: Optional[FuzzyMatcher] = None
+        self.frecency = frecency
+        self.time_budget = time_budget
+        self.deadline = math.inf
+        # Whether the last search_sources call hit the deadline
+        self.timed_out = False
         self.max_matches_len = 10
+        self.query_cache = QueryCache()
+        self.scorer = Scorer()
+        # The number of entries checked against and matched by the last search_sources call,
+        # entries answered from the query cache are not visited
+        self.visited_entries = 0
+        self.matched_entries = 0
+        self.get_search_text = attrgetter(
+            "folder_search_text" if filter_by_folders else "search_text"
+        )
+        # Returns True once the running search is superseded, checked while scanning
+        self.is_cancelled: Callable[[], bool] = BookmarkQuerier.never_cancelled
 
     def search(
-            self, bookmark_entry: Dict[str, Any], query: str, matches: List[Dict[str, Any]], 
-            parent_name: str = ""
-            ) -> None:
+        self,
+        bookmark_entry: Dict[str, Any],
+        query: str,
+        matches: List[Dict[str, Any]],
+        parent_name: str = "",
+    ) -> None:
         """
-        Recursively edits the matches variable with bookmark entries that match the query.
+        Edits the matches variable with bookmark entries of the tree that match the query.
         Matches if query terms are found in either name, URL, or parent folder name.
 
         Parameters:
@@ -24,27 +81,539 @@ class BookmarkQuerier:
             matches (List[Dict[str, Any]]): The list to append matches to
             parent_name (str, optional): The name of the parent folder
         """
-        if len(matches) >= self.max_matches_len:
-            return
+        sub_queries = [Bookmark.normalize(sub_query) for sub_query in query.split(" ")]
+
+        # Walks the tree depth-first with an explicit stack, so deeply nested folders can not exceed the recursion limit
+        stack: List[Tuple[Dict[str, Any], str]] = [(bookmark_entry, parent_name)]
+        while stack and len(matches) < self.max_matches_len:
+            bookmark_entry, parent_name = stack.pop()
+
+            if bookmark_entry["type"] == "folder":
+                parent_tree = f"{parent_name} {bookmark_entry['name']}"
+                for child_bookmark_entry in reversed(bookmark_entry["children"]):
+                    stack.append((child_bookmark_entry, parent_tree))
+                continue
 
-        if bookmark_entry["type"] == "folder":
-            parent_tree = f"{parent_name} {bookmark_entry['name']}"
-            for child_bookmark_entry in bookmark_entry["children"]:
-                self.search(child_bookmark_entry, query, matches, parent_tree)
-        else:
-            sub_queries = query.split(" ")
             bookmark_title = bookmark_entry["name"]
             bookmark_url = bookmark_entry.get("url", "")
-            
+
             # Create search text that includes parent folder name, bookmark name and URL
             search_text = f"{bookmark_title} {bookmark_url}"
             if parent_name and self.filter_by_folders:
                 search_text = f"{parent_name} {search_text}"
 
-            if not self.contains_all_substrings(search_text, sub_queries):
+            if BookmarkQuerier.contains_all_normalized(
+                Bookmark.normalize(search_text), sub_queries
+            ):
+                matches.append(bookmark_entry)
+
+    def search_sources(
+        self,
+        sources: Iterable[Any],
+        query: str,
+        source_timings: Optional[Dict[str, float]] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None,
+    ) -> List[Tuple[Bookmark, Any]]:
+        """
+        Returns the best matches of all sources, at most max_matches_len.
+        A URL found in several sources is only returned once, with its best match.
+        Raises QueryCancelled as soon as is_cancelled returns True, without caching partial matches.
+        Once the time budget is used up, the best matches found so far are returned and timed_out is set.
+        Sources are searched in the given order, so they should be ordered by priority.
+        A query starting with a folder scope (e.g. "/Python/Advanced tutorial" or "@work docs") only searches
+        the bookmarks below the matching folders, which are looked up through the folder index of each source.
+        If no source has a matching folder, the scope is searched like any other term, e.g. "/api" or "@example".
+
+        Parameters:
+            sources (Iterable[Any]): The parsed bookmarks files, each with path, entries, trigram_index, folder_index and
+                browser attributes, or with path, browser, a has_folder method and a search method passing
+                the candidates for the normalized terms and folder scope to rank_batch, best bound first,
+                like FirefoxSource
+            query (str): The query
+            source_timings (Optional[Dict[str, float]], optional): Filled with the search duration of each source
+                in milliseconds by path if given
+            is_cancelled (Optional[Callable[[], bool]], optional): Returns True once the query is superseded
+
+        Returns:
+            List[Tuple[Bookmark, Any]]: The matched bookmarks and the browser of their file, best first
+        """
+        self.visited_entries = 0
+        self.matched_entries = 0
+        self.timed_out = False
+        self.is_cancelled = is_cancelled or BookmarkQuerier.never_cancelled
+        if self.time_budget is not None:
+            self.deadline = time.perf_counter() + self.time_budget / 1000
+        ranked = RankedMatches(self.max_matches_len, key=BookmarkQuerier.match_url)
+        sources = list(sources)
+        scope, scoped_query = FolderIndex.parse_query(query)
+        scope_intervals = (
+            None if scope is None else BookmarkQuerier.resolve_scope(sources, scope)
+        )
+        if scope_intervals is None:
+            scope = None
+            scope_intervals = [None] * len(sources)
+        else:
+            query = scoped_query
+        # Reloaded files come with new entries, the cached matches of their previous ones are of no use anymore
+        self.query_cache.retain(
+            source.entries
+            for source in sources
+            if getattr(source, "search", None) is None
+        )
+        try:
+            for source, intervals in zip(sources, scope_intervals):
+                self.check_cancelled()
+                if self.is_past_deadline():
+                    break
+                start = time.perf_counter()
+                search = getattr(source, "search", None)
+                if search is not None:
+                    # Sources backed by a database look up their candidates through their own index,
+                    # best bound first, until no more of them can be kept
+                    search(
+                        QueryCache.normalize(query.split(" ")),
+                        self.filter_by_folders,
+                        scope,
+                        self.fuzzy,
+                        self.scorer,
+                        self.frecency.boosts if self.frecency is not None else None,
+                        partial(self.rank_batch, query, ranked, source.browser),
+                    )
+                else:
+                    self.rank_entries(
+                        source.entries,
+                        query,
+                        ranked,
+                        source.trigram_index,
+                        source.browser,
+                        intervals,
+                    )
+                if source_timings is not None:
+                    source_timings[source.path] = (time.perf_counter() - start) * 1000
+        finally:
+            self.is_cancelled = BookmarkQuerier.never_cancelled
+            self.deadline = math.inf
+        return ranked.sorted()
+
+    @staticmethod
+    def resolve_scope(
+        sources: List[Any], scope: List[str]
+    ) -> Optional[List[Optional[List[Interval]]]]:
+        """
+        Looks up the folders matching a scope in all sources
+
+        Parameters:
+            sources (List[Any]): The sources, as passed to search_sources
+            scope (List[str]): The normalized folder name prefixes
+
+        Returns:
+            Optional[List[Optional[List[Interval]]]]: The entry intervals below the matching folders of each source,
+                None for sources with a search method, which match the scope themselves,
+                or None if no source has a matching folder
+        """
+        scope_intervals: List[Optional[List[Interval]]] = []
+        matched = False
+        for source in sources:
+            if getattr(source, "search", None) is not None:
+                scope_intervals.append(None)
+                matched = matched or source.has_folder(scope)
+            else:
+                folder_index = getattr(source, "folder_index", None)
+                intervals = [] if folder_index is None else folder_index.resolve(scope)
+                scope_intervals.append(intervals)
+                matched = matched or bool(intervals)
+        return scope_intervals if matched else None
+
+    def rank_batch(
+        self, query: str, ranked: RankedMatches, tag: Any, entries: List[Bookmark]
+    ) -> float:
+        """
+        Pushes a batch of candidates looked up by a database into the ranked matches
+
+        Parameters:
+            query (str): The query
+            ranked (RankedMatches): The best matches so far
+            tag (Any): A value stored next to each match, e.g. the browser of the database
+            entries (List[Bookmark]): The candidates
+
+        Returns:
+            float: The score a later candidate has to beat to be kept, inf once the time budget is used up
+        """
+        # A new list is looked up for every query, caching it would only evict the other sources
+        self.rank_entries(entries, query, ranked, None, tag, cached=False)
+        if self.is_past_deadline():
+            return math.inf
+        return ranked.threshold()
+
+    def check_cancelled(self) -> None:
+        """
+        Abandons the running search if it was superseded
+
+        Raises:
+            QueryCancelled: If the search was superseded
+        """
+        if self.is_cancelled():
+            raise QueryCancelled()
+
+    def is_past_deadline(self) -> bool:
+        """
+        Checks if the time budget of the running search is used up
+
+        Returns:
+            bool: True if the search has to return the matches found so far, False otherwise
+        """
+        if time.perf_counter() <= self.deadline:
+            return False
+        self.timed_out = True
+        return True
+
+    @staticmethod
+    def never_cancelled() -> bool:
+        """
+        Returns:
+            bool: False, used when a search can not be superseded
+        """
+        return False
+
+    @staticmethod
+    def match_url(match: Tuple[Bookmark, Any]) -> str:
+        """
+        Returns the URL of a ranked match, used to collapse matches of the same URL
+
+        Parameters:
+            match (Tuple[Bookmark, Any]): The bookmark and its tag
+
+        Returns:
+            str: The URL of the bookmark
+        """
+        return match[0].url
+
+    def rank_entries(
+        self,
+        entries: List[Bookmark],
+        query: str,
+        ranked: RankedMatches,
+        trigram_index: Optional[TrigramIndex] = None,
+        tag: Any = None,
+        scope: Optional[List[Interval]] = None,
+        cached: bool = True,
+    ) -> None:
+        """
+        Pushes the flattened bookmarks that match the query into the ranked matches.
+        Calling this for several files with the same ranked matches yields a global top-k.
+
+        Parameters:
+            entries (List[Bookmark]): The flattened bookmarks to search
+            query (str): The query
+            ranked (RankedMatches): The best matches so far, holding (bookmark, tag) tuples
+            trigram_index (Optional[TrigramIndex], optional): The index built by build_index over the entries
+            tag (Any, optional): A value stored next to each match, e.g. the browser of the file
+            scope (Optional[List[Interval]], optional): Only the entries within these intervals are searched if given
+            cached (bool, optional): Whether the matches are kept in the query cache, which only pays off for entries
+                that are searched again
+        """
+        terms = QueryCache.normalize(query.split(" "))
+        # Read once, as the boosts are swapped by a background sync
+        boosts: Dict[str, float] = (
+            self.frecency.boosts if self.frecency is not None else {}
+        )
+        boosted = len(boosts) > 0
+        scorer = self.scorer
+        max_score = scorer.max_score(terms, boosted)
+        matcher = self.fuzzy_matcher(terms)
+        patterns = matcher.patterns if matcher is not None else None
+        get_search_text = self.get_search_text
+        matched_ids = self.matched_ids(entries, terms, trigram_index, scope, cached)
+        self.matched_entries += len(matched_ids)
+
+        max_term_score = scorer.max_term_score()
+        max_later_term_score = scorer.max_later_term_score()
+        max_inner_term_score = scorer.max_inner_term_score()
+        max_terms_score = max_term_score * len(terms)
+        # The entries each term may start a word in, looked up once the title bound turns out to be needed often
+        word_start_ids: List[Optional[Set[int]]] = [None] * len(terms)
+        bounded_entries = 0
+        word_start_lookup_after = (
+            int(len(matched_ids) * self.word_start_lookup_share) + 1
+            if trigram_index is not None
+            else -1
+        )
+        url_length_limit = scorer.url_length_limit
+
+        threshold = ranked.threshold()
+        check_interval = self.cancel_check_interval
+        for chunk_start in range(0, len(matched_ids), check_interval):
+            self.check_cancelled()
+            # Ranks at least one chunk, so the matches found before the deadline are returned
+            if chunk_start > 0 and self.is_past_deadline():
                 return
+            for entry_id in matched_ids[chunk_start : chunk_start + check_interval]:
+                bookmark = entries[entry_id]
+                search_text = bookmark.search_text
+                frecency = (
+                    scorer.frecency_score(boosts.get(bookmark.url, 0.0))
+                    if boosted
+                    else 0.0
+                )
+                # Most matches can not beat the kept ones, which is told from the URL length first,
+                # then from the word starts and the title, all much cheaper than scoring them
+                url_len = len(search_text) - bookmark.name_end - 1
+                # Scorer.url_length_bonus inlined without calls, as it is computed for every match
+                url_bonus = (
+                    1.0
+                    - (url_len if url_len < url_length_limit else url_length_limit)
+                    / url_length_limit
+                )
+                if max_terms_score + url_bonus + frecency <= threshold:
+                    continue
+                terms_score = 0.0
+                for term, candidate_ids in zip(terms, word_start_ids):
+                    if candidate_ids is not None and entry_id not in candidate_ids:
+                        terms_score += max_inner_term_score
+                    elif search_text.startswith(term):
+                        terms_score += max_term_score
+                    else:
+                        terms_score += max_later_term_score
+                if terms_score + url_bonus + frecency <= threshold:
+                    continue
+                bounded_entries += 1
+                if bounded_entries == word_start_lookup_after:
+                    word_start_ids = self.word_start_ids(trigram_index, terms)
+                    max_terms_score -= (
+                        max_term_score - max_inner_term_score
+                    ) * word_start_ids.count(set())
+                matched_text = (
+                    get_search_text(bookmark) if patterns is not None else None
+                )
+                if (
+                    scorer.bound(search_text, bookmark.name_end, terms, matched_text)
+                    + frecency
+                    <= threshold
+                ):
+                    continue
+
+                folder = bookmark.normalized_folder() if self.filter_by_folders else ""
+                score = scorer.score(
+                    bookmark.normalized_name(),
+                    bookmark.normalized_url(),
+                    folder,
+                    terms,
+                    patterns,
+                )
+                ranked.push(score + frecency, (bookmark, tag))
+                threshold = ranked.threshold()
+                # Nothing can beat the kept matches anymore, as later matches lose ties
+                if threshold >= max_score:
+                    return
+
+    def word_start_ids(
+        self, trigram_index: TrigramIndex, terms: Terms
+    ) -> List[Optional[Set[int]]]:
+        """
+        Looks up the entries each term may start a word in, as a term adds at most max_inner_term_score to the others.
+        The texts of the trigram index start with the folders, so title and URL words are never at their very start.
+
+        Parameters:
+            trigram_index (TrigramIndex): The index built by build_index over the entries
+            terms (Terms): The normalized query terms
+
+        Returns:
+            List[Optional[Set[int]]]: The ids of the entries each term may start a word in, None for terms which
+                start a word in too many entries to pay off
+        """
+        return [
+            trigram_index.word_start_candidates(term, trigram_index.size)
+            for term in terms
+        ]
+
+    def matched_ids(
+        self,
+        entries: List[Bookmark],
+        terms: Terms,
+        trigram_index: Optional[TrigramIndex] = None,
+        scope: Optional[List[Interval]] = None,
+        cached: bool = True,
+    ) -> Sequence[int]:
+        """
+        Returns the ids of all entries that match the terms, using the query cache if possible
+
+        Parameters:
+            entries (List[Bookmark]): The flattened bookmarks to search
+            terms (Terms): The normalized query terms
+            trigram_index (Optional[TrigramIndex], optional): The index built by build_index over the entries
+            scope (Optional[List[Interval]], optional): Only the entries within these intervals are searched if given
+            cached (bool, optional): Whether the query cache is used for the entries
+
+        Returns:
+            Sequence[int]: The ascending ids of the matching entries
+        """
+        if not cached:
+            return (
+                self.match_all(entries, terms, trigram_index, scope)
+                if terms
+                else range(len(entries))
+            )
+
+        if scope is not None:
+            # Scoped queries only scan a subtree, so they are not cached
+            if not terms:
+                return FolderIndex.interval_ids(scope)
+            return self.match_all(entries, terms, trigram_index, scope)
+
+        if not terms:
+            # Every entry matches an empty query
+            return range(len(entries))
 
-            matches.append(bookmark_entry)
+        cached_ids = self.query_cache.get(entries, terms)
+        if cached_ids is None:
+            cached_ids = self.match_all(entries, terms, trigram_index)
+            # The matches may be incomplete if the scan was stopped by the deadline
+            if not self.is_past_deadline():
+                self.query_cache.put(entries, terms, cached_ids)
+        return cached_ids
+
+    def match_all(
+        self,
+        entries: List[Bookmark],
+        terms: Terms,
+        trigram_index: Optional[TrigramIndex] = None,
+        scope: Optional[List[Interval]] = None,
+    ) -> List[int]:
+        """
+        Returns the ids of all entries that match the terms, without stopping at max_matches_len.
+        Only filters the matches of a previous query if the terms refine it (e.g. "pytho" -> "python").
+        In fuzzy mode, terms with a single typo match as well.
+
+        Parameters:
+            entries (List[Bookmark]): The flattened bookmarks to search
+            terms (Terms): The normalized query terms
+            trigram_index (Optional[TrigramIndex], optional): The index built by build_index over the entries
+            scope (Optional[List[Interval]], optional): Only the entries within these intervals are searched if given
+
+        Returns:
+            List[int]: The ascending ids of the matching entries
+        """
+        matcher = self.fuzzy_matcher(terms)
+        candidate_ids: Optional[Sequence[int]] = None
+        # A term with a typo may match entries the exactly matched terms of a previous query did not
+        if scope is None and matcher is None:
+            candidate_ids = self.query_cache.get_refinable(entries, terms)
+        if candidate_ids is None and trigram_index is not None:
+            if matcher is None:
+                candidate_ids = trigram_index.candidates(terms)
+            else:
+                candidate_ids = matcher.candidates(trigram_index)
+        if scope is not None:
+            if candidate_ids is None:
+                candidate_ids = FolderIndex.interval_ids(scope)
+            else:
+                candidate_ids = FolderIndex.restrict(candidate_ids, scope)
+        if candidate_ids is None:
+            candidate_ids = range(len(entries))
+
+        self.visited_entries += len(candidate_ids)
+        get_search_text = self.get_search_text
+        check_interval = self.cancel_check_interval
+        matched_ids: List[int] = []
+        # Scans in chunks, so a superseded query is abandoned without a check per entry
+        for chunk_start in range(0, len(candidate_ids), check_interval):
+            self.check_cancelled()
+            if chunk_start > 0 and self.is_past_deadline():
+                break
+            chunk = candidate_ids[chunk_start : chunk_start + check_interval]
+            if matcher is not None:
+                matches = matcher.matches
+                matched_ids.extend(
+                    entry_id
+                    for entry_id in chunk
+                    if matches(get_search_text(entries[entry_id]))
+                )
+                continue
+            for entry_id in chunk:
+                search_text = get_search_text(entries[entry_id])
+                for term in terms:
+                    if term not in search_text:
+                        break
+                else:
+                    matched_ids.append(entry_id)
+        return matched_ids
+
+    def fuzzy_matcher(self, terms: Terms) -> Optional[FuzzyMatcher]:
+        """
+        Returns the matcher of the terms in fuzzy mode
+
+        Parameters:
+            terms (Terms): The normalized query terms
+
+        Returns:
+            Optional[FuzzyMatcher]: The matcher or None if only exact matches are searched, e.g. as all terms are short
+        """
+        if not self.fuzzy:
+            return None
+        matcher = self.last_matcher
+        if matcher is None or matcher.terms != terms:
+            matcher = FuzzyMatcher(terms)
+            self.last_matcher = matcher
+        return matcher if matcher.is_fuzzy() else None
+
+    @staticmethod
+    def build_index(entries: List[Bookmark]) -> TrigramIndex:
+        """
+        Builds the trigram index used by search_sources.
+        The parent folder names are always indexed, so the same index serves both filter_by_folders modes.
+
+        Parameters:
+            entries (List[Bookmark]): The flattened bookmarks to index
+
+        Returns:
+            TrigramIndex: The index over the entries
+        """
+        return TrigramIndex([bookmark.folder_search_text for bookmark in entries])
+
+    @staticmethod
+    def flatten(
+        bookmark_entry: Dict[str, Any],
+        entries: List[Bookmark],
+        parent_name: str = "",
+        folder_index: Optional[FolderIndex] = None,
+    ) -> None:
+        """
+        Edits the entries variable with a record of every bookmark of the tree in depth-first order.
+
+        Parameters:
+            bookmark_entry (Dict[str, Any]): The bookmark entry to flatten
+            entries (List[Bookmark]): The list to append the bookmarks to
+            parent_name (str, optional): The name of the parent folder
+            folder_index (Optional[FolderIndex], optional): Filled with the folders of the tree and their entry intervals
+        """
+        # Folders are closed by a None entry, once all their children were flattened
+        stack: List[Tuple[Optional[Dict[str, Any]], str, int]] = [
+            (bookmark_entry, parent_name, -1)
+        ]
+        while stack:
+            stacked_entry, parent_name, parent_folder = stack.pop()
+
+            if stacked_entry is None:
+                if folder_index is not None:
+                    folder_index.close(parent_folder, len(entries))
+            elif stacked_entry["type"] == "folder":
+                # Hand edited or synced files may have null or missing names and URLs
+                folder_name = stacked_entry.get("name") or ""
+                parent_tree = f"{parent_name} {folder_name}"
+                folder = -1
+                if folder_index is not None:
+                    folder = folder_index.add(folder_name, parent_folder, len(entries))
+                    stack.append((None, "", folder))
+                for child_bookmark_entry in reversed(stacked_entry["children"]):
+                    stack.append((child_bookmark_entry, parent_tree, folder))
+            else:
+                entries.append(
+                    Bookmark(
+                        stacked_entry.get("name") or "",
+                        stacked_entry.get("url") or "",
+                        parent_name,
+                    )
+                )
 
     def contains_all_substrings(self, text: str, substrings: List[str]) -> bool:
         """
@@ -61,3 +630,20 @@ class BookmarkQuerier:
             if substring.lower() not in text.lower():
                 return False
         return True
+
+    @staticmethod
+    def contains_all_normalized(text: str, substrings: List[str]) -> bool:
+        """
+        Check if all substrings are in the text, both already normalized, so nothing is lowercased per entry
+
+        Parameters:
+            text (str): The normalized text to match against
+            substrings (List[str]): The normalized substrings to check
+
+        Returns:
+            bool: True if all substrings are in the text, False otherwise
+        """
+        for substring in substrings:
+            if substring not in text:
+                return False
+        return True
@@ -0,0 +1,175 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .Bookmark import Bookmark
+
+Interval = Tuple[int, int]
+
+# The first query term restricts the search to folders if it starts with one of these
+scope_prefixes = ("/", "@")
+
+
+class FolderIndex:
+    def __init__(self) -> None:
+        """
+        Initializes the FolderIndex class, a trie of the folders of a bookmarks file.
+        As the bookmarks are flattened in depth-first order, the bookmarks below a folder are the
+        contiguous interval of entry ids from its start to its end.
+        """
+        # The normalized names, parent ids (-1 for roots) and entry intervals of the folders by folder id
+        self.names: List[str] = []
+        self.parents = array("i")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.children: Dict[int, List[int]] = {}
+
+    def add(self, name: str, parent: int, start: int) -> int:
+        """
+        Adds a folder whose bookmarks start at the given entry id, its end is set by close
+
+        Parameters:
+            name (str): The folder name
+            parent (int): The id of the parent folder, -1 for roots
+            start (int): The id of the first entry below the folder
+
+        Returns:
+            int: The id of the folder
+        """
+        folder_id = len(self.names)
+        self.names.append(Bookmark.normalize(name))
+        self.parents.append(parent)
+        self.starts.append(start)
+        self.ends.append(start)
+        self.children.setdefault(parent, []).append(folder_id)
+        return folder_id
+
+    def close(self, folder_id: int, end: int) -> None:
+        """
+        Sets the end of the bookmarks below a folder
+
+        Parameters:
+            folder_id (int): The id of the folder
+            end (int): The id after the last entry below the folder
+        """
+        self.ends[folder_id] = end
+
+    @staticmethod
+    def restore(
+        names: List[str], parents: bytes, starts: bytes, ends: bytes
+    ) -> "FolderIndex":
+        """
+        Creates an index from previously built folders
+
+        Parameters:
+            names (List[str]): The normalized folder names
+            parents (bytes): The raw bytes of the parent ids
+            starts (bytes): The raw bytes of the interval starts
+            ends (bytes): The raw bytes of the interval ends
+
+        Returns:
+            FolderIndex: The index
+        """
+        folder_index = FolderIndex()
+        folder_index.names = names
+        folder_index.parents.frombytes(parents)
+        folder_index.starts.frombytes(starts)
+        folder_index.ends.frombytes(ends)
+        for folder_id, parent in enumerate(folder_index.parents):
+            folder_index.children.setdefault(parent, []).append(folder_id)
+        return folder_index
+
+    def resolve(self, segments: Sequence[str]) -> List[Interval]:
+        """
+        Returns the entry intervals of the folders matching a path of folder name prefixes.
+        The first segment matches folders at any depth, every further segment a child of the previous match.
+
+        Parameters:
+            segments (Sequence[str]): The normalized folder name prefixes, e.g. ("python", "advanced")
+
+        Returns:
+            List[Interval]: The ascending, disjoint entry intervals below the matched folders
+        """
+        if not segments:
+            return []
+
+        names = self.names
+        matched = [
+            folder_id
+            for folder_id, name in enumerate(names)
+            if name.startswith(segments[0])
+        ]
+        for segment in segments[1:]:
+            matched = [
+                child
+                for folder_id in matched
+                for child in self.children.get(folder_id, ())
+                if names[child].startswith(segment)
+            ]
+
+        intervals: List[Interval] = []
+        for start, end in sorted(
+            (self.starts[folder_id], self.ends[folder_id]) for folder_id in matched
+        ):
+            # Intervals of subfolders are contained in the interval of their parent
+            if intervals and start < intervals[-1][1]:
+                continue
+            if start < end:
+                intervals.append((start, end))
+        return intervals
+
+    @staticmethod
+    def parse_query(query: str) -> Tuple[Optional[List[str]], str]:
+        """
+        Splits the folder scope off a query, e.g. "/Python/Advanced tutorial" or "@work docs"
+
+        Parameters:
+            query (str): The query
+
+        Returns:
+            Tuple[Optional[List[str]], str]: The normalized folder name prefixes or None if the query is not scoped,
+                and the rest of the query
+        """
+        scope, _, rest = query.lstrip(" ").partition(" ")
+        if len(scope) < 2 or not scope.startswith(scope_prefixes):
+            return None, query
+
+        segments = [
+            Bookmark.normalize(segment) for segment in scope[1:].split("/") if segment
+        ]
+        if not segments:
+            return None, query
+        return segments, rest
+
+    @staticmethod
+    def interval_ids(intervals: List[Interval]) -> List[int]:
+        """
+        Returns all entry ids of the intervals
+
+        Parameters:
+            intervals (List[Interval]): The ascending, disjoint entry intervals
+
+        Returns:
+            List[int]: The ascending entry ids
+        """
+        ids: List[int] = []
+        for start, end in intervals:
+            ids.extend(range(start, end))
+        return ids
+
+    @staticmethod
+    def restrict(ids: Sequence[int], intervals: List[Interval]) -> List[int]:
+        """
+        Returns the entry ids that lie within the intervals
+
+        Parameters:
+            ids (Sequence[int]): The ascending entry ids
+            intervals (List[Interval]): The ascending, disjoint entry intervals
+
+        Returns:
+            List[int]: The ascending entry ids within the intervals
+        """
+        restricted: List[int] = []
+        for start, end in intervals:
+            restricted.extend(ids[bisect_left(ids, start) : bisect_left(ids, end)])
+        return restricted
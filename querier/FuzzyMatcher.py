@@ -0,0 +1,318 @@
+import re
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from .QueryCache import Terms
+from .TrigramIndex import TrigramIndex
+
+# The substrings a text has to contain for a term to occur in it with a single typo
+Variant = Tuple[str, ...]
+# The spellings of a term by character, None standing for any character
+Trie = Dict[Optional[str], Any]
+# Returns the characters following a prefix of two characters in the indexed texts
+Followers = Callable[[str], Iterable[str]]
+
+# Marks the end of a spelling in a trie, as it is no character
+end_marker = ""
+
+
+class FuzzyMatcher:
+    # Shorter terms are only matched exactly, a typo in them would match almost every bookmark
+    min_term_len = 5
+    # Only substrings with at least one trigram can be looked up
+    min_part_len = 3
+
+    def __init__(self, terms: Terms) -> None:
+        """
+        Initializes the FuzzyMatcher class, which matches query terms with up to one typo, i.e. a missing,
+        additional, replaced or two swapped characters (an optimal string alignment distance of 1).
+        Terms are verified with a regular expression of all their spellings with a single typo,
+        the candidates to verify are looked up in the trigram index.
+
+        Parameters:
+            terms (Terms): The normalized query terms
+        """
+        self.terms = terms
+        self.patterns: List[Optional[Pattern[str]]] = [
+            FuzzyMatcher.pattern(term) if len(term) >= self.min_term_len else None
+            for term in terms
+        ]
+
+    def matches(self, text: str) -> bool:
+        """
+        Checks if every term occurs in the text, terms with a single typo included
+
+        Parameters:
+            text (str): The normalized text to match against
+
+        Returns:
+            bool: True if all terms match, False otherwise
+        """
+        for term, pattern in zip(self.terms, self.patterns):
+            if term in text:
+                continue
+            if pattern is None or pattern.search(text) is None:
+                return False
+        return True
+
+    def is_fuzzy(self) -> bool:
+        """
+        Returns:
+            bool: True if any term may contain a typo, False if all terms are matched exactly
+        """
+        return any(pattern is not None for pattern in self.patterns)
+
+    def candidates(self, trigram_index: TrigramIndex) -> Optional[List[int]]:
+        """
+        Returns the ids of the texts which may match all terms.
+        Every spelling of a term with a single typo keeps a substring of at least three characters
+        or is spelled out with the characters the index holds, so the candidates of a term are the union
+        of the trigram candidates of its spellings.
+
+        Parameters:
+            trigram_index (TrigramIndex): The index over the texts
+
+        Returns:
+            Optional[List[int]]: The ascending candidate ids or None if no term is long enough to use the index
+        """
+        exact_terms = [
+            term for term, pattern in zip(self.terms, self.patterns) if pattern is None
+        ]
+        candidates = trigram_index.candidates(exact_terms)
+        candidate_set = None if candidates is None else set(candidates)
+
+        for term, pattern in zip(self.terms, self.patterns):
+            if pattern is None:
+                continue
+            if candidate_set is not None and not candidate_set:
+                break
+
+            variants = FuzzyMatcher.variants(term, trigram_index.followers)
+            if () in variants:
+                continue
+            term_candidates: Set[int] = set()
+            for variant in variants:
+                variant_candidates = trigram_index.candidates(variant)
+                if variant_candidates:
+                    term_candidates.update(variant_candidates)
+            candidate_set = (
+                term_candidates
+                if candidate_set is None
+                else candidate_set & term_candidates
+            )
+
+        if candidate_set is None:
+            return None
+        return sorted(candidate_set)
+
+    def match_expression(self, column: str) -> Optional[str]:
+        """
+        Returns the FTS5 query finding the candidates of all terms in a column, like candidates does for the trigram index.
+        Terms with a spelling that can not be looked up without knowing the indexed characters are not part of it.
+
+        Parameters:
+            column (str): The name of the searched column
+
+        Returns:
+            Optional[str]: The query or None if no term is long enough to use the index
+        """
+        expressions: List[str] = []
+        for term, pattern in zip(self.terms, self.patterns):
+            if pattern is None:
+                if len(term) >= self.min_part_len:
+                    expressions.append(FuzzyMatcher.quote(term))
+                continue
+
+            variants = FuzzyMatcher.variants(term)
+            if () in variants:
+                continue
+            spellings = [
+                "(%s)" % " AND ".join(FuzzyMatcher.quote(part) for part in variant)
+                for variant in variants
+            ]
+            expressions.append("(%s)" % " OR ".join(spellings))
+
+        if not expressions:
+            return None
+        return "%s : (%s)" % (column, " AND ".join(expressions))
+
+    @staticmethod
+    def quote(text: str) -> str:
+        """
+        Returns the text as an FTS5 string, which matches it as a substring with the trigram tokenizer
+
+        Parameters:
+            text (str): The text
+
+        Returns:
+            str: The quoted text
+        """
+        return '"%s"' % text.replace('"', '""')
+
+    @staticmethod
+    def variants(term: str, followers: Optional[Followers] = None) -> List[Variant]:
+        """
+        Returns the substrings a text contains if the term occurs in it with a single typo, one tuple per spelling.
+        Only substrings of at least min_part_len characters are kept, so every tuple can be looked up in a trigram index.
+        A spelling without such a substring is spelled out with the characters following its prefix in the index,
+        or is the empty tuple, which every text contains, if followers is not given.
+
+        Parameters:
+            term (str): The normalized term, at least min_term_len characters long
+            followers (Optional[Followers], optional): Returns the characters following a prefix in the index
+
+        Returns:
+            List[Variant]: The unique substrings of each spelling
+        """
+        variants: List[Variant] = []
+        for i in range(len(term)):
+            # A character typed too many
+            variants.append((term[:i] + term[i + 1 :],))
+            # A replaced character
+            variants.extend(
+                FuzzyMatcher.split_variant(term[:i], term[i + 1 :], followers)
+            )
+            # Two swapped characters
+            if i + 1 < len(term) and term[i] != term[i + 1]:
+                variants.append((term[:i] + term[i + 1] + term[i] + term[i + 2 :],))
+        for i in range(1, len(term)):
+            # A missing character
+            variants.extend(FuzzyMatcher.split_variant(term[:i], term[i:], followers))
+        variants = FuzzyMatcher.unique(variants)
+
+        # A variant containing all substrings of another one only finds candidates the other one finds as well,
+        # e.g. the term without its i-th character contains both parts of the term with a replaced i-th character
+        return [
+            variant
+            for i, variant in enumerate(variants)
+            if not any(
+                j != i
+                and FuzzyMatcher.contains(variant, other)
+                and (j < i or not FuzzyMatcher.contains(other, variant))
+                for j, other in enumerate(variants)
+            )
+        ]
+
+    @staticmethod
+    def split_variant(
+        prefix: str, suffix: str, followers: Optional[Followers] = None
+    ) -> List[Variant]:
+        """
+        Returns the spellings of a term with an unknown character between prefix and suffix.
+        If neither part is long enough to be looked up, the unknown character is spelled out with every character
+        following the prefix in the index, as the spelling contains the trigram of both.
+
+        Parameters:
+            prefix (str): The part of the term before the unknown character
+            suffix (str): The part of the term after the unknown character
+            followers (Optional[Followers], optional): Returns the characters following a prefix in the index
+
+        Returns:
+            List[Variant]: The substrings of each spelling, a single empty one if the character can not be spelled out
+        """
+        parts = tuple(
+            part for part in (prefix, suffix) if len(part) >= FuzzyMatcher.min_part_len
+        )
+        if parts:
+            return [parts]
+        # Terms of min_term_len characters leave two characters on both sides
+        if followers is None or len(prefix) != FuzzyMatcher.min_part_len - 1:
+            return [()]
+        return [(prefix + character + suffix,) for character in followers(prefix)]
+
+    @staticmethod
+    def contains(variant: Variant, other: Variant) -> bool:
+        """
+        Checks if every text containing the substrings of a variant contains the substrings of the other one as well
+
+        Parameters:
+            variant (Variant): The substrings of a spelling
+            other (Variant): The substrings of another spelling
+
+        Returns:
+            bool: True if each substring of other occurs in a substring of variant, False otherwise
+        """
+        return all(any(part in own_part for own_part in variant) for part in other)
+
+    @staticmethod
+    def pattern(term: str) -> Pattern[str]:
+        """
+        Compiles a regular expression matching every spelling of the term with at most one typo.
+        The spellings are merged into a trie, so every shared prefix is only checked once per position.
+
+        Parameters:
+            term (str): The normalized term
+
+        Returns:
+            Pattern[str]: The compiled expression
+        """
+        # None stands for any character
+        spellings: List[List[Optional[str]]] = [list(term)]
+        for i in range(len(term)):
+            spellings.append(list(term[:i] + term[i + 1 :]))
+            # A replaced first or last character is found by the spelling without it
+            if 0 < i < len(term) - 1:
+                spellings.append([*term[:i], None, *term[i + 1 :]])
+            if i + 1 < len(term) and term[i] != term[i + 1]:
+                spellings.append(list(term[:i] + term[i + 1] + term[i] + term[i + 2 :]))
+        for i in range(1, len(term)):
+            spellings.append([*term[:i], None, *term[i:]])
+
+        trie: Trie = {}
+        for spelling in spellings:
+            node = trie
+            for character in spelling:
+                # Texts containing a shorter spelling match already
+                if end_marker in node:
+                    break
+                node = node.setdefault(character, {})
+            else:
+                node.clear()
+                node[end_marker] = {}
+        return re.compile(FuzzyMatcher.trie_expression(trie), re.DOTALL)
+
+    @staticmethod
+    def trie_expression(node: Trie) -> str:
+        """
+        Returns the regular expression of a trie of spellings
+
+        Parameters:
+            node (Trie): The trie
+
+        Returns:
+            str: The expression matching every spelling of the trie
+        """
+        if end_marker in node:
+            return ""
+        alternatives = [
+            ("." if character is None else re.escape(character))
+            + FuzzyMatcher.trie_expression(child)
+            for character, child in node.items()
+        ]
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:%s)" % "|".join(alternatives)
+
+    @staticmethod
+    def unique(spellings: Sequence[Hashable]) -> List[Any]:
+        """
+        Returns the spellings without duplicates, e.g. of terms with repeated characters
+
+        Parameters:
+            spellings (Sequence[Hashable]): The spellings
+
+        Returns:
+            List[Any]: The unique spellings in their original order
+        """
+        return list(dict.fromkeys(spellings))
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class ItemCache:
+    def __init__(self, max_size: int = 256) -> None:
+        """
+        Initializes the ItemCache class, a bounded LRU of the rendered result items,
+        so bookmarks shown again while typing reuse their item instead of building a new one.
+
+        Parameters:
+            max_size (int): The maximum number of cached items
+        """
+        self.max_size = max_size
+        self.items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        # The number of items that were reused and built
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, create: Callable[[], Any]) -> Any:
+        """
+        Returns the cached item of the key, creating and caching it if needed
+
+        Parameters:
+            key (Hashable): Identifies everything the item shows, e.g. the name, URL and browser of a bookmark
+            create (Callable[[], Any]): Builds the item on a cache miss
+
+        Returns:
+            Any: The item
+        """
+        item = self.items.get(key)
+        if item is not None:
+            self.hits += 1
+            self.items.move_to_end(key)
+            return item
+
+        self.misses += 1
+        item = create()
+        self.items[key] = item
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+        return item
+
+    def clear(self) -> None:
+        """
+        Removes all cached items
+        """
+        self.items.clear()
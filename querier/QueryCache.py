@@ -0,0 +1,111 @@
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional, Tuple
+
+from .Bookmark import Bookmark
+
+Terms = Tuple[str, ...]
+
+
+class QueryCache:
+    def __init__(self, max_size: int = 32) -> None:
+        """
+        Initializes the QueryCache class, a small LRU of recent queries and all the entry ids they matched.
+
+        Parameters:
+            max_size (int): The maximum number of cached queries
+        """
+        self.max_size = max_size
+        # Keeps a reference to the searched entries, so their id can not be reused while cached
+        self.queries: "OrderedDict[Tuple[int, Terms], Tuple[Any, List[int]]]" = (
+            OrderedDict()
+        )
+
+    @staticmethod
+    def normalize(sub_queries: List[str]) -> Terms:
+        """
+        Returns the query terms in a canonical form, so equivalent queries share a cache entry
+
+        Parameters:
+            sub_queries (List[str]): The query terms
+
+        Returns:
+            Terms: The sorted, normalized and non-empty unique terms
+        """
+        return tuple(sorted({Bookmark.normalize(term) for term in sub_queries if term}))
+
+    def get(self, entries: Any, terms: Terms) -> Optional[List[int]]:
+        """
+        Returns the ids matched by exactly these terms
+
+        Parameters:
+            entries (Any): The searched entries
+            terms (Terms): The normalized query terms
+
+        Returns:
+            Optional[List[int]]: The matched ids or None if the query is not cached
+        """
+        key = (id(entries), terms)
+        cached = self.queries.get(key)
+        if cached is None or cached[0] is not entries:
+            return None
+        self.queries.move_to_end(key)
+        return cached[1]
+
+    def get_refinable(self, entries: Any, terms: Terms) -> Optional[List[int]]:
+        """
+        Returns the smallest cached id list that is guaranteed to contain all matches of the terms.
+        That is the case for every cached query whose terms are each contained in one of the new terms,
+        e.g. when a term was extended or a term was added.
+
+        Parameters:
+            entries (Any): The searched entries
+            terms (Terms): The normalized query terms
+
+        Returns:
+            Optional[List[int]]: The ids to filter or None if no cached query can be refined
+        """
+        best: Optional[List[int]] = None
+        for (entries_id, cached_terms), (cached_entries, ids) in self.queries.items():
+            if entries_id != id(entries) or cached_entries is not entries:
+                continue
+            if best is not None and len(ids) >= len(best):
+                continue
+            if all(
+                any(cached_term in term for term in terms)
+                for cached_term in cached_terms
+            ):
+                best = ids
+        return best
+
+    def put(self, entries: Any, terms: Terms, ids: List[int]) -> None:
+        """
+        Caches the ids matched by the terms and evicts the least recently used query if needed
+
+        Parameters:
+            entries (Any): The searched entries
+            terms (Terms): The normalized query terms
+            ids (List[int]): All ids matched by the terms
+        """
+        key = (id(entries), terms)
+        self.queries[key] = (entries, ids)
+        self.queries.move_to_end(key)
+        while len(self.queries) > self.max_size:
+            self.queries.popitem(last=False)
+
+    def retain(self, searched_entries: Iterable[Any]) -> None:
+        """
+        Drops the cached queries of all other entries, e.g. of files that were reloaded,
+        so their previous entries are freed instead of being kept alive by the cache
+
+        Parameters:
+            searched_entries (Iterable[Any]): The entries that are still searched
+        """
+        entries_ids = {id(entries) for entries in searched_entries}
+        for key in [key for key in self.queries if key[0] not in entries_ids]:
+            del self.queries[key]
+
+    def clear(self) -> None:
+        """
+        Removes all cached queries
+        """
+        self.queries.clear()
@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+class QueryTimer:
+    def __init__(self) -> None:
+        """
+        Initializes the QueryTimer class, which measures the consecutive stages of a single query.
+        """
+        self.stages: Dict[str, float] = {}
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        """
+        Records the time since the previous lap as the duration of the stage
+
+        Parameters:
+            stage (str): The name of the finished stage
+        """
+        now = time.perf_counter()
+        self.stages[stage] = (now - self.last) * 1000
+        self.last = now
+
+
+class QueryStats:
+    def __init__(self, window: int = 500, dump_interval: float = 300.0) -> None:
+        """
+        Initializes the QueryStats class, which aggregates the timings and counts of recent queries
+        and the load times of the bookmarks files into rolling percentiles.
+
+        Parameters:
+            window (int): The number of recent queries to aggregate
+            dump_interval (float): The minimal number of seconds between two dumps to the debug log
+        """
+        self.queries: Deque[Tuple[Dict[str, float], Dict[str, int]]] = deque(
+            maxlen=window
+        )
+        self.source_searches: Dict[str, Deque[float]] = {}
+        self.loads: Dict[str, Tuple[float, int]] = {}
+        self.window = window
+        self.dump_interval = dump_interval
+        self.last_dump = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record_query(
+        self,
+        stages: Dict[str, float],
+        counts: Dict[str, int],
+        source_timings: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """
+        Records a finished query
+
+        Parameters:
+            stages (Dict[str, float]): The duration of each stage in milliseconds
+            counts (Dict[str, int]): The counted files, entries and matches
+            source_timings (Optional[Dict[str, float]]): The search duration of each bookmarks file in milliseconds
+        """
+        with self.lock:
+            self.queries.append((stages, counts))
+            for path, duration in (source_timings or {}).items():
+                timings = self.source_searches.get(path)
+                if timings is None:
+                    timings = self.source_searches[path] = deque(maxlen=self.window)
+                timings.append(duration)
+
+    def record_load(self, path: str, duration: float, entries: int) -> None:
+        """
+        Records the load of a bookmarks file
+
+        Parameters:
+            path (str): The path to the bookmarks
+            duration (float): The duration of the load in milliseconds
+            entries (int): The number of loaded bookmarks
+        """
+        with self.lock:
+            self.loads[path] = (duration, entries)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the percentiles of every stage and count of the recent queries
+
+        Returns:
+            Dict[str, Dict[str, float]]: The p50, p90, p99 and max of each stage and count by name
+        """
+        with self.lock:
+            queries = list(self.queries)
+
+        values: Dict[str, List[float]] = {}
+        for stages, counts in queries:
+            for name, value in list(stages.items()) + list(counts.items()):
+                values.setdefault(name, []).append(value)
+
+        return {
+            name: QueryStats.percentiles(samples) for name, samples in values.items()
+        }
+
+    def slowest_sources(self, limit: int = 3) -> List[Tuple[str, float]]:
+        """
+        Returns the bookmarks files with the highest median search time
+
+        Parameters:
+            limit (int): The maximum number of returned files
+
+        Returns:
+            List[Tuple[str, float]]: The paths and median search times in milliseconds, slowest first
+        """
+        with self.lock:
+            medians = [
+                (path, QueryStats.percentiles(list(timings))["p50"])
+                for path, timings in self.source_searches.items()
+                if timings
+            ]
+        return sorted(medians, key=lambda median: median[1], reverse=True)[:limit]
+
+    def format_lines(self) -> List[str]:
+        """
+        Returns a human readable report of the stats
+
+        Returns:
+            List[str]: One line per stage, count, slow file and loaded file
+        """
+        with self.lock:
+            query_count = len(self.queries)
+            loads = dict(self.loads)
+
+        lines = ["%s queries" % query_count]
+        for name, percentiles in self.summary().items():
+            lines.append(
+                "%s: p50 %.2f, p90 %.2f, p99 %.2f, max %.2f"
+                % (
+                    name,
+                    percentiles["p50"],
+                    percentiles["p90"],
+                    percentiles["p99"],
+                    percentiles["max"],
+                )
+            )
+        for path, median in self.slowest_sources():
+            lines.append("search %s: p50 %.2f ms" % (path, median))
+        for path, (duration, entries) in loads.items():
+            lines.append("load %s: %.2f ms, %s bookmarks" % (path, duration, entries))
+        return lines
+
+    def should_dump(self) -> bool:
+        """
+        Checks if the stats are due to be dumped to the debug log and restarts the interval if so
+
+        Returns:
+            bool: True if the stats should be dumped, False otherwise
+        """
+        now = time.monotonic()
+        if now - self.last_dump < self.dump_interval:
+            return False
+        self.last_dump = now
+        return True
+
+    @staticmethod
+    def percentiles(samples: List[float]) -> Dict[str, float]:
+        """
+        Returns the p50, p90, p99 and max of the samples
+
+        Parameters:
+            samples (List[float]): The samples, at least one
+
+        Returns:
+            Dict[str, float]: The percentiles by name
+        """
+        samples = sorted(samples)
+        last = len(samples) - 1
+        return {
+            "p50": samples[min(last, int(0.5 * len(samples)))],
+            "p90": samples[min(last, int(0.9 * len(samples)))],
+            "p99": samples[min(last, int(0.99 * len(samples)))],
+            "max": samples[last],
+        }
@@ -0,0 +1,86 @@
+import logging
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+from .BookmarkQuerier import QueryCancelled
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str, Callable[[], bool]], Any]
+Callback = Callable[[Any], None]
+
+
+class QueryWorker(threading.Thread):
+    def __init__(self, handler: Handler) -> None:
+        """
+        Initializes the QueryWorker class, a thread which answers the latest query only.
+        Every submitted query increments the generation, which cancels the search of all earlier ones.
+
+        Parameters:
+            handler (Handler): Answers a query, called with the query and a function returning True once it is superseded
+        """
+        super().__init__(name="QueryWorker", daemon=True)
+        self.handler = handler
+        self.generation = 0
+        self.pending: Optional[Tuple[int, str, Callback]] = None
+        self.condition = threading.Condition()
+        self.stopped = False
+        # The number of queries abandoned because a newer one was submitted
+        self.cancelled_queries = 0
+
+    def submit(self, query: str, callback: Callback) -> int:
+        """
+        Queues a query in place of any query that was not answered yet
+
+        Parameters:
+            query (str): The query
+            callback (Callback): Called on the worker thread with the result, unless the query was superseded
+
+        Returns:
+            int: The generation of the query
+        """
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, query, callback)
+            self.condition.notify()
+            return self.generation
+
+    def stop(self) -> None:
+        """
+        Stops the worker thread and cancels the running query
+        """
+        with self.condition:
+            self.stopped = True
+            self.generation += 1
+            self.condition.notify()
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                generation, query, callback = self.pending
+                self.pending = None
+
+            def is_cancelled(generation: int = generation) -> bool:
+                return self.generation != generation
+
+            try:
+                result = self.handler(query, is_cancelled)
+            except QueryCancelled:
+                self.cancelled_queries += 1
+                continue
+            except Exception:
+                logger.exception("Could not answer query %s" % query)
+                continue
+
+            # A newer query may have been submitted after the search finished
+            if is_cancelled():
+                self.cancelled_queries += 1
+                continue
+            try:
+                callback(result)
+            except Exception:
+                logger.exception("Could not render the results of query %s" % query)
@@ -0,0 +1,105 @@
+import heapq
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class RankedMatches:
+    def __init__(
+        self, max_len: int, key: Optional[Callable[[Any], Any]] = None
+    ) -> None:
+        """
+        Initializes the RankedMatches class, a bounded heap which keeps the best scored matches.
+        On equal scores, the match that was pushed first wins.
+
+        Parameters:
+            max_len (int): The maximum number of kept matches
+            key (Optional[Callable[[Any], Any]]): Returns the key of a match, only the best match per key is kept if set
+        """
+        self.max_len = max_len
+        self.key = key
+        self.heap: List[Tuple[float, int, Any]] = []
+        # The kept heap item by key, only used if a key is set
+        self.kept: Dict[Any, Tuple[float, int, Any]] = {}
+        self.pushed = 0
+
+    def is_full(self) -> bool:
+        """
+        Checks if the maximum number of matches is kept
+
+        Returns:
+            bool: True if the heap is full, False otherwise
+        """
+        return len(self.heap) >= self.max_len
+
+    def min_score(self) -> float:
+        """
+        Returns the score a new match has to beat to be kept, only valid if the heap is full
+
+        Returns:
+            float: The lowest kept score
+        """
+        return self.heap[0][0]
+
+    def threshold(self) -> float:
+        """
+        Returns the score a new match has to beat to be kept
+
+        Returns:
+            float: The lowest kept score if the heap is full, -inf if it is not and inf if no match is kept at all
+        """
+        if self.max_len <= 0:
+            return math.inf
+        if not self.is_full():
+            return -math.inf
+        return self.min_score()
+
+    def push(self, score: float, match: Any) -> None:
+        """
+        Adds a match if it is better than the worst kept match
+
+        Parameters:
+            score (float): The score of the match
+            match (Any): The match
+        """
+        # The negated counter makes earlier matches win ties and avoids comparing the matches
+        item = (score, -self.pushed, match)
+        self.pushed += 1
+        if self.key is not None:
+            self.push_unique(item)
+        elif not self.is_full():
+            heapq.heappush(self.heap, item)
+        elif self.max_len > 0 and item > self.heap[0]:
+            heapq.heapreplace(self.heap, item)
+
+    def push_unique(self, item: Tuple[float, int, Any]) -> None:
+        """
+        Adds a heap item if it is better than the worst kept item and the kept item with the same key
+
+        Parameters:
+            item (Tuple[float, int, Any]): The score, negated push counter and match
+        """
+        match_key = self.key(item[2])
+        kept = self.kept.get(match_key)
+        if kept is not None:
+            if item < kept:
+                return
+            # The heap only holds max_len items, so removing from it directly is cheap
+            self.heap.remove(kept)
+            heapq.heapify(self.heap)
+        elif self.is_full():
+            if self.max_len <= 0 or item < self.heap[0]:
+                return
+            evicted = heapq.heappop(self.heap)
+            del self.kept[self.key(evicted[2])]
+
+        heapq.heappush(self.heap, item)
+        self.kept[match_key] = item
+
+    def sorted(self) -> List[Any]:
+        """
+        Returns the kept matches from best to worst
+
+        Returns:
+            List[Any]: The matches
+        """
+        return [item[2] for item in sorted(self.heap, reverse=True)]
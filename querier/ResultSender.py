@@ -0,0 +1,45 @@
+import logging
+from typing import Any, Callable, List
+
+logger = logging.getLogger(__name__)
+
+ResponseFactory = Callable[[Any, List[Any]], Any]
+
+
+class ResultSender:
+    def __init__(self, extension: Any, create_response: ResponseFactory) -> None:
+        """
+        Initializes the ResultSender class, which sends the results of a keyword query once the query worker found them.
+        Ulauncher's extension API v2 only sends the action an event listener returns, it has no public way to answer
+        an event later from another thread. The results are therefore sent through the client of the extension,
+        the same way Ulauncher sends a returned action, and this is the only place relying on it.
+
+        Parameters:
+            extension (Any): The Ulauncher extension, whose _client sends responses to Ulauncher
+            create_response (ResponseFactory): Creates the response rendering the items for an event
+        """
+        self.extension = extension
+        self.create_response = create_response
+        self.warned = False
+
+    def send(self, event: Any, items: List[Any]) -> bool:
+        """
+        Sends the items found for a keyword query to Ulauncher
+
+        Parameters:
+            event (Any): The answered event
+            items (List[Any]): The items to render
+
+        Returns:
+            bool: True if the items were sent, False if the client of this Ulauncher version can not send them
+        """
+        send = getattr(getattr(self.extension, "_client", None), "send", None)
+        if send is None:
+            if not self.warned:
+                logger.error(
+                    "This Ulauncher version has no client to send results with, queries are not answered"
+                )
+                self.warned = True
+            return False
+        send(self.create_response(event, items))
+        return True
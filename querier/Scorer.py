@@ -0,0 +1,286 @@
+import re
+from typing import List, Optional, Pattern, Sequence, Tuple
+
+# A URL scheme like https://, only matched at the start of the URL as URLs may contain other URLs
+scheme_pattern = re.compile(r"[a-z][a-z0-9+.-]*://")
+
+
+class Scorer:
+    title_match = 4.0
+    url_match = 2.0
+    folder_match = 1.0
+    prefix_bonus = 2.0
+    word_boundary_bonus = 1.0
+    # The share of the field score a term with a typo gets, so exact matches rank first
+    fuzzy_match_factor = 0.5
+    # Added for a bookmark with the highest frecency boost, about as much as a title match
+    frecency_weight = 3.0
+    # URLs longer than this do not get any bonus for their length
+    url_length_limit = 200
+
+    def __init__(self) -> None:
+        """
+        Initializes the Scorer class, which scores bookmarks for a query and bounds their scores cheaply
+        """
+        # The last terms and their word start patterns, as every bookmark of a query is scored with them
+        self.word_starts: Tuple[Tuple[str, ...], List[Pattern[str]]] = ((), [])
+
+    def score(
+        self,
+        title: str,
+        url: str,
+        folder: str,
+        terms: Tuple[str, ...],
+        patterns: Optional[Sequence[Optional[Pattern[str]]]] = None,
+    ) -> float:
+        """
+        Scores how well a bookmark matches the query terms.
+        Title matches rank above URL matches, which rank above folder matches. Matches at the start
+        of a field or of a word rank higher and shorter URLs rank higher.
+
+        Parameters:
+            title (str): The normalized bookmark title
+            url (str): The normalized bookmark URL
+            folder (str): The normalized parent folder names or an empty string if folders are not searched
+            terms (Tuple[str, ...]): The normalized query terms
+            patterns (Optional[Sequence[Optional[Pattern[str]]]], optional): The patterns matching each term
+                with a typo, used for terms which are not found exactly
+
+        Returns:
+            float: The score, never higher than bound or upper_bound
+        """
+        if not terms:
+            return 0.0
+
+        word_starts = self.word_start_patterns(terms)
+        score = self.url_length_bonus(len(url))
+        url = Scorer.strip_scheme(url)
+        fields = (
+            (title, self.title_match),
+            (url, self.url_match),
+            (folder, self.folder_match),
+        )
+        for term_id, term in enumerate(terms):
+            for field, field_score in fields:
+                position = field.find(term)
+                if position < 0:
+                    continue
+
+                score += field_score
+                if position == 0:
+                    score += self.prefix_bonus + self.word_boundary_bonus
+                elif word_starts[term_id].search(field, position) is not None:
+                    score += self.word_boundary_bonus
+                break
+            else:
+                pattern = patterns[term_id] if patterns is not None else None
+                if pattern is None:
+                    continue
+                for field, field_score in fields:
+                    if pattern.search(field) is not None:
+                        score += field_score * self.fuzzy_match_factor
+                        break
+
+        return score
+
+    def frecency_score(self, boost: float) -> float:
+        """
+        Returns the score added for how often and recently a bookmark was visited
+
+        Parameters:
+            boost (float): The frecency boost between 0 and 1
+
+        Returns:
+            float: The added score
+        """
+        return self.frecency_weight * boost
+
+    def bound(
+        self,
+        search_text: str,
+        name_end: int,
+        terms: Tuple[str, ...],
+        matched_text: Optional[str] = None,
+    ) -> float:
+        """
+        Returns an upper bound of the score of a bookmark, much tighter than upper_bound and still cheaper than score.
+        Terms in the title or URL add exactly what score adds for them, as it searches those first,
+        all other terms add the most a folder match can add.
+
+        Parameters:
+            search_text (str): The normalized name and URL of the bookmark
+            name_end (int): The length of the normalized name
+            terms (Tuple[str, ...]): The normalized query terms
+            matched_text (Optional[str], optional): The text the terms were matched against with typos allowed,
+                terms missing in it can only add a match with a typo
+
+        Returns:
+            float: The upper bound of the score
+        """
+        if not terms:
+            return 0.0
+
+        # Summed in the same order as score, so an exact bound equals the score
+        bound = self.url_length_bonus(len(search_text) - name_end - 1)
+        url_start = -1
+        for term, word_start in zip(terms, self.word_start_patterns(terms)):
+            position = search_text.find(term, 0, name_end)
+            if position >= 0:
+                bound += self.title_match
+                if position == 0:
+                    bound += self.prefix_bonus + self.word_boundary_bonus
+                elif word_start.search(search_text, position, name_end) is not None:
+                    bound += self.word_boundary_bonus
+                continue
+
+            if url_start < 0:
+                url_start = Scorer.host_start(search_text, name_end + 1)
+            position = search_text.find(term, url_start)
+            if position >= 0:
+                bound += self.url_match
+                if position == url_start:
+                    bound += self.prefix_bonus + self.word_boundary_bonus
+                elif word_start.search(search_text, position) is not None:
+                    bound += self.word_boundary_bonus
+            elif matched_text is not None and term not in matched_text:
+                bound += self.title_match * self.fuzzy_match_factor
+            else:
+                bound += self.folder_match
+                bound += self.prefix_bonus + self.word_boundary_bonus
+        return bound
+
+    def upper_bound(
+        self, url_len: int, terms: Tuple[str, ...], boosted: bool = False
+    ) -> float:
+        """
+        Returns the highest score a bookmark with a URL of this length could reach, which is cheap to compute
+
+        Parameters:
+            url_len (int): The length of the normalized bookmark URL
+            terms (Tuple[str, ...]): The normalized query terms
+            boosted (bool, optional): Whether frecency scores are added
+
+        Returns:
+            float: The upper bound of the score
+        """
+        bound = self.frecency_weight if boosted else 0.0
+        if not terms:
+            return bound
+        return (
+            bound + self.max_term_score() * len(terms) + self.url_length_bonus(url_len)
+        )
+
+    def max_score(self, terms: Tuple[str, ...], boosted: bool = False) -> float:
+        """
+        Returns the highest score any bookmark could reach
+
+        Parameters:
+            terms (Tuple[str, ...]): The normalized query terms
+            boosted (bool, optional): Whether frecency scores are added
+
+        Returns:
+            float: The highest possible score
+        """
+        return self.upper_bound(0, terms, boosted)
+
+    def max_term_score(self) -> float:
+        """
+        Returns the highest score a single term can add
+
+        Returns:
+            float: The highest score of a term
+        """
+        return self.title_match + self.prefix_bonus + self.word_boundary_bonus
+
+    def max_later_term_score(self) -> float:
+        """
+        Returns the highest score a single term can add without starting the title
+
+        Returns:
+            float: The highest score of a term later in the title, in the URL or in the folders
+        """
+        return max(
+            self.title_match + self.word_boundary_bonus,
+            self.url_match + self.prefix_bonus + self.word_boundary_bonus,
+            self.folder_match + self.prefix_bonus + self.word_boundary_bonus,
+        )
+
+    def max_inner_term_score(self) -> float:
+        """
+        Returns the highest score a single term can add without starting a word of the title or URL
+
+        Returns:
+            float: The highest score of a term within a word or at the very start of the folders
+        """
+        return max(
+            self.title_match,
+            self.url_match,
+            self.folder_match + self.prefix_bonus + self.word_boundary_bonus,
+        )
+
+    def url_length_bonus(self, url_len: int) -> float:
+        """
+        Returns the bonus between 0 and 1 for short URLs
+
+        Parameters:
+            url_len (int): The length of the bookmark URL
+
+        Returns:
+            float: The bonus, 1 for an empty URL
+        """
+        return 1.0 - min(url_len, self.url_length_limit) / self.url_length_limit
+
+    @staticmethod
+    def strip_scheme(url: str) -> str:
+        """
+        Removes the scheme and a leading www. from the URL, so prefix matches work on the host
+
+        Parameters:
+            url (str): The normalized URL
+
+        Returns:
+            str: The URL without scheme
+        """
+        return url[Scorer.host_start(url) :]
+
+    @staticmethod
+    def host_start(text: str, url_start: int = 0) -> int:
+        """
+        Returns the position of a URL after its scheme and a leading www.
+
+        Parameters:
+            text (str): The text containing the normalized URL up to its end
+            url_start (int, optional): The position of the URL in the text
+
+        Returns:
+            int: The position of the host, or of the URL if it has no scheme
+        """
+        scheme = scheme_pattern.match(text, url_start)
+        if scheme is not None:
+            url_start = scheme.end()
+        if text.startswith("www.", url_start):
+            url_start += 4
+        return url_start
+
+    def word_start_patterns(self, terms: Tuple[str, ...]) -> List[Pattern[str]]:
+        """
+        Returns the patterns finding each term at the start of a word, i.e. not preceded by a letter or digit
+
+        Parameters:
+            terms (Tuple[str, ...]): The normalized query terms
+
+        Returns:
+            List[Pattern[str]]: The pattern of each term
+        """
+        cached_terms, patterns = self.word_starts
+        if cached_terms != terms:
+            # [^\W_] matches exactly the characters of str.isalnum. The term comes first and the lookbehind
+            # skips back over it, which is much faster than looking behind at every position
+            patterns = [
+                re.compile(
+                    re.escape(term) + r"(?<![^\W_]%s)" % ("." * len(term)), re.DOTALL
+                )
+                for term in terms
+            ]
+            self.word_starts = (terms, patterns)
+        return patterns
@@ -0,0 +1,182 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Unsigned ints of at least 4 bytes, a quarter of the memory a list of ints takes
+posting_typecode = "I"
+
+# The trigrams starting with a separator by their second character, and the ones with a separator in the middle
+# by their last character
+SeparatorTrigrams = Tuple[Dict[str, List[str]], Dict[str, List[str]]]
+
+
+class TrigramIndex:
+    # Stop intersecting once a posting list is this many times longer than the candidates,
+    # because verifying the remaining candidates is cheaper than building another set
+    max_intersection_ratio = 8
+
+    def __init__(self, texts: List[str]) -> None:
+        """
+        Initializes the TrigramIndex class, which maps every trigram of the texts
+        to the ascending ids (list positions) of the texts containing it, stored as compact arrays.
+
+        Parameters:
+            texts (List[str]): The normalized texts to index
+        """
+        self.postings: Dict[str, "array[int]"] = {}
+        self.size = len(texts)
+        # Grouped on the first call of word_start_candidates, most indexes are never asked for word starts
+        self.separator_trigrams: Optional[SeparatorTrigrams] = None
+        # The last characters of the trigrams by their first two, grouped on the first call of followers
+        self.pair_followers: Optional[Dict[str, List[str]]] = None
+
+        for text_id, text in enumerate(texts):
+            for trigram in TrigramIndex.trigrams(text):
+                posting = self.postings.get(trigram)
+                if posting is None:
+                    self.postings[trigram] = array(posting_typecode, (text_id,))
+                else:
+                    posting.append(text_id)
+
+    @staticmethod
+    def restore(postings: Dict[str, bytes], size: int) -> "TrigramIndex":
+        """
+        Creates an index from previously built posting lists
+
+        Parameters:
+            postings (Dict[str, bytes]): The raw bytes of the ascending text ids by trigram
+            size (int): The number of indexed texts
+
+        Returns:
+            TrigramIndex: The index
+        """
+        trigram_index = TrigramIndex([])
+        for trigram, raw_posting in postings.items():
+            posting = array(posting_typecode)
+            posting.frombytes(raw_posting)
+            trigram_index.postings[trigram] = posting
+        trigram_index.size = size
+        return trigram_index
+
+    def candidates(self, terms: Sequence[str]) -> Optional[List[int]]:
+        """
+        Returns the ids of the texts which may contain all terms.
+        The returned ids are a superset of the actual matches, so they still have to be verified.
+
+        Parameters:
+            terms (Sequence[str]): The normalized terms to look up
+
+        Returns:
+            Optional[List[int]]: The ascending candidate ids or None if no term is long enough to use the index
+        """
+        trigrams: Set[str] = set()
+        for term in terms:
+            trigrams.update(TrigramIndex.trigrams(term))
+
+        if not trigrams:
+            return None
+
+        postings: List["array[int]"] = []
+        for trigram in trigrams:
+            posting = self.postings.get(trigram)
+            if posting is None:
+                return []
+            postings.append(posting)
+
+        postings.sort(key=len)
+        candidates = list(postings[0])
+        for posting in postings[1:]:
+            if len(posting) > len(candidates) * self.max_intersection_ratio:
+                break
+            posting_set = set(posting)
+            candidates = [text_id for text_id in candidates if text_id in posting_set]
+
+        return candidates
+
+    def word_start_candidates(
+        self, term: str, max_candidates: int
+    ) -> Optional[Set[int]]:
+        """
+        Returns the ids of the texts in which the term may start a word, i.e. follow a character that is no letter
+        or digit. Occurrences at the very start of a text are not found, as no trigram covers a character before them.
+        The returned ids are a superset of the actual ones.
+
+        Parameters:
+            term (str): The normalized term
+            max_candidates (int): The most ids worth collecting
+
+        Returns:
+            Optional[Set[int]]: The candidate ids or None if the postings to collect hold more than max_candidates ids
+        """
+        if self.separator_trigrams is None:
+            self.separator_trigrams = TrigramIndex.group_separator_trigrams(
+                self.postings
+            )
+        starting, ending = self.separator_trigrams
+
+        trigrams = [
+            trigram
+            for trigram in starting.get(term[:1], [])
+            if trigram.startswith(term[:2], 1)
+        ]
+        if len(term) == 1:
+            # A word of a single character ending the text is only covered by the trigram ending with it
+            trigrams.extend(ending.get(term, []))
+
+        postings = [self.postings[trigram] for trigram in trigrams]
+        if sum(map(len, postings)) > max_candidates:
+            return None
+        candidates: Set[int] = set()
+        for posting in postings:
+            candidates.update(posting)
+        return candidates
+
+    def followers(self, prefix: str) -> List[str]:
+        """
+        Returns the characters following a prefix of two characters in any text
+
+        Parameters:
+            prefix (str): The two characters
+
+        Returns:
+            List[str]: The characters, each once
+        """
+        if self.pair_followers is None:
+            pair_followers: Dict[str, List[str]] = {}
+            for trigram in self.postings:
+                pair_followers.setdefault(trigram[:2], []).append(trigram[2])
+            self.pair_followers = pair_followers
+        return self.pair_followers.get(prefix, [])
+
+    @staticmethod
+    def group_separator_trigrams(trigrams: Iterable[str]) -> SeparatorTrigrams:
+        """
+        Groups the trigrams containing a separator, i.e. a character that is no letter or digit, by what follows it
+
+        Parameters:
+            trigrams (Iterable[str]): The trigrams of the index
+
+        Returns:
+            SeparatorTrigrams: The trigrams starting with a separator by their second character,
+                and the trigrams with a separator in the middle by their last character
+        """
+        starting: Dict[str, List[str]] = {}
+        ending: Dict[str, List[str]] = {}
+        for trigram in trigrams:
+            if not trigram[0].isalnum():
+                starting.setdefault(trigram[1], []).append(trigram)
+            if not trigram[1].isalnum():
+                ending.setdefault(trigram[2], []).append(trigram)
+        return starting, ending
+
+    @staticmethod
+    def trigrams(text: str) -> Set[str]:
+        """
+        Returns all trigrams of the text
+
+        Parameters:
+            text (str): The text
+
+        Returns:
+            Set[str]: The trigrams of the text
+        """
+        return {text[i : i + 3] for i in range(len(text) - 2)}
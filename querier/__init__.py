@@ -1 +1,14 @@
+from .Bookmark import Bookmark as Bookmark
 from .BookmarkQuerier import BookmarkQuerier as BookmarkQuerier
+from .BookmarkQuerier import QueryCancelled as QueryCancelled
+from .TrigramIndex import TrigramIndex as TrigramIndex
+from .FolderIndex import FolderIndex as FolderIndex
+from .FuzzyMatcher import FuzzyMatcher as FuzzyMatcher
+from .ItemCache import ItemCache as ItemCache
+from .QueryCache import QueryCache as QueryCache
+from .RankedMatches import RankedMatches as RankedMatches
+from .Scorer import Scorer as Scorer
+from .QueryStats import QueryStats as QueryStats
+from .QueryStats import QueryTimer as QueryTimer
+from .QueryWorker import QueryWorker as QueryWorker
+from .ResultSender import ResultSender as ResultSender
@@ -0,0 +1,391 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+# Add the current directory to the Python path
+sys.path.append(os.path.abspath("."))
+
+from indexer import BookmarkIndex, IndexSnapshot, ProfileScanner  # noqa: E402
+from querier import BookmarkQuerier, RankedMatches  # noqa: E402
+
+words = (
+    "python typescript rust golang docs tutorial guide reference api blog news "
+    "release notes github gitlab issue pull request wiki linux kernel ubuntu debian "
+    "arch docker kubernetes helm terraform ansible postgres mysql redis kafka react "
+    "vue angular svelte webpack vite testing pytest unittest benchmark performance "
+    "memory cache index search query ranking café résumé straße naïve"
+).split()
+domains = [
+    "github.com",
+    "docs.python.org",
+    "stackoverflow.com",
+    "medium.com",
+    "dev.to",
+    "wikipedia.org",
+]
+heavy_dirs = [
+    "Cache",
+    "Code Cache",
+    "IndexedDB",
+    "Service Worker",
+    "GPUCache",
+    "Local Storage",
+]
+# Ranking the matches of the shortest queries may take at most this many times as long as finding them
+max_rank_to_match_ratio = 4.0
+
+
+def generate_bookmarks(count: int, depth: int, rng: random.Random) -> Dict[str, Any]:
+    """
+    Generates a Chromium Bookmarks file with the given number of bookmarks
+
+    Parameters:
+        count (int): The number of bookmarks
+        depth (int): The maximum folder depth
+        rng (random.Random): The random generator
+
+    Returns:
+        Dict[str, Any]: The content of the Bookmarks file
+    """
+    next_id = [0]
+
+    def node(node_type: str, name: str) -> Dict[str, Any]:
+        next_id[0] += 1
+        return {
+            "date_added": str(13300000000000000 + next_id[0]),
+            "date_last_used": "0",
+            "guid": "%032x" % rng.getrandbits(128),
+            "id": str(next_id[0]),
+            "meta_info": {"power_bookmark_meta": "x" * 40},
+            "name": name,
+            "type": node_type,
+        }
+
+    roots = {
+        name: dict(node("folder", title), children=[])
+        for name, title in [
+            ("bookmark_bar", "Bookmarks bar"),
+            ("other", "Other bookmarks"),
+            ("synced", "Mobile bookmarks"),
+        ]
+    }
+    folders = [roots["bookmark_bar"], roots["other"]]
+    folder_depths = [0, 0]
+
+    for _ in range(count):
+        # Occasionally open a new folder below an existing one
+        if rng.random() < 0.05:
+            parent_index = rng.randrange(len(folders))
+            if folder_depths[parent_index] < depth:
+                folder = dict(
+                    node("folder", " ".join(rng.sample(words, 2)).title()), children=[]
+                )
+                folders[parent_index]["children"].append(folder)
+                folders.append(folder)
+                folder_depths.append(folder_depths[parent_index] + 1)
+
+        name = " ".join(rng.sample(words, rng.randint(2, 6))).capitalize()
+        path = "/".join(rng.sample(words, rng.randint(1, 4)))
+        bookmark = dict(
+            node("url", name), url="https://%s/%s" % (rng.choice(domains), path)
+        )
+        rng.choice(folders)["children"].append(bookmark)
+
+    return {"checksum": "0" * 32, "roots": roots, "version": 1}
+
+
+def generate_config(
+    config_dir: str, count: int, depth: int, profiles: int, rng: random.Random
+) -> List[str]:
+    """
+    Generates a fake ~/.config tree with chromium user data directories, profiles and heavy cache directories
+
+    Parameters:
+        config_dir (str): The directory to create the tree in
+        count (int): The number of bookmarks per profile
+        depth (int): The maximum folder depth
+        profiles (int): The number of profiles
+        rng (random.Random): The random generator
+
+    Returns:
+        List[str]: The paths to the generated Bookmarks files
+    """
+    bookmarks_paths: List[str] = []
+    browsers = ["google-chrome", "chromium", "BraveSoftware/Brave-Browser", "vivaldi"]
+
+    for profile_index in range(profiles):
+        user_data_dir = os.path.join(
+            config_dir, browsers[profile_index % len(browsers)]
+        )
+        profile_name = (
+            "Default" if profile_index < len(browsers) else "Profile %s" % profile_index
+        )
+        profile_dir = os.path.join(user_data_dir, profile_name)
+        os.makedirs(profile_dir, exist_ok=True)
+        open(os.path.join(user_data_dir, "Local State"), "w").close()
+
+        for heavy_dir in heavy_dirs:
+            for sub_dir_index in range(5):
+                sub_dir = os.path.join(profile_dir, heavy_dir, "%s" % sub_dir_index)
+                os.makedirs(sub_dir, exist_ok=True)
+                for file_index in range(20):
+                    open(os.path.join(sub_dir, "data_%s" % file_index), "w").close()
+
+        bookmarks_path = os.path.join(profile_dir, "Bookmarks")
+        with open(bookmarks_path, "w") as data_file:
+            json.dump(generate_bookmarks(count, depth, rng), data_file)
+        # Chromium keeps a backup next to the Bookmarks file
+        with open(bookmarks_path + ".bak", "w") as data_file:
+            data_file.write("{}")
+        bookmarks_paths.append(bookmarks_path)
+
+    return bookmarks_paths
+
+
+def generate_queries(rng: random.Random, count: int) -> List[str]:
+    """
+    Generates queries the way they arrive while typing, one per keystroke
+
+    Parameters:
+        rng (random.Random): The random generator
+        count (int): The number of typed queries
+
+    Returns:
+        List[str]: The queries
+    """
+    queries: List[str] = []
+    while len(queries) < count:
+        query = " ".join(rng.sample(words, rng.randint(1, 2)))
+        queries.extend(query[:end] for end in range(1, len(query) + 1))
+    return queries[:count]
+
+
+def timed(function: Callable[[], Any]) -> float:
+    """
+    Returns the duration of a call in milliseconds
+    """
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000
+
+
+def percentiles(durations: List[float]) -> Dict[str, float]:
+    """
+    Returns the median, p90, p99 and maximum of the durations
+    """
+    durations = sorted(durations)
+
+    def percentile(fraction: float) -> float:
+        return round(
+            durations[min(len(durations) - 1, int(fraction * len(durations)))], 4
+        )
+
+    return {
+        "p50_ms": percentile(0.5),
+        "p90_ms": percentile(0.9),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(durations[-1], 4),
+    }
+
+
+def run(size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Runs all benchmarks for one corpus size
+
+    Parameters:
+        size (int): The number of bookmarks per profile
+        args (argparse.Namespace): The command line arguments
+
+    Returns:
+        Dict[str, Any]: The results
+    """
+    rng = random.Random(args.seed)
+    result: Dict[str, Any] = {
+        "size": size,
+        "profiles": args.profiles,
+        "depth": args.depth,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_dir = os.path.join(tmp_dir, "config")
+        bookmarks_paths = [
+            (path, "chromium")
+            for path in generate_config(
+                config_dir, size, args.depth, args.profiles, rng
+            )
+        ]
+        result["file_bytes"] = sum(os.path.getsize(path) for path, _ in bookmarks_paths)
+
+        # Discovery, as done by collect_bookmarks_paths
+        cache_path = os.path.join(tmp_dir, "profiles.json")
+        cold_scanner = ProfileScanner(cache_path)
+        result["collect_bookmarks_paths_cold_ms"] = round(
+            timed(lambda: cold_scanner.scan(config_dir)), 4
+        )
+        cold_scanner.save()
+        warm_scanner = ProfileScanner(cache_path)
+        result["collect_bookmarks_paths_cached_ms"] = round(
+            timed(lambda: warm_scanner.scan(config_dir)), 4
+        )
+
+        # Loading and indexing
+        index = BookmarkIndex()
+        result["load_ms"] = round(timed(lambda: index.refresh(bookmarks_paths)), 4)
+        snapshot = IndexSnapshot(os.path.join(tmp_dir, "index.marshal"))
+        result["snapshot_save_ms"] = round(
+            timed(lambda: snapshot.save(index.sources)), 4
+        )
+        result["snapshot_load_ms"] = round(timed(snapshot.load), 4)
+
+        tracemalloc.start()
+        memory_index = BookmarkIndex()
+        memory_index.loader.max_workers = 1
+        memory_index.refresh(bookmarks_paths)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["load_peak_memory_mb"] = round(peak / 1024 / 1024, 2)
+        del memory_index
+
+        # Querying the loaded index, as done by get_items without building the result items,
+        # with a new querier per query and with one querier whose query cache is reused
+        queries = generate_queries(rng, args.queries)
+        sources = list(index.sources.values())
+
+        fresh_durations = [
+            timed(lambda query=query: BookmarkQuerier().search_sources(sources, query))
+            for query in queries
+        ]
+        result["search_fresh_querier"] = percentiles(fresh_durations)
+
+        querier = BookmarkQuerier()
+        reused_durations = [
+            timed(lambda query=query: querier.search_sources(sources, query))
+            for query in queries
+        ]
+        result["search_reused_querier"] = percentiles(reused_durations)
+
+        entries = [bookmark for source in sources for bookmark in source.entries]
+        scan_querier = BookmarkQuerier()
+        scan_duration = timed(
+            lambda: [scan_querier.match_all(entries, (query,)) for query in queries]
+        )
+        result["search_throughput_qps"] = round(
+            len(queries) / (scan_duration / 1000), 2
+        )
+
+        # The first keystroke matches most bookmarks, ranking them must not cost much more than finding them
+        ratios: Dict[str, float] = {}
+        for query in ["e", "p"]:
+            match_duration = min(
+                timed(
+                    lambda query=query: [
+                        BookmarkQuerier().match_all(
+                            source.entries, (query,), source.trigram_index
+                        )
+                        for source in sources
+                    ]
+                )
+                for _ in range(3)
+            )
+            rank_duration = min(
+                timed(lambda query=query: rank_sources(sources, query))
+                for _ in range(3)
+            )
+            ratios[query] = round(rank_duration / match_duration, 2)
+        result["rank_to_match_all_ratio"] = ratios
+
+    result["max_rss_mb"] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2
+    )
+    return result
+
+
+def rank_sources(sources: List[Any], query: str) -> None:
+    """
+    Ranks the matches of all sources into one global top-k with a new querier, as done by search_sources
+    """
+    querier = BookmarkQuerier()
+    ranked = RankedMatches(querier.max_matches_len)
+    for source in sources:
+        querier.rank_entries(source.entries, query, ranked, source.trigram_index)
+
+
+def git_commit() -> str:
+    """
+    Returns the current commit, so results of different commits can be told apart
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks discovery, loading and querying of bookmarks"
+    )
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000,100000",
+        help="Comma separated numbers of bookmarks per profile (default: 1000,10000,100000)",
+    )
+    parser.add_argument(
+        "--profiles", type=int, default=4, help="Number of profiles (default: 4)"
+    )
+    parser.add_argument(
+        "--depth", type=int, default=5, help="Maximum folder depth (default: 5)"
+    )
+    parser.add_argument(
+        "--queries",
+        type=int,
+        default=200,
+        help="Number of typed queries (default: 200)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Seed of the corpus generator (default: 42)",
+    )
+    parser.add_argument(
+        "--output", help="File to write the JSON results to, printed if omitted"
+    )
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "results": [],
+    }
+    for size in [int(size) for size in args.sizes.split(",")]:
+        print("Benchmarking %s bookmarks per profile" % size, file=sys.stderr)
+        results["results"].append(run(size, args))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+    slow_rankings = [
+        "%s bookmarks, query %r: ranking took %sx as long as matching"
+        % (result["size"], query, ratio)
+        for result in results["results"]
+        for query, ratio in result["rank_to_match_all_ratio"].items()
+        if ratio > max_rank_to_match_ratio
+    ]
+    if slow_rankings:
+        print("\n".join(slow_rankings), file=sys.stderr)
+        sys.exit(1)
@@ -3,15 +3,15 @@ import sys
 import os
 
 # Add the current directory to the Python path
-sys.path.append(os.path.abspath('.'))
+sys.path.append(os.path.abspath("."))
 
-if __name__ == '__main__':
+if __name__ == "__main__":
     # Discover and run all tests in the tests directory
     test_loader = unittest.TestLoader()
-    test_suite = test_loader.discover('tests', pattern='test_*.py')
-    
+    test_suite = test_loader.discover("tests", pattern="test_*.py")
+
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(test_suite)
-    
+
     # Exit with non-zero code if tests failed
-    sys.exit(not result.wasSuccessful()) 
\ No newline at end of file
+    sys.exit(not result.wasSuccessful())
@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+import unittest
+from indexer import BookmarkIndex
+from querier import QueryStats
+
+
+def write_bookmarks(path, names):
+    data = {
+        "roots": {
+            "bookmark_bar": {
+                "type": "folder",
+                "name": "Bookmarks bar",
+                "children": [
+                    {"type": "url", "name": name, "url": f"https://{name}.org"}
+                    for name in names
+                ],
+            },
+            "synced": {"type": "folder", "name": "Synced", "children": []},
+            "other": {"type": "folder", "name": "Other", "children": []},
+        }
+    }
+    with open(path, "w") as data_file:
+        json.dump(data, data_file)
+
+
+class TestBookmarkIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "Bookmarks")
+        write_bookmarks(self.path, ["python", "git"])
+        self.index = BookmarkIndex()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_loads_and_flattens_bookmarks(self):
+        self.index.refresh([(self.path, "chromium")])
+        source = self.index.sources[self.path]
+        self.assertEqual(source.browser, "chromium")
+        self.assertEqual(
+            [bookmark.name for bookmark in source.entries], ["python", "git"]
+        )
+        self.assertEqual(source.entries[0].folder, " Bookmarks bar")
+
+    def test_keeps_unchanged_files(self):
+        self.index.refresh([(self.path, "chromium")])
+        source = self.index.sources[self.path]
+        self.index.refresh([(self.path, "chromium")])
+        self.assertIs(self.index.sources[self.path], source)
+
+    def test_reloads_changed_files(self):
+        self.index.refresh([(self.path, "chromium")])
+        write_bookmarks(self.path, ["python", "git", "ulauncher"])
+        self.index.refresh([(self.path, "chromium")])
+        self.assertEqual(len(self.index.sources[self.path].entries), 3)
+
+    def test_drops_missing_and_invalid_files(self):
+        self.index.refresh([(self.path, "chromium")])
+        os.remove(self.path)
+        self.index.refresh([(self.path, "chromium")])
+        self.assertEqual(self.index.sources, {})
+
+        with open(self.path, "w") as data_file:
+            data_file.write("not json")
+        self.index.refresh([(self.path, "chromium")])
+        self.assertEqual(self.index.sources, {})
+
+    def test_keeps_previous_entries_of_unparsable_files(self):
+        self.index.refresh([(self.path, "chromium")])
+        source = self.index.sources[self.path]
+        with open(self.path, "w") as data_file:
+            data_file.write('{"roots": ')
+        self.index.refresh([(self.path, "chromium")])
+        self.assertIs(self.index.sources[self.path], source)
+
+        # Parsed again once the write is complete
+        write_bookmarks(self.path, ["python", "git", "ulauncher"])
+        self.index.refresh([(self.path, "chromium")])
+        self.assertEqual(len(self.index.sources[self.path].entries), 3)
+
+    def test_shares_bookmarks_of_several_files(self):
+        other_path = os.path.join(self.tmp_dir.name, "Other Bookmarks")
+        write_bookmarks(other_path, ["python", "ulauncher"])
+        os.utime(other_path, ns=(0, 0))
+        self.index.refresh([(self.path, "chromium"), (other_path, "brave")])
+
+        python, git = self.index.sources[self.path].entries
+        other_python, ulauncher = self.index.sources[other_path].entries
+        self.assertIs(python, other_python)
+        self.assertEqual(
+            python.origins, ((self.path, "chromium"), (other_path, "brave"))
+        )
+        self.assertEqual(git.origins, ((self.path, "chromium"),))
+        self.assertEqual(ulauncher.origins, ((other_path, "brave"),))
+
+        os.remove(self.path)
+        self.index.refresh_path(self.path, "chromium")
+        self.assertEqual(other_python.origins, ((other_path, "brave"),))
+
+    def test_only_shares_records_of_changed_files(self):
+        other_path = os.path.join(self.tmp_dir.name, "Other Bookmarks")
+        write_bookmarks(other_path, ["python", "ulauncher"])
+        os.utime(other_path, ns=(0, 0))
+        self.index.refresh([(self.path, "chromium"), (other_path, "brave")])
+        other_source = self.index.sources[other_path]
+        python, ulauncher = other_source.entries
+
+        write_bookmarks(self.path, ["python", "rust"])
+        os.utime(self.path, ns=(10**9, 10**9))
+        self.index.refresh_path(self.path, "chromium")
+        shared_records = self.index.shared_records
+        self.assertEqual(set(shared_records.sources), {self.path, other_path})
+        # The changed file reuses the records of the other one, whose entries are left alone
+        self.assertIs(self.index.sources[self.path].entries[0], python)
+        self.assertIs(self.index.sources[other_path], other_source)
+        self.assertEqual(
+            python.origins, ((self.path, "chromium"), (other_path, "brave"))
+        )
+        self.assertEqual(ulauncher.origins, ((other_path, "brave"),))
+        # The records of bookmarks no file contains anymore are dropped
+        self.assertEqual(
+            set(shared_records.url_records),
+            {"https://python.org", "https://rust.org", "https://ulauncher.org"},
+        )
+        self.assertEqual(len(shared_records.records), 3)
+
+        os.remove(other_path)
+        self.index.refresh_path(other_path, "brave")
+        self.assertEqual(python.origins, ((self.path, "chromium"),))
+        self.assertEqual(
+            set(shared_records.url_origins), {"https://python.org", "https://rust.org"}
+        )
+
+    def test_prioritizes_recently_modified_files(self):
+        other_path = os.path.join(self.tmp_dir.name, "Other Bookmarks")
+        write_bookmarks(other_path, ["ulauncher"])
+        os.utime(self.path, ns=(0, 0))
+        self.index.refresh([(self.path, "chromium"), (other_path, "brave")])
+        self.assertEqual(
+            [source.path for source in self.index.prioritized_sources()],
+            [other_path, self.path],
+        )
+
+        write_bookmarks(self.path, ["python", "git", "ulauncher"])
+        os.utime(other_path, ns=(0, 0))
+        self.index.refresh([(self.path, "chromium"), (other_path, "brave")])
+        self.assertEqual(
+            [source.path for source in self.index.prioritized_sources()],
+            [self.path, other_path],
+        )
+
+    def test_records_load_times(self):
+        stats = QueryStats()
+        index = BookmarkIndex(stats)
+        index.refresh([(self.path, "chromium")])
+        self.assertEqual(stats.loads[self.path][1], 2)
+
+        write_bookmarks(self.path, ["python", "git", "ulauncher"])
+        index.refresh_path(self.path, "chromium")
+        self.assertEqual(stats.loads[self.path][1], 3)
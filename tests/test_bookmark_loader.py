@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+import unittest
+from indexer import BookmarkLoader
+from tests.test_bookmark_index import write_bookmarks
+
+
+class TestBookmarkLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.loader = BookmarkLoader()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "w") as data_file:
+            json.dump(data, data_file)
+        return path
+
+    def test_handles_missing_and_additional_roots(self):
+        path = self.write(
+            "Bookmarks",
+            {
+                "checksum": "abc",
+                "roots": {
+                    "workspaces": {
+                        "type": "folder",
+                        "name": "Workspaces",
+                        "children": [
+                            {
+                                "type": "url",
+                                "name": "workspace",
+                                "url": "https://workspace.org",
+                            }
+                        ],
+                    },
+                    "other": {
+                        "type": "folder",
+                        "name": "Other",
+                        "children": [
+                            {
+                                "type": "url",
+                                "name": "other",
+                                "url": "https://other.org",
+                                "guid": "123",
+                                "meta_info": {"power_bookmark_meta": "abc"},
+                            }
+                        ],
+                    },
+                    "sync_transaction_version": "1",
+                },
+            },
+        )
+        entries, trigram_index, folder_index = BookmarkLoader.load(path)
+        self.assertEqual(
+            [bookmark.name for bookmark in entries], ["other", "workspace"]
+        )
+        self.assertEqual(trigram_index.size, 2)
+        self.assertEqual(folder_index.resolve(["workspaces"]), [(1, 2)])
+
+    def test_drops_unused_fields(self):
+        slim = BookmarkLoader.slim_object(
+            [
+                ("type", "url"),
+                ("name", "python"),
+                ("url", "https://python.org"),
+                ("guid", "123"),
+                ("date_added", "13312"),
+                ("meta_info", {"last_visited_desktop": "13312"}),
+            ]
+        )
+        self.assertEqual(
+            slim, {"type": "url", "name": "python", "url": "https://python.org"}
+        )
+
+    def test_reports_invalid_files(self):
+        path = os.path.join(self.tmp_dir.name, "Bookmarks")
+        with open(path, "w") as data_file:
+            data_file.write("{")
+        self.assertEqual(self.loader.load_many([path]), {path: None})
+
+    def test_loads_in_parallel(self):
+        paths = []
+        for i in range(3):
+            path = os.path.join(self.tmp_dir.name, f"Bookmarks{i}")
+            write_bookmarks(path, [f"bookmark{i}", "git"])
+            paths.append(path)
+
+        self.loader.parallel_threshold = 0
+        self.loader.max_workers = 2
+        loaded = self.loader.load_many(paths)
+        self.assertEqual(list(loaded), paths)
+        for i, path in enumerate(paths):
+            entries, _, _ = loaded[path]
+            self.assertEqual(
+                [bookmark.name for bookmark in entries], [f"bookmark{i}", "git"]
+            )
@@ -1,15 +1,20 @@
+import random
+import sys
 import unittest
-from querier import BookmarkQuerier
+from unittest import mock
+from querier import (
+    BookmarkQuerier,
+    FolderIndex,
+    QueryCache,
+    QueryCancelled,
+    RankedMatches,
+)
 
 bookmarks = {
     "type": "folder",
     "name": "root",
     "children": [
-        {
-            "type": "bookmark",
-            "name": "git tutorial",
-            "url": "https://git.org"
-        },
+        {"type": "bookmark", "name": "git tutorial", "url": "https://git.org"},
         {
             "type": "folder",
             "name": "Python",
@@ -17,12 +22,12 @@ bookmarks = {
                 {
                     "type": "bookmark",
                     "name": "Documentation",
-                    "url": "https://docs.python.org"
+                    "url": "https://docs.python.org",
                 },
                 {
                     "type": "bookmark",
                     "name": "Python Tutorial",
-                    "url": "https://learn.python.org"
+                    "url": "https://learn.python.org",
                 },
                 {
                     "type": "folder",
@@ -31,21 +36,21 @@ bookmarks = {
                         {
                             "type": "bookmark",
                             "name": "Documentation and Tutorial - python",
-                            "url": "https://documentation.python.org"
+                            "url": "https://documentation.python.org",
                         },
                         {
                             "type": "bookmark",
                             "name": "Python Tricks Tutorial",
-                            "url": "https://realpython.com"
+                            "url": "https://realpython.com",
                         },
                         {
                             "type": "bookmark",
                             "name": "Zen of Python",
-                            "url": "https://peps.python.org/pep-0020/"
-                        }
-                    ]
-                }
-            ]
+                            "url": "https://peps.python.org/pep-0020/",
+                        },
+                    ],
+                },
+            ],
         },
         {
             "type": "folder",
@@ -54,12 +59,12 @@ bookmarks = {
                 {
                     "type": "bookmark",
                     "name": "Documentation",
-                    "url": "https://docs.typescript.org"
+                    "url": "https://docs.typescript.org",
                 },
                 {
                     "type": "bookmark",
                     "name": "Typescript Tutorial",
-                    "url": "https://learn.typescript.org"
+                    "url": "https://learn.typescript.org",
                 },
                 {
                     "type": "folder",
@@ -68,25 +73,26 @@ bookmarks = {
                         {
                             "type": "bookmark",
                             "name": "Documentation and Tutorial",
-                            "url": "https://documentation.typescript.org"
+                            "url": "https://documentation.typescript.org",
                         },
                         {
                             "type": "bookmark",
                             "name": "Typescript Tricks Tutorial",
-                            "url": "https://typescript.org"
+                            "url": "https://typescript.org",
                         },
                         {
                             "type": "bookmark",
                             "name": "Zen of Typescript",
-                            "url": "https://notfound.com"
-                        }
-                    ]
-                }
-
-            ]
-        }
-    ]
+                            "url": "https://notfound.com",
+                        },
+                    ],
+                },
+            ],
+        },
+    ],
 }
+
+
 class TestBookmarkQuerierNoFilterByFolders(unittest.TestCase):
     def setUp(self):
         self.querier = BookmarkQuerier()
@@ -118,7 +124,6 @@ class TestBookmarkQuerierNoFilterByFolders(unittest.TestCase):
         self.assertEqual(matches[0]["name"], "git tutorial")
         self.assertEqual(matches[1]["name"], "Python Tutorial")
 
-
     def test_doesnot_filter_by_folders(self):
         matches = []
         self.querier.search(bookmarks, "advanced documentation", matches)
@@ -135,20 +140,18 @@ class TestBookmarkQuerierNoFilterByFolders(unittest.TestCase):
     def test_query_max_matches(self):
         # Create a bookmark structure with many entries
         many_bookmarks = {
-                "type": "folder",
-                "name": "root",
-                "children": [
-                    {
-                        "type": "bookmark",
-                        "name": f"Test {i}",
-                        "url": f"https://test{i}.com"
-                        } for i in range(15)
-                    ]
-                }
+            "type": "folder",
+            "name": "root",
+            "children": [
+                {"type": "bookmark", "name": f"Test {i}", "url": f"https://test{i}.com"}
+                for i in range(15)
+            ],
+        }
 
         matches = []
         self.querier.search(many_bookmarks, "Test", matches)
-        self.assertEqual(len(matches), 10)  # Should stop at max_matches_len 
+        self.assertEqual(len(matches), 10)  # Should stop at max_matches_len
+
 
 class TestBookmarkQuerierFilterByFolders(unittest.TestCase):
     def setUp(self):
@@ -187,18 +190,15 @@ class TestBookmarkQuerierFilterByFolders(unittest.TestCase):
             "type": "folder",
             "name": "root",
             "children": [
-                {
-                    "type": "bookmark",
-                    "name": f"Test {i}",
-                    "url": f"https://test{i}.com"
-                } for i in range(15)
-            ]
+                {"type": "bookmark", "name": f"Test {i}", "url": f"https://test{i}.com"}
+                for i in range(15)
+            ],
         }
 
         matches = []
         self.querier.search(many_bookmarks, "Test", matches)
-        self.assertEqual(len(matches), 10)  # Should stop at max_matches_len 
-    
+        self.assertEqual(len(matches), 10)  # Should stop at max_matches_len
+
     def test_search_matches_parent_folder(self):
         matches = []
         self.querier.search(bookmarks, "python documentation", matches)
@@ -214,7 +214,7 @@ class TestBookmarkQuerierFilterByFolders(unittest.TestCase):
         self.assertEqual(len(matches), 1)
         self.assertEqual(matches[0]["name"], "Python Tutorial")
         self.assertEqual(matches[0]["url"], "https://learn.python.org")
-    
+
     def test_filter_by_parent_tree(self):
         # Sanity check
         matches = []
@@ -227,7 +227,7 @@ class TestBookmarkQuerierFilterByFolders(unittest.TestCase):
         matches = []
         self.querier.search(bookmarks, "typescript advanced", matches)
         self.assertEqual(len(matches), 3)
-    
+
     def test_filter_by_children_and_grand_children(self):
         # Test that it matches when both parent and bookmark match
         # Should match: python/* && python/Advanced/*
@@ -245,6 +245,457 @@ class TestBookmarkQuerierFilterByFolders(unittest.TestCase):
         # Test that it doesn't match when neither parent nor bookmark match
         matches = []
         self.querier.search(bookmarks, "java", matches)
-        self.assertEqual(len(matches), 0) 
+        self.assertEqual(len(matches), 0)
         self.querier.search(bookmarks, "java docs", matches)
-        self.assertEqual(len(matches), 0) 
+        self.assertEqual(len(matches), 0)
+
+
+def as_pairs(matches):
+    return sorted(
+        (match["name"], match["url"])
+        if isinstance(match, dict)
+        else (match.name, match.url)
+        for match in matches
+    )
+
+
+class Source:
+    def __init__(self, entries, trigram_index=None):
+        self.path = "Bookmarks"
+        self.browser = "chromium"
+        self.entries = entries
+        self.trigram_index = trigram_index
+
+
+def search_entries(querier, entries, query, trigram_index=None):
+    return [
+        bookmark
+        for bookmark, _ in querier.search_sources(
+            [Source(entries, trigram_index)], query
+        )
+    ]
+
+
+class TestBookmarkQuerierSearchSources(unittest.TestCase):
+    def test_matches_like_search(self):
+        entries = []
+        BookmarkQuerier.flatten(bookmarks, entries)
+        for filter_by_folders in [False, True]:
+            querier = BookmarkQuerier(filter_by_folders=filter_by_folders)
+            # Compares all matches, search keeps the first ones in tree order but search_sources the best ones
+            querier.max_matches_len = len(entries)
+            for query in ["documentation", "python advanced", "tutorial", "java", ""]:
+                expected = []
+                querier.search(bookmarks, query, expected)
+                matches = search_entries(querier, entries, query)
+                self.assertEqual(as_pairs(matches), as_pairs(expected))
+
+    def test_trigram_index_matches_like_search(self):
+        entries = []
+        BookmarkQuerier.flatten(bookmarks, entries)
+        trigram_index = BookmarkQuerier.build_index(entries)
+        for filter_by_folders in [False, True]:
+            querier = BookmarkQuerier(filter_by_folders=filter_by_folders)
+            querier.max_matches_len = len(entries)
+            for query in [
+                "documentation",
+                "documentation tutorial",
+                "python advanced",
+                "typescript advanced",
+                "python learn",
+                "tutorial",
+                "TUTORIAL",
+                "py doc",
+                "java docs",
+                "",
+            ]:
+                expected = []
+                querier.search(bookmarks, query, expected)
+                matches = search_entries(querier, entries, query, trigram_index)
+                self.assertEqual(as_pairs(matches), as_pairs(expected), query)
+
+    def test_cached_queries_match_like_search(self):
+        entries = []
+        BookmarkQuerier.flatten(bookmarks, entries)
+        trigram_index = BookmarkQuerier.build_index(entries)
+        for filter_by_folders in [False, True]:
+            querier = BookmarkQuerier(filter_by_folders=filter_by_folders)
+            querier.max_matches_len = len(entries)
+            # Simulate typing, backspacing and adding terms
+            for query in [
+                "p",
+                "py",
+                "pyt",
+                "pyth",
+                "pytho",
+                "python",
+                "python ",
+                "python a",
+                "python ad",
+                "python a",
+                "python",
+                "pytho",
+                "t",
+                "tu",
+                "tutorial",
+                "tutorial doc",
+                "doc tutorial",
+                "tutorial",
+            ]:
+                expected = []
+                tree_querier = BookmarkQuerier(filter_by_folders=filter_by_folders)
+                tree_querier.max_matches_len = len(entries)
+                tree_querier.search(bookmarks, query, expected)
+                matches = search_entries(querier, entries, query, trigram_index)
+                self.assertEqual(as_pairs(matches), as_pairs(expected), query)
+
+    def test_refined_queries_only_filter_cached_matches(self):
+        entries = []
+        BookmarkQuerier.flatten(bookmarks, entries)
+        querier = BookmarkQuerier()
+        search_entries(querier, entries, "python")
+
+        with mock.patch.object(
+            querier, "get_search_text", wraps=querier.get_search_text
+        ) as get_search_text:
+            matches = search_entries(querier, entries, "python tutorial")
+            self.assertEqual(get_search_text.call_count, 5)
+            self.assertEqual(len(matches), 3)
+
+            # Going back to a previous query is answered from the cache
+            search_entries(querier, entries, "python")
+            self.assertEqual(get_search_text.call_count, 5)
+
+    def test_ignores_case_and_accents(self):
+        entries = []
+        BookmarkQuerier.flatten(
+            {
+                "type": "folder",
+                "name": "Café",
+                "children": [
+                    {"type": "url", "name": "Crème Brûlée", "url": "https://straße.de"}
+                ],
+            },
+            entries,
+        )
+        querier = BookmarkQuerier(filter_by_folders=True)
+        for query in ["creme brulee", "CRÈME", "strasse", "cafe creme"]:
+            matches = search_entries(querier, entries, query)
+            self.assertEqual(len(matches), 1, query)
+
+    def test_contains_all_substrings_ignores_case(self):
+        querier = BookmarkQuerier()
+        self.assertTrue(
+            querier.contains_all_substrings("Real Python Docs", ["python", "DOCS"])
+        )
+        self.assertFalse(querier.contains_all_substrings("Real Python", ["java"]))
+
+    def test_flattens_null_names_and_urls(self):
+        entries = []
+        BookmarkQuerier.flatten(
+            {
+                "type": "folder",
+                "name": None,
+                "children": [
+                    {"type": "url", "name": None, "url": "https://null.org"},
+                    {"type": "url", "name": "no url"},
+                    {"type": "url", "name": "null url", "url": None},
+                ],
+            },
+            entries,
+            folder_index=FolderIndex(),
+        )
+        self.assertEqual(
+            [(bookmark.name, bookmark.url) for bookmark in entries],
+            [("", "https://null.org"), ("no url", ""), ("null url", "")],
+        )
+        matches = search_entries(
+            BookmarkQuerier(filter_by_folders=True), entries, "null"
+        )
+        self.assertEqual(len(matches), 2)
+
+    def test_flattens_deeply_nested_folders(self):
+        tree = {"type": "url", "name": "deep", "url": "https://deep.org"}
+        for _ in range(5000):
+            tree = {"type": "folder", "name": "f", "children": [tree]}
+        entries = []
+        BookmarkQuerier.flatten(tree, entries)
+        matches = search_entries(BookmarkQuerier(), entries, "deep")
+        self.assertEqual(as_pairs(matches), [("deep", "https://deep.org")])
+
+
+class TestBookmarkQuerierRankEntries(unittest.TestCase):
+    def setUp(self):
+        self.entries = []
+        BookmarkQuerier.flatten(bookmarks, self.entries)
+        self.querier = BookmarkQuerier()
+
+    def rank(self, query, max_len=10):
+        ranked = RankedMatches(max_len)
+        self.querier.rank_entries(self.entries, query, ranked)
+        return [bookmark.name for bookmark, _ in ranked.sorted()]
+
+    def test_ranks_title_prefix_matches_first(self):
+        names = self.rank("python")
+        self.assertEqual(names[:2], ["Python Tricks Tutorial", "Python Tutorial"])
+        # Only matches the URL
+        self.assertEqual(names[-1], "Documentation")
+
+    def test_keeps_global_top_k_across_files(self):
+        ranked = RankedMatches(2)
+        self.querier.rank_entries(self.entries[:3], "tutorial", ranked, tag="first")
+        self.querier.rank_entries(self.entries[3:], "tutorial", ranked, tag="second")
+        self.assertEqual(
+            [(bookmark.name, tag) for bookmark, tag in ranked.sorted()],
+            [("git tutorial", "first"), ("Python Tricks Tutorial", "second")],
+        )
+
+    def test_ranks_the_same_matches_as_search(self):
+        for query in ["documentation", "tutorial", "doc tut", "java"]:
+            expected = []
+            self.querier.max_matches_len = 100
+            self.querier.search(bookmarks, query, expected)
+            names = self.rank(query, max_len=100)
+            self.assertEqual(
+                sorted(names), sorted(bookmark["name"] for bookmark in expected)
+            )
+
+    def test_ranks_like_scoring_every_match(self):
+        rng = random.Random(1)
+        words = "python docs tutorial guide api pytest e2e café résumé x-ray".split()
+        tree = {"type": "folder", "name": "root", "children": []}
+        for folder_id in range(20):
+            folder = {
+                "type": "folder",
+                "name": " ".join(rng.sample(words, 2)),
+                "children": [],
+            }
+            for _ in range(100):
+                folder["children"].append(
+                    {
+                        "type": "url",
+                        "name": " ".join(rng.sample(words, rng.randint(1, 4))),
+                        "url": "https://%s.org/%s"
+                        % ("/".join(rng.sample(words, 2)), folder_id),
+                    }
+                )
+            tree["children"].append(folder)
+        entries = []
+        BookmarkQuerier.flatten(tree, entries)
+        trigram_index = BookmarkQuerier.build_index(entries)
+
+        for filter_by_folders in [False, True]:
+            querier = BookmarkQuerier(filter_by_folders=filter_by_folders)
+            # Looks the word starts up early, so they are used while ranking
+            querier.word_start_lookup_share = 0.01
+            for query in [
+                "p",
+                "e",
+                "x",
+                "é",
+                "py",
+                "doc py",
+                "tutorial guide",
+                "ray",
+                "e 2",
+            ]:
+                terms = QueryCache.normalize(query.split(" "))
+                matches = [
+                    entries[entry_id] for entry_id in querier.match_all(entries, terms)
+                ]
+                scores = [
+                    querier.scorer.score(
+                        bookmark.normalized_name(),
+                        bookmark.normalized_url(),
+                        bookmark.normalized_folder() if filter_by_folders else "",
+                        terms,
+                    )
+                    for bookmark in matches
+                ]
+                expected = sorted(scores, reverse=True)[:10]
+                ranked = RankedMatches(10)
+                querier.rank_entries(entries, query, ranked, trigram_index)
+                self.assertEqual(
+                    [item[0] for item in sorted(ranked.heap, reverse=True)],
+                    expected,
+                    query,
+                )
+
+    def test_keeps_tree_order_for_empty_query(self):
+        self.assertEqual(self.rank("", max_len=2), ["git tutorial", "Documentation"])
+
+    def test_boosts_frequently_visited_bookmarks(self):
+        python_tutorial = next(b for b in self.entries if b.name == "Python Tutorial")
+        self.querier.frecency = mock.Mock(boosts={python_tutorial.url: 1.0})
+        self.assertEqual(self.rank("python")[0], "Python Tutorial")
+        self.assertEqual(self.rank("", max_len=1), ["Python Tutorial"])
+
+    def test_counts_visited_and_matched_entries(self):
+        class Source:
+            path = "Bookmarks"
+            entries = self.entries
+            trigram_index = None
+            browser = "chromium"
+
+        source_timings = {}
+        self.querier.search_sources([Source()], "tutorial", source_timings)
+        self.assertEqual(self.querier.visited_entries, len(self.entries))
+        self.assertEqual(self.querier.matched_entries, 7)
+        self.assertIn("Bookmarks", source_timings)
+
+        # Answered from the query cache
+        self.querier.search_sources([Source()], "tutorial")
+        self.assertEqual(self.querier.visited_entries, 0)
+        self.assertEqual(self.querier.matched_entries, 7)
+
+    def test_drops_cached_matches_of_reloaded_entries(self):
+        self.querier.search_sources([Source(self.entries)], "tutorial")
+        reloaded_entries = list(self.entries)
+        self.querier.search_sources([Source(reloaded_entries)], "tutorial")
+        self.assertIsNone(self.querier.query_cache.get(self.entries, ("tutorial",)))
+        self.assertIsNotNone(
+            self.querier.query_cache.get(reloaded_entries, ("tutorial",))
+        )
+
+    def test_abandons_cancelled_searches(self):
+        class Source:
+            path = "Bookmarks"
+            entries = self.entries
+            trigram_index = None
+            browser = "chromium"
+
+        self.querier.cancel_check_interval = 1
+        checks = []
+
+        def is_cancelled():
+            checks.append(True)
+            return len(checks) > 3
+
+        with self.assertRaises(QueryCancelled):
+            self.querier.search_sources(
+                [Source()], "tutorial", is_cancelled=is_cancelled
+            )
+        # Partial matches are not cached
+        self.assertIsNone(self.querier.query_cache.get(self.entries, ("tutorial",)))
+        self.assertEqual(len(self.querier.search_sources([Source()], "tutorial")), 7)
+
+    def test_returns_best_matches_found_until_the_deadline(self):
+        class Source:
+            path = "Bookmarks"
+            entries = self.entries
+            trigram_index = None
+            browser = "chromium"
+
+        querier = BookmarkQuerier(time_budget=10)
+        querier.cancel_check_interval = 1
+        # Each check of the clock takes 4 ms
+        clock = iter(range(0, 1000, 4))
+        # querier.BookmarkQuerier is shadowed by the class of the same name, so its module is patched directly
+        querier_module = sys.modules["querier.BookmarkQuerier"]
+        with mock.patch.object(
+            querier_module.time, "perf_counter", lambda: next(clock) / 1000
+        ):
+            matches = querier.search_sources([Source(), Source()], "tutorial")
+
+        self.assertTrue(querier.timed_out)
+        self.assertGreater(len(matches), 0)
+        self.assertLess(len(matches), 7)
+        # Incomplete matches are not cached
+        self.assertEqual(len(querier.query_cache.queries), 0)
+
+        matches = querier.search_sources([Source()], "tutorial")
+        self.assertFalse(querier.timed_out)
+        self.assertEqual(len(matches), 7)
+
+    def test_searches_below_scoped_folders(self):
+        entries = []
+        folder_index = FolderIndex()
+        BookmarkQuerier.flatten(bookmarks, entries, folder_index=folder_index)
+
+        class Source:
+            path = "Bookmarks"
+            trigram_index = BookmarkQuerier.build_index(entries)
+            browser = "chromium"
+
+        Source.entries = entries
+        Source.folder_index = folder_index
+
+        def search(query):
+            return sorted(
+                bookmark.name
+                for bookmark, _ in self.querier.search_sources([Source()], query)
+            )
+
+        self.assertEqual(
+            search("/python/adv tutorial"),
+            ["Documentation and Tutorial - python", "Python Tricks Tutorial"],
+        )
+        self.assertEqual(
+            search("@advanced zen"), ["Zen of Python", "Zen of Typescript"]
+        )
+        self.assertEqual(len(search("@typescript")), 5)
+        self.assertEqual(search("@java tutorial"), [])
+        # Unscoped queries still search all bookmarks
+        self.assertEqual(len(search("tutorial")), 7)
+
+    def test_searches_scopes_without_folders_as_terms(self):
+        entries = []
+        folder_index = FolderIndex()
+        BookmarkQuerier.flatten(
+            {
+                "type": "folder",
+                "name": "Work",
+                "children": [
+                    {
+                        "type": "url",
+                        "name": "REST reference",
+                        "url": "https://example.com/api/v2",
+                    },
+                    {
+                        "type": "url",
+                        "name": "Team contacts",
+                        "url": "mailto:team@example.com",
+                    },
+                    {
+                        "type": "url",
+                        "name": "Ulauncher",
+                        "url": "https://github.com/@user/ulauncher",
+                    },
+                ],
+            },
+            entries,
+            folder_index=folder_index,
+        )
+        source = Source(entries, BookmarkQuerier.build_index(entries))
+        source.folder_index = folder_index
+
+        def search(query):
+            return [
+                bookmark.name
+                for bookmark, _ in self.querier.search_sources([source], query)
+            ]
+
+        self.assertEqual(search("/api"), ["REST reference"])
+        self.assertEqual(search("/api v2"), ["REST reference"])
+        self.assertEqual(search("@example"), ["Team contacts"])
+        self.assertEqual(search("@user"), ["Ulauncher"])
+        # A scope matching a folder still only searches below it
+        self.assertEqual(len(search("@work")), 3)
+        self.assertEqual(search("@work team"), ["Team contacts"])
+
+    def test_collapses_matches_of_the_same_url(self):
+        class Source:
+            def __init__(self, path, browser):
+                self.path = path
+                self.browser = browser
+                self.entries = entries
+                self.trigram_index = None
+
+        entries = self.entries
+        matches = self.querier.search_sources(
+            [Source("Chrome", "google-chrome"), Source("Brave", "brave")], "tutorial"
+        )
+        urls = [bookmark.url for bookmark, _ in matches]
+        self.assertEqual(len(urls), len(set(urls)))
+        self.assertEqual(len(urls), 7)
+        self.assertEqual({browser for _, browser in matches}, {"google-chrome"})
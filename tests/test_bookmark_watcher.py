@@ -0,0 +1,186 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from indexer import BookmarkIndex, BookmarkWatcher, IndexSnapshot
+from tests.test_bookmark_index import write_bookmarks
+from tests.test_firefox_source import write_places
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestBookmarkWatcher(unittest.TestCase):
+    use_inotify = True
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "Bookmarks")
+        write_bookmarks(self.path, ["python"])
+
+        self.index = BookmarkIndex()
+        self.index.refresh([(self.path, "chromium")])
+        self.snapshot = IndexSnapshot(os.path.join(self.tmp_dir.name, "index.marshal"))
+        self.watcher = BookmarkWatcher(
+            self.index, use_inotify=self.use_inotify, snapshot=self.snapshot
+        )
+        self.watcher.poll_interval = 0.1
+        self.watcher.watch([(self.path, "chromium")])
+        self.watcher.start()
+        # Give the watcher time to set up its watches
+        time.sleep(0.2)
+
+    def tearDown(self):
+        self.watcher.stop()
+        self.watcher.join()
+        self.tmp_dir.cleanup()
+
+    def entries_len(self):
+        source = self.index.sources.get(self.path)
+        return None if source is None else len(source.entries)
+
+    def snapshot_entries_len(self):
+        source = self.snapshot.load().get(self.path)
+        return None if source is None else len(source.entries)
+
+    def test_refreshes_on_atomic_rename(self):
+        tmp_path = os.path.join(self.tmp_dir.name, "Bookmarks.tmp")
+        write_bookmarks(tmp_path, ["python", "git"])
+        os.replace(tmp_path, self.path)
+        self.assertTrue(wait_for(lambda: self.entries_len() == 2))
+
+    def test_saves_snapshot_after_changes(self):
+        write_bookmarks(self.path, ["python", "git", "ulauncher"])
+        self.assertTrue(wait_for(lambda: self.entries_len() == 3))
+        self.assertTrue(wait_for(lambda: self.snapshot_entries_len() == 3))
+
+    def test_revalidates_newly_watched_files(self):
+        other_path = os.path.join(self.tmp_dir.name, "Other", "Bookmarks")
+        os.makedirs(os.path.dirname(other_path))
+        write_bookmarks(other_path, ["git"])
+        self.watcher.watch([(self.path, "chromium"), (other_path, "vivaldi")])
+        self.assertTrue(wait_for(lambda: other_path in self.index.sources))
+
+    def test_keeps_running_after_failed_refreshes(self):
+        with mock.patch.object(
+            self.index, "refresh_path", side_effect=RuntimeError("unexpected")
+        ):
+            with mock.patch.object(
+                self.index, "refresh", side_effect=RuntimeError("unexpected")
+            ):
+                with self.assertLogs("indexer.BookmarkWatcher", level="ERROR"):
+                    self.watcher.watch([(self.path, "chromium")])
+                    write_bookmarks(self.path, ["python", "git"])
+                    self.assertTrue(wait_for(lambda: self.index.refresh_path.called))
+                    time.sleep(0.2)
+
+        self.assertTrue(self.watcher.is_alive())
+        write_bookmarks(self.path, ["python", "git", "ulauncher"])
+        self.assertTrue(wait_for(lambda: self.entries_len() == 3))
+
+    def test_drops_deleted_files(self):
+        os.remove(self.path)
+        self.assertTrue(wait_for(lambda: self.entries_len() is None))
+
+    def test_discovers_paths_in_the_background(self):
+        other_path = os.path.join(self.tmp_dir.name, "Other", "Bookmarks")
+        os.makedirs(os.path.dirname(other_path))
+        write_bookmarks(other_path, ["git"])
+        self.watcher.discover(lambda: [(other_path, "vivaldi")])
+        self.assertTrue(wait_for(lambda: list(self.index.sources) == [other_path]))
+        self.assertEqual(self.watcher.bookmarks_paths, {other_path: "vivaldi"})
+
+    def test_partial_discovery_does_not_replace_a_pending_full_one(self):
+        def full():
+            return [(self.path, "chromium")]
+
+        def partial():
+            return []
+
+        watcher = BookmarkWatcher(self.index)
+        watcher.discover(full)
+        watcher.discover(partial, partial=True)
+        self.assertEqual(watcher.discovery, (full, False))
+        watcher.update_paths()
+        watcher.discover(partial, partial=True)
+        self.assertEqual(watcher.discovery, (partial, True))
+        # A full discovery always wins
+        watcher.discover(full)
+        self.assertEqual(watcher.discovery, (full, False))
+
+    def test_keeps_paths_if_discovery_fails(self):
+        def find_paths():
+            raise OSError("not readable")
+
+        self.watcher.discover(find_paths)
+        self.assertTrue(wait_for(lambda: self.watcher.discovery is None))
+        self.assertEqual(self.watcher.bookmarks_paths, {self.path: "chromium"})
+
+    def test_restores_snapshot_on_start(self):
+        self.snapshot.save(self.index.sources)
+        index = BookmarkIndex()
+        watcher = BookmarkWatcher(
+            index, use_inotify=self.use_inotify, snapshot=self.snapshot
+        )
+        watcher.start()
+        try:
+            # Served from the snapshot before any path was discovered
+            self.assertTrue(wait_for(lambda: self.path in index.sources))
+            self.assertEqual(watcher.bookmarks_paths, {})
+        finally:
+            watcher.stop()
+            watcher.join()
+
+    def test_runs_scheduled_tasks(self):
+        calls = []
+        self.watcher.schedule(calls.append, 60)
+        self.assertTrue(wait_for(lambda: len(calls) == 1))
+        self.assertEqual(calls[0], [(self.path, "chromium")])
+
+
+class TestBookmarkWatcherPolling(TestBookmarkWatcher):
+    use_inotify = False
+
+
+class TestBookmarkWatcherFirefox(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "places.sqlite")
+        write_places(self.path, [("python", "https://python.org", "")])
+        self.index = BookmarkIndex()
+        self.index.refresh([(self.path, "firefox")])
+        self.watcher = BookmarkWatcher(self.index)
+        self.watcher.watch([(self.path, "firefox")])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def bookmarks_len(self):
+        return len(self.index.sources[self.path].search(()))
+
+    def test_copies_changed_databases_at_most_once_per_interval(self):
+        write_places(
+            self.path,
+            [("python", "https://python.org", ""), ("git", "https://git.org", "")],
+            2,
+        )
+        self.watcher.refresh_path(self.path, "firefox")
+        self.assertEqual(self.bookmarks_len(), 2)
+
+        write_places(self.path, [("python", "https://python.org", "")], 3)
+        self.watcher.refresh_path(self.path, "firefox")
+        self.assertEqual(self.bookmarks_len(), 2)
+        self.assertEqual(self.watcher.deferred_paths, {self.path: "firefox"})
+
+        # Deferred changes are picked up once the interval passed, without another change
+        self.watcher.firefox_interval = 0
+        self.watcher.refresh_deferred()
+        self.assertEqual(self.bookmarks_len(), 1)
+        self.assertEqual(self.watcher.deferred_paths, {})
@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from indexer import FaviconStore
+
+
+def write_favicons(path, icons):
+    """
+    Writes a Favicons database with the given (page_url, width, image_data) icons
+    """
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        """
+        DROP TABLE IF EXISTS icon_mapping;
+        DROP TABLE IF EXISTS favicons;
+        DROP TABLE IF EXISTS favicon_bitmaps;
+        CREATE TABLE icon_mapping (id INTEGER PRIMARY KEY, page_url LONGVARCHAR, icon_id INTEGER);
+        CREATE TABLE favicons (id INTEGER PRIMARY KEY, url LONGVARCHAR, icon_type INTEGER);
+        CREATE TABLE favicon_bitmaps (id INTEGER PRIMARY KEY, icon_id INTEGER, image_data BLOB,
+            width INTEGER, height INTEGER);
+        """
+    )
+    for page_url, width, image_data in icons:
+        icon_id = connection.execute(
+            "INSERT INTO favicons (url, icon_type) VALUES (?, 1)",
+            (page_url + "/favicon.ico",),
+        ).lastrowid
+        connection.execute(
+            "INSERT INTO favicon_bitmaps (icon_id, image_data, width, height) VALUES (?, ?, ?, ?)",
+            (icon_id, image_data, width, width),
+        )
+        connection.execute(
+            "INSERT INTO icon_mapping (page_url, icon_id) VALUES (?, ?)",
+            (page_url, icon_id),
+        )
+    connection.commit()
+    connection.close()
+    # Make sure a rewrite within the same clock tick is seen as a change
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + len(icons)))
+
+
+def read(path):
+    with open(path, "rb") as icon_file:
+        return icon_file.read()
+
+
+class TestFaviconStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.bookmarks_paths = [
+            (os.path.join(self.tmp_dir.name, "Bookmarks"), "chromium")
+        ]
+        self.favicons_path = os.path.join(self.tmp_dir.name, "Favicons")
+        self.icons_dir = os.path.join(self.tmp_dir.name, "cache", "favicons")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_extracts_icons_of_bookmarked_hosts(self):
+        write_favicons(
+            self.favicons_path,
+            [
+                ("https://python.org/", 16, b"python16"),
+                ("https://python.org/downloads", 32, b"python32"),
+                ("https://python.org/about", 64, b"python64"),
+                ("https://git-scm.com/", 16, b"git16"),
+                ("https://not-bookmarked.org/", 16, b"other"),
+            ],
+        )
+        store = FaviconStore(self.icons_dir)
+        store.sync(
+            self.bookmarks_paths, {"https://python.org/doc", "https://GIT-scm.com/book"}
+        )
+
+        self.assertEqual(read(store.icon("https://python.org/3/tutorial")), b"python32")
+        self.assertEqual(read(store.icon("https://git-scm.com")), b"git16")
+        self.assertIsNone(store.icon("https://not-bookmarked.org/"))
+        self.assertEqual(len(store.cached_files()), 2)
+
+    def test_shares_files_of_equal_icons(self):
+        write_favicons(
+            self.favicons_path,
+            [
+                ("https://docs.python.org/", 16, b"python"),
+                ("https://www.python.org/", 16, b"python"),
+            ],
+        )
+        store = FaviconStore(self.icons_dir)
+        store.sync(
+            self.bookmarks_paths,
+            {"https://docs.python.org/3", "https://www.python.org"},
+        )
+        self.assertEqual(
+            store.icon("https://docs.python.org"), store.icon("https://www.python.org")
+        )
+        self.assertEqual(len(store.cached_files()), 1)
+
+    def test_persists_hosts_mapping(self):
+        write_favicons(self.favicons_path, [("https://python.org/", 16, b"python")])
+        FaviconStore(self.icons_dir).sync(self.bookmarks_paths, {"https://python.org"})
+
+        store = FaviconStore(self.icons_dir)
+        self.assertEqual(read(store.icon("https://python.org")), b"python")
+
+    def test_evicts_icons_of_removed_bookmarks(self):
+        write_favicons(
+            self.favicons_path,
+            [
+                ("https://python.org/", 16, b"python"),
+                ("https://git-scm.com/", 16, b"git"),
+            ],
+        )
+        store = FaviconStore(self.icons_dir)
+        store.sync(self.bookmarks_paths, {"https://python.org", "https://git-scm.com"})
+        git_icon = store.icon("https://git-scm.com")
+
+        store.sync(self.bookmarks_paths, {"https://python.org"})
+        self.assertIsNone(store.icon("https://git-scm.com"))
+        self.assertFalse(os.path.exists(git_icon))
+
+    def test_bounds_cache_size(self):
+        write_favicons(
+            self.favicons_path,
+            [
+                ("https://a.org/", 16, b"a" * 60),
+                ("https://b.org/", 16, b"b" * 60),
+                ("https://c.org/", 16, b"c" * 60),
+            ],
+        )
+        store = FaviconStore(self.icons_dir, max_cache_size=150)
+        store.sync(
+            self.bookmarks_paths, {"https://a.org", "https://b.org", "https://c.org"}
+        )
+        self.assertEqual(len(store.icons), 2)
+        self.assertLessEqual(
+            sum(size for _path, size, _mtime in store.cached_files()), 150
+        )
+
+        # A smaller bound evicts the oldest icons
+        store.max_cache_size = 60
+        store.sync(
+            self.bookmarks_paths, {"https://a.org", "https://b.org", "https://c.org"}
+        )
+        self.assertEqual(len(store.icons), 1)
+        self.assertEqual(len(store.cached_files()), 1)
+
+    def test_ignores_missing_and_invalid_databases(self):
+        store = FaviconStore(self.icons_dir)
+        store.sync(self.bookmarks_paths, {"https://python.org"})
+        self.assertEqual(store.icons, {})
+
+        with open(self.favicons_path, "w") as favicons_file:
+            favicons_file.write("invalid")
+        store.sync(self.bookmarks_paths, {"https://python.org"})
+        self.assertEqual(store.icons, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
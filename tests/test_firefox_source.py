@@ -0,0 +1,283 @@
+import math
+import os
+import sqlite3
+import tempfile
+import unittest
+from indexer import BookmarkIndex, FirefoxProfiles, FirefoxSource
+from querier import BookmarkQuerier, RankedMatches
+
+
+def write_places(path, bookmarks, last_modified=1):
+    """
+    Writes a places.sqlite database with the given (title, url, folder) bookmarks below the toolbar
+    """
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        """
+        DROP TABLE IF EXISTS moz_places;
+        DROP TABLE IF EXISTS moz_bookmarks;
+        CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url TEXT, frecency INTEGER);
+        CREATE TABLE moz_bookmarks (id INTEGER PRIMARY KEY, type INTEGER, fk INTEGER, parent INTEGER,
+            position INTEGER, title TEXT, guid TEXT, lastModified INTEGER);
+        INSERT INTO moz_bookmarks VALUES (1, 2, NULL, 0, 0, '', 'root________', 0);
+        INSERT INTO moz_bookmarks VALUES (2, 2, NULL, 1, 0, 'toolbar', 'toolbar_____', 0);
+        INSERT INTO moz_bookmarks VALUES (3, 2, NULL, 1, 1, 'tags', 'tags________', 0);
+        INSERT INTO moz_bookmarks VALUES (4, 2, NULL, 3, 0, 'python', 'tag_python__', 0);
+        """
+    )
+    folders = {}
+    for position, (title, url, folder) in enumerate(bookmarks):
+        parent = 2
+        if folder:
+            if folder not in folders:
+                cursor = connection.execute(
+                    "INSERT INTO moz_bookmarks (type, parent, position, title, guid, lastModified) "
+                    "VALUES (2, 2, ?, ?, ?, ?)",
+                    (position, folder, "folder%s" % position, last_modified),
+                )
+                folders[folder] = cursor.lastrowid
+            parent = folders[folder]
+
+        place_id = connection.execute(
+            "INSERT INTO moz_places (url, frecency) VALUES (?, ?)",
+            (url, 100 - position),
+        ).lastrowid
+        connection.execute(
+            "INSERT INTO moz_bookmarks (type, fk, parent, position, title, guid, lastModified) "
+            "VALUES (1, ?, ?, ?, ?, ?, ?)",
+            (place_id, parent, position, title, "bookmark%s" % position, last_modified),
+        )
+        # Tagging a bookmark adds an entry below the tag folder
+        connection.execute(
+            "INSERT INTO moz_bookmarks (type, fk, parent, position, title, guid, lastModified) "
+            "VALUES (1, ?, 4, ?, NULL, ?, ?)",
+            (place_id, position, "tag%s" % position, last_modified),
+        )
+    connection.commit()
+    connection.close()
+
+
+class TestFirefoxProfiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_finds_relative_and_absolute_profiles(self):
+        root = self.tmp_dir.name
+        relative_profile = os.path.join(root, "abc.default-release")
+        absolute_profile = os.path.join(root, "elsewhere", "work")
+        empty_profile = os.path.join(root, "empty")
+        for profile in [relative_profile, absolute_profile, empty_profile]:
+            os.makedirs(profile)
+        write_places(os.path.join(relative_profile, "places.sqlite"), [])
+        write_places(os.path.join(absolute_profile, "places.sqlite"), [])
+
+        with open(os.path.join(root, "profiles.ini"), "w") as profiles_file:
+            profiles_file.write(
+                "[General]\nStartWithLastProfile=1\n\n"
+                "[Profile0]\nName=default\nIsRelative=1\nPath=abc.default-release\n\n"
+                "[Profile1]\nName=work\nIsRelative=0\nPath=%s\n\n"
+                "[Profile2]\nName=empty\nIsRelative=1\nPath=empty\n\n"
+                "[Install4F96D1932A9F858E]\nDefault=abc.default-release\n"
+                % absolute_profile
+            )
+
+        self.assertEqual(
+            FirefoxProfiles.find(root),
+            [
+                os.path.join(relative_profile, "places.sqlite"),
+                os.path.join(absolute_profile, "places.sqlite"),
+            ],
+        )
+
+    def test_ignores_missing_profiles_ini(self):
+        self.assertEqual(FirefoxProfiles.find(self.tmp_dir.name), [])
+
+
+class TestFirefoxSource(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "places.sqlite")
+        write_places(
+            self.path,
+            [
+                ("Python Tutorial", "https://docs.python.org/3/tutorial/", "Python"),
+                ("Café guide", "https://cafe.example.org", ""),
+                ("git", "https://git-scm.com", "Tools"),
+                ("Recent", "place:sort=8&maxResults=10", ""),
+            ],
+        )
+        self.signature = FirefoxSource.stat_signature(self.path)
+        self.source = FirefoxSource.load(self.path, "firefox", self.signature)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def search(self, *terms, filter_by_folders=False):
+        return [
+            bookmark.name for bookmark in self.source.search(terms, filter_by_folders)
+        ]
+
+    def test_reads_bookmarks_with_their_folders(self):
+        bookmarks = self.source.search(())
+        self.assertEqual(
+            sorted((bookmark.name, bookmark.folder) for bookmark in bookmarks),
+            [
+                ("Café guide", " Bookmarks Toolbar"),
+                ("Python Tutorial", " Bookmarks Toolbar Python"),
+                ("git", " Bookmarks Toolbar Tools"),
+            ],
+        )
+
+    def test_searches_the_full_text_index(self):
+        self.assertEqual(self.search("tutorial"), ["Python Tutorial"])
+        self.assertEqual(self.search("cafe"), ["Café guide"])
+        self.assertEqual(self.search("git", "scm"), ["git"])
+        self.assertEqual(self.search("git", "python"), [])
+
+    def test_searches_short_terms(self):
+        self.assertEqual(self.search("py"), ["Python Tutorial"])
+        self.assertEqual(self.search("g", "tut"), ["Python Tutorial"])
+
+    def test_filters_by_folders(self):
+        self.assertEqual(self.search("tools"), [])
+        self.assertEqual(self.search("tools", filter_by_folders=True), ["git"])
+
+    def test_searches_below_scoped_folders(self):
+        self.assertEqual(
+            [b.name for b in self.source.search(("tutorial",), scope=["python"])],
+            ["Python Tutorial"],
+        )
+        self.assertEqual(
+            [b.name for b in self.source.search((), scope=["tools"])], ["git"]
+        )
+        self.assertEqual(self.source.search(("tutorial",), scope=["tools"]), [])
+
+    def test_looks_up_scoped_folders(self):
+        self.assertTrue(self.source.has_folder(["python"]))
+        self.assertTrue(self.source.has_folder(["toolbar", "tools"]))
+        self.assertFalse(self.source.has_folder(["api"]))
+
+    def test_searches_with_typos(self):
+        self.assertEqual([b.name for b in self.source.search(("pyhton",))], [])
+        self.assertEqual(
+            [b.name for b in self.source.search(("pyhton",), fuzzy=True)],
+            ["Python Tutorial"],
+        )
+        self.assertEqual(
+            [b.name for b in self.source.search(("gudie", "cafe"), fuzzy=True)],
+            ["Café guide"],
+        )
+        self.assertEqual(
+            [b.name for b in self.source.search(("gudie", "tutorial"), fuzzy=True)], []
+        )
+        self.source.fts = False
+        self.assertEqual(
+            [b.name for b in self.source.search(("tutorail",), fuzzy=True)],
+            ["Python Tutorial"],
+        )
+
+    def test_scans_without_full_text_index(self):
+        self.source.fts = False
+        self.assertEqual(self.search("tutorial"), ["Python Tutorial"])
+        self.assertEqual(self.search("g", "tut"), ["Python Tutorial"])
+
+    def test_keeps_source_if_bookmarks_did_not_change(self):
+        source = FirefoxSource.load(self.path, "firefox", self.signature, self.source)
+        self.assertIs(source, self.source)
+
+        write_places(
+            self.path, [("ulauncher", "https://ulauncher.io", "")], last_modified=2
+        )
+        source = FirefoxSource.load(self.path, "firefox", self.signature, self.source)
+        self.assertIsNot(source, self.source)
+        self.assertEqual(
+            [bookmark.name for bookmark in source.search(())], ["ulauncher"]
+        )
+
+    def test_is_searched_with_other_sources(self):
+        index = BookmarkIndex()
+        index.refresh([(self.path, "firefox")])
+        querier = BookmarkQuerier()
+        matches = querier.search_sources(index.sources.values(), "python")
+        self.assertEqual(
+            [(bookmark.name, browser) for bookmark, browser in matches],
+            [("Python Tutorial", "firefox")],
+        )
+        # The candidates are looked up again for every query, so they are not cached
+        self.assertEqual(len(querier.query_cache.queries), 0)
+
+        write_places(
+            self.path, [("ulauncher", "https://ulauncher.io", "")], last_modified=2
+        )
+        self.assertTrue(index.refresh_path(self.path, "firefox"))
+        matches = BookmarkQuerier().search_sources(index.sources.values(), "ulauncher")
+        self.assertEqual(len(matches), 1)
+
+    def test_searches_scopes_without_folders_as_terms(self):
+        write_places(
+            self.path,
+            [
+                ("REST reference", "https://example.com/api/v2", "Work"),
+                ("Team contacts", "mailto:team@example.com", "Work"),
+            ],
+            last_modified=2,
+        )
+        index = BookmarkIndex()
+        index.refresh([(self.path, "firefox")])
+
+        def search(query):
+            return [
+                bookmark.name
+                for bookmark, _ in BookmarkQuerier().search_sources(
+                    index.sources.values(), query
+                )
+            ]
+
+        self.assertEqual(search("/api"), ["REST reference"])
+        self.assertEqual(search("@example"), ["Team contacts"])
+        self.assertEqual(search("@work team"), ["Team contacts"])
+
+    def test_ranks_like_scoring_every_match(self):
+        # Firefox visits the later bookmarks least, but the best match comes last
+        bookmarks = [
+            ("Learn rust part %d" % i, "https://learn.example.org/%d" % i, "")
+            for i in range(20)
+        ]
+        bookmarks.append(("Rust book", "https://doc.rust-lang.org/book", ""))
+        write_places(self.path, bookmarks, last_modified=2)
+        source = FirefoxSource.load(self.path, "firefox", self.signature)
+        source.fetch_size = 2
+        source.fetch_growth = 2
+
+        querier = BookmarkQuerier()
+        querier.max_matches_len = 3
+        matches = querier.search_sources([source], "rust")
+        expected = RankedMatches(3)
+        querier.rank_entries(
+            source.search(("rust",)), "rust", expected, None, "firefox", cached=False
+        )
+        self.assertEqual(
+            [bookmark.url for bookmark, _browser in matches],
+            [bookmark.url for bookmark, _browser in expected.sorted()],
+        )
+        self.assertEqual(matches[0][0].name, "Rust book")
+
+    def test_stops_fetching_once_no_match_can_be_kept(self):
+        fetched = []
+
+        def rank(batch):
+            fetched.extend(batch)
+            return math.inf
+
+        self.source.fetch_size = 1
+        bookmarks = self.source.search(("o",), rank=rank)
+        self.assertEqual(bookmarks, fetched)
+        self.assertEqual(len(bookmarks), 1)
+        self.assertEqual(len(self.source.search(("o",))), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
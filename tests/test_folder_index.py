@@ -0,0 +1,79 @@
+import unittest
+from querier import BookmarkQuerier, FolderIndex
+from tests.test_bookmark_querier import bookmarks
+
+
+class TestFolderIndex(unittest.TestCase):
+    def setUp(self):
+        self.entries = []
+        self.folder_index = FolderIndex()
+        BookmarkQuerier.flatten(bookmarks, self.entries, folder_index=self.folder_index)
+
+    def names(self, intervals):
+        return [
+            self.entries[entry_id].name
+            for entry_id in FolderIndex.interval_ids(intervals)
+        ]
+
+    def test_parses_scoped_queries(self):
+        self.assertEqual(
+            FolderIndex.parse_query("/Python/Advanced tutorial"),
+            (["python", "advanced"], "tutorial"),
+        )
+        self.assertEqual(FolderIndex.parse_query("@Café docs"), (["cafe"], "docs"))
+        self.assertEqual(FolderIndex.parse_query("@work"), (["work"], ""))
+        self.assertEqual(
+            FolderIndex.parse_query("python tutorial"), (None, "python tutorial")
+        )
+        self.assertEqual(FolderIndex.parse_query("/ tutorial"), (None, "/ tutorial"))
+
+    def test_resolves_folders_at_any_depth(self):
+        self.assertEqual(
+            self.names(self.folder_index.resolve(["python"])),
+            [
+                "Documentation",
+                "Python Tutorial",
+                "Documentation and Tutorial - python",
+                "Python Tricks Tutorial",
+                "Zen of Python",
+            ],
+        )
+        # Both Advanced folders, in tree order
+        self.assertEqual(len(self.folder_index.resolve(["adv"])), 2)
+
+    def test_resolves_paths_of_folder_prefixes(self):
+        self.assertEqual(
+            self.names(self.folder_index.resolve(["typ", "adv"])),
+            [
+                "Documentation and Tutorial",
+                "Typescript Tricks Tutorial",
+                "Zen of Typescript",
+            ],
+        )
+        self.assertEqual(self.folder_index.resolve(["advanced", "python"]), [])
+        self.assertEqual(self.folder_index.resolve(["java"]), [])
+
+    def test_merges_nested_folders(self):
+        # The root and all folders below it match, only the root interval is kept
+        self.assertEqual(self.folder_index.resolve(["r"]), [(0, len(self.entries))])
+
+    def test_restricts_ids_to_intervals(self):
+        self.assertEqual(
+            FolderIndex.restrict([0, 2, 3, 5, 8, 9], [(2, 4), (8, 12)]), [2, 3, 8, 9]
+        )
+        self.assertEqual(FolderIndex.interval_ids([(1, 3), (5, 6)]), [1, 2, 5])
+
+    def test_restores_from_bytes(self):
+        restored = FolderIndex.restore(
+            self.folder_index.names,
+            self.folder_index.parents.tobytes(),
+            self.folder_index.starts.tobytes(),
+            self.folder_index.ends.tobytes(),
+        )
+        self.assertEqual(
+            restored.resolve(["typ", "adv"]), self.folder_index.resolve(["typ", "adv"])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
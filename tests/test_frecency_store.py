@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from indexer import FrecencyStore
+from indexer.FrecencyStore import chromium_epoch_offset
+
+
+def chromium_time(unix_time):
+    return int((unix_time + chromium_epoch_offset) * 1e6)
+
+
+def write_history(path, rows):
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS urls (url TEXT, visit_count INTEGER, last_visit_time INTEGER)"
+    )
+    connection.execute("DELETE FROM urls")
+    connection.executemany("INSERT INTO urls VALUES (?, ?, ?)", rows)
+    connection.commit()
+    connection.close()
+    # Make sure a rewrite within the same clock tick is seen as a change
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + len(rows)))
+
+
+class TestFrecencyStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.bookmarks_path = os.path.join(self.tmp_dir.name, "Bookmarks")
+        self.history_path = os.path.join(self.tmp_dir.name, "History")
+        self.cache_path = os.path.join(self.tmp_dir.name, "frecency.marshal")
+        self.bookmarks_paths = [(self.bookmarks_path, "chromium")]
+        self.now = time.time()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_boosts_visited_bookmarks(self):
+        write_history(
+            self.history_path,
+            [
+                ("https://often.org", 150, chromium_time(self.now)),
+                ("https://rarely.org", 2, chromium_time(self.now)),
+                ("https://not-bookmarked.org", 300, chromium_time(self.now)),
+            ],
+        )
+        store = FrecencyStore()
+        store.sync(
+            self.bookmarks_paths,
+            {"https://often.org", "https://rarely.org", "https://never.org"},
+        )
+
+        self.assertGreater(
+            store.boosts["https://often.org"], store.boosts["https://rarely.org"]
+        )
+        self.assertNotIn("https://never.org", store.boosts)
+        self.assertNotIn("https://not-bookmarked.org", store.boosts)
+
+    def test_decays_old_visits(self):
+        write_history(
+            self.history_path,
+            [
+                ("https://recent.org", 10, chromium_time(self.now)),
+                ("https://old.org", 10, chromium_time(self.now - 90 * 86400)),
+            ],
+        )
+        store = FrecencyStore()
+        store.sync(self.bookmarks_paths, {"https://recent.org", "https://old.org"})
+
+        self.assertAlmostEqual(
+            store.boosts["https://old.org"],
+            store.boosts["https://recent.org"] / 8,
+            places=3,
+        )
+
+    def test_syncs_incrementally(self):
+        write_history(
+            self.history_path, [("https://a.org", 1, chromium_time(self.now - 60))]
+        )
+        store = FrecencyStore()
+        store.sync(self.bookmarks_paths, {"https://a.org", "https://b.org"})
+        self.assertEqual(set(store.boosts), {"https://a.org"})
+
+        write_history(
+            self.history_path,
+            [
+                ("https://a.org", 1, chromium_time(self.now - 60)),
+                ("https://b.org", 5, chromium_time(self.now)),
+            ],
+        )
+        store.sync(self.bookmarks_paths, {"https://a.org", "https://b.org"})
+        self.assertEqual(set(store.boosts), {"https://a.org", "https://b.org"})
+
+    def test_looks_up_newly_bookmarked_urls(self):
+        write_history(
+            self.history_path,
+            [
+                ("https://a.org", 1, chromium_time(self.now - 60)),
+                ("https://b.org", 5, chromium_time(self.now - 120)),
+            ],
+        )
+        store = FrecencyStore()
+        store.sync(self.bookmarks_paths, {"https://a.org"})
+        self.assertEqual(set(store.boosts), {"https://a.org"})
+
+        # b.org was visited before the watermark, but only bookmarked now
+        store.sync(self.bookmarks_paths, {"https://a.org", "https://b.org"})
+        self.assertEqual(set(store.boosts), {"https://a.org", "https://b.org"})
+
+        store.sync(self.bookmarks_paths, {"https://b.org"})
+        self.assertEqual(set(store.boosts), {"https://b.org"})
+
+    def test_persists_visits(self):
+        write_history(
+            self.history_path, [("https://a.org", 3, chromium_time(self.now))]
+        )
+        store = FrecencyStore(self.cache_path)
+        store.sync(self.bookmarks_paths, {"https://a.org"})
+
+        restored = FrecencyStore(self.cache_path)
+        self.assertAlmostEqual(
+            restored.boosts["https://a.org"], store.boosts["https://a.org"], places=3
+        )
+
+    def test_ignores_profiles_without_history(self):
+        store = FrecencyStore()
+        store.sync(self.bookmarks_paths, {"https://a.org"})
+        self.assertEqual(store.boosts, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+from querier import BookmarkQuerier, FuzzyMatcher, TrigramIndex
+
+
+class TestFuzzyMatcher(unittest.TestCase):
+    def test_matches_a_single_typo(self):
+        for term in ["pyhton", "pythn", "pythoon", "pythan", "documntation"]:
+            matcher = FuzzyMatcher((term,))
+            self.assertTrue(matcher.matches("learn python documentation"), term)
+
+    def test_rejects_two_typos(self):
+        for term in ["pyhtno", "pthn", "dcumntation"]:
+            self.assertFalse(
+                FuzzyMatcher((term,)).matches("learn python documentation"), term
+            )
+
+    def test_matches_short_terms_exactly(self):
+        matcher = FuzzyMatcher(("gti",))
+        self.assertFalse(matcher.is_fuzzy())
+        self.assertFalse(matcher.matches("git tutorial"))
+        self.assertTrue(FuzzyMatcher(("git",)).matches("git tutorial"))
+
+    def test_requires_all_terms(self):
+        matcher = FuzzyMatcher(("git", "tutorail"))
+        self.assertTrue(matcher.matches("git tutorial"))
+        self.assertFalse(matcher.matches("python tutorial"))
+
+    def test_every_variant_can_be_looked_up(self):
+        trigram_index = TrigramIndex(["ab-de", "abcd"])
+        for term in ["abcde", "pyhton", "documntation"]:
+            for variant in FuzzyMatcher.variants(term, trigram_index.followers):
+                self.assertTrue(
+                    any(len(part) >= FuzzyMatcher.min_part_len for part in variant),
+                    variant,
+                )
+
+    def test_spells_out_replaced_characters_found_in_the_index(self):
+        texts = ["книга", "ab-de", "abxyz", "docs"]
+        trigram_index = TrigramIndex(texts)
+        for term, expected in [("кнuга", [0]), ("abcde", [1])]:
+            matcher = FuzzyMatcher((term,))
+            self.assertEqual(
+                [
+                    text_id
+                    for text_id, text in enumerate(texts)
+                    if matcher.matches(text)
+                ],
+                expected,
+            )
+            self.assertEqual(matcher.candidates(trigram_index), expected, term)
+
+    def test_match_expression_skips_terms_that_can_not_be_looked_up(self):
+        self.assertIsNone(FuzzyMatcher(("abcde",)).match_expression("search_text"))
+        self.assertEqual(
+            FuzzyMatcher(("abcde", "git")).match_expression("search_text"),
+            'search_text : ("git")',
+        )
+
+    def test_candidates_contain_all_fuzzy_matches(self):
+        texts = [
+            "python tutorial",
+            "git tutorial",
+            "zen of pyton",
+            "docs",
+            "pytohn",
+            "typescript",
+        ]
+        trigram_index = TrigramIndex(texts)
+        for terms in [
+            ("pyhton",),
+            ("tutorail",),
+            ("tutorial", "zen"),
+            ("pyhto", "zen"),
+            ("gti",),
+            ("abcde",),
+        ]:
+            matcher = FuzzyMatcher(terms)
+            candidates = matcher.candidates(trigram_index)
+            matches = [
+                text_id for text_id, text in enumerate(texts) if matcher.matches(text)
+            ]
+            if candidates is not None:
+                self.assertTrue(set(matches) <= set(candidates), terms)
+                self.assertLess(len(candidates), len(texts), terms)
+
+    def test_searches_with_typos(self):
+        entries = []
+        BookmarkQuerier.flatten(
+            {
+                "type": "folder",
+                "name": "root",
+                "children": [
+                    {
+                        "type": "url",
+                        "name": "Python Tutorial",
+                        "url": "https://learn.python.org",
+                    },
+                    {"type": "url", "name": "Pyhton typo", "url": "https://typo.org"},
+                    {
+                        "type": "url",
+                        "name": "Typescript",
+                        "url": "https://typescriptlang.org",
+                    },
+                ],
+            },
+            entries,
+        )
+        trigram_index = BookmarkQuerier.build_index(entries)
+        exact = BookmarkQuerier()
+        fuzzy = BookmarkQuerier(fuzzy=True)
+
+        names = [
+            bookmark.name
+            for bookmark, _ in exact.search_sources(
+                [Source(entries, trigram_index)], "pyhton"
+            )
+        ]
+        self.assertEqual(names, ["Pyhton typo"])
+
+        # Exact matches rank above matches with a typo
+        names = [
+            bookmark.name
+            for bookmark, _ in fuzzy.search_sources(
+                [Source(entries, trigram_index)], "pyhton"
+            )
+        ]
+        self.assertEqual(names, ["Pyhton typo", "Python Tutorial"])
+
+        # Refining a query does not drop matches with a typo
+        fuzzy.search_sources([Source(entries, trigram_index)], "pyth")
+        names = [
+            bookmark.name
+            for bookmark, _ in fuzzy.search_sources(
+                [Source(entries, trigram_index)], "pyhon"
+            )
+        ]
+        self.assertEqual(sorted(names), ["Pyhton typo", "Python Tutorial"])
+
+
+class Source:
+    def __init__(self, entries, trigram_index):
+        self.path = "Bookmarks"
+        self.browser = "chromium"
+        self.entries = entries
+        self.trigram_index = trigram_index
+
+
+if __name__ == "__main__":
+    unittest.main()
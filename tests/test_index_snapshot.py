@@ -0,0 +1,67 @@
+import marshal
+import os
+import tempfile
+import unittest
+from indexer import BookmarkIndex, IndexSnapshot
+from querier import BookmarkQuerier
+from tests.test_bookmark_index import write_bookmarks
+
+
+class TestIndexSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "Bookmarks")
+        write_bookmarks(self.path, ["python", "git", "Café"])
+        self.index = BookmarkIndex()
+        self.index.refresh([(self.path, "chromium")])
+        self.snapshot = IndexSnapshot(os.path.join(self.tmp_dir.name, "index.marshal"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_restores_saved_sources(self):
+        self.snapshot.save(self.index.sources)
+        # The origins are not stored, but computed once the sources are restored
+        restored_index = BookmarkIndex()
+        restored_index.restore(self.snapshot.load())
+
+        source = restored_index.sources[self.path]
+        original = self.index.sources[self.path]
+        self.assertEqual(source.browser, "chromium")
+        self.assertEqual(source.signature, original.signature)
+        self.assertEqual(source.trigram_index.postings, original.trigram_index.postings)
+        self.assertEqual(source.folder_index.names, original.folder_index.names)
+        self.assertEqual(
+            source.folder_index.resolve(["bookmark"]),
+            original.folder_index.resolve(["bookmark"]),
+        )
+        for bookmark, original_bookmark in zip(source.entries, original.entries):
+            for field in bookmark.__slots__:
+                self.assertEqual(
+                    getattr(bookmark, field), getattr(original_bookmark, field)
+                )
+
+        matches = BookmarkQuerier().search_sources([source], "cafe")
+        self.assertEqual([bookmark.name for bookmark, _ in matches], ["Café"])
+
+    def test_restored_sources_are_revalidated(self):
+        self.snapshot.save(self.index.sources)
+        write_bookmarks(self.path, ["python"])
+
+        index = BookmarkIndex()
+        index.restore(self.snapshot.load())
+        index.refresh([(self.path, "chromium")])
+        self.assertEqual(len(index.sources[self.path].entries), 1)
+
+    def test_ignores_missing_outdated_and_invalid_snapshots(self):
+        self.assertEqual(self.snapshot.load(), {})
+
+        with open(self.snapshot.snapshot_path, "wb") as snapshot_file:
+            marshal.dump(
+                {"version": IndexSnapshot.version + 1, "sources": []}, snapshot_file
+            )
+        self.assertEqual(self.snapshot.load(), {})
+
+        with open(self.snapshot.snapshot_path, "wb") as snapshot_file:
+            snapshot_file.write(b"invalid")
+        self.assertEqual(self.snapshot.load(), {})
@@ -0,0 +1,28 @@
+import unittest
+from querier import ItemCache
+
+
+class TestItemCache(unittest.TestCase):
+    def test_reuses_cached_items(self):
+        cache = ItemCache()
+        item = cache.get(("python", "https://python.org", "chromium"), object)
+        self.assertIs(
+            cache.get(("python", "https://python.org", "chromium"), object), item
+        )
+        self.assertIsNot(
+            cache.get(("python", "https://python.org", "vivaldi"), object), item
+        )
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_evicts_least_recently_used_items(self):
+        cache = ItemCache(max_size=2)
+        first = cache.get("first", object)
+        cache.get("second", object)
+        cache.get("first", object)
+        cache.get("third", object)
+        self.assertIs(cache.get("first", object), first)
+        self.assertEqual(list(cache.items), ["third", "first"])
+
+
+if __name__ == "__main__":
+    unittest.main()
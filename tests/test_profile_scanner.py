@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from indexer import ProfileScanner
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as touched_file:
+        touched_file.write("{}")
+
+
+class TestProfileScanner(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp_dir.name, "config")
+        self.user_data_dir = os.path.join(self.root, "BraveSoftware", "Brave-Browser")
+        touch(os.path.join(self.user_data_dir, "Local State"))
+        touch(os.path.join(self.user_data_dir, "Default", "Bookmarks"))
+        touch(os.path.join(self.user_data_dir, "Default", "Bookmarks.bak"))
+        touch(os.path.join(self.user_data_dir, "Profile 1", "Bookmarks"))
+        touch(os.path.join(self.user_data_dir, "Profile 1", "Cache", "Bookmarks"))
+        touch(os.path.join(self.root, "other", "Cache", "Bookmarks"))
+        self.cache_path = os.path.join(self.tmp_dir.name, "profiles.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_finds_profile_bookmarks_only(self):
+        scanner = ProfileScanner()
+        self.assertEqual(
+            scanner.scan(self.root),
+            [
+                os.path.join(self.user_data_dir, "Default", "Bookmarks"),
+                os.path.join(self.user_data_dir, "Profile 1", "Bookmarks"),
+            ],
+        )
+
+    def test_missing_root(self):
+        scanner = ProfileScanner()
+        self.assertEqual(scanner.scan(os.path.join(self.root, "missing")), [])
+
+    def test_respects_max_depth(self):
+        scanner = ProfileScanner()
+        scanner.max_depth = 1
+        self.assertEqual(scanner.scan(self.root), [])
+
+    def test_skips_walk_for_unchanged_roots(self):
+        scanner = ProfileScanner(self.cache_path)
+        expected = scanner.scan(self.root)
+        scanner.save()
+
+        scanner = ProfileScanner(self.cache_path)
+        with mock.patch.object(ProfileScanner, "walk") as walk:
+            self.assertEqual(scanner.scan(self.root), expected)
+            walk.assert_not_called()
+
+    def test_rescans_on_new_profile(self):
+        scanner = ProfileScanner(self.cache_path)
+        scanner.scan(self.root)
+        scanner.save()
+
+        new_bookmarks = os.path.join(self.user_data_dir, "Profile 2", "Bookmarks")
+        touch(new_bookmarks)
+        scanner = ProfileScanner(self.cache_path)
+        self.assertIn(new_bookmarks, scanner.scan(self.root))
+
+    def test_rescans_on_first_bookmarks_of_existing_profile(self):
+        scanner = ProfileScanner()
+        os.makedirs(os.path.join(self.user_data_dir, "Profile 3"))
+        scanner.scan(self.root)
+
+        new_bookmarks = os.path.join(self.user_data_dir, "Profile 3", "Bookmarks")
+        touch(new_bookmarks)
+        self.assertIn(new_bookmarks, scanner.scan(self.root))
@@ -0,0 +1,44 @@
+import unittest
+from querier import QueryCache
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.entries = ["a", "b", "c"]
+        self.cache = QueryCache(max_size=2)
+
+    def test_normalize(self):
+        self.assertEqual(
+            QueryCache.normalize(["Python", "", "doc", "python"]), ("doc", "python")
+        )
+
+    def test_exact_hit(self):
+        self.cache.put(self.entries, ("pyth",), [0, 2])
+        self.assertEqual(self.cache.get(self.entries, ("pyth",)), [0, 2])
+        self.assertIsNone(self.cache.get(["a", "b", "c"], ("pyth",)))
+
+    def test_refinable(self):
+        self.cache.put(self.entries, ("pyt",), [0, 1, 2])
+        self.cache.put(self.entries, ("pyth",), [0, 2])
+        self.assertEqual(self.cache.get_refinable(self.entries, ("python",)), [0, 2])
+        self.assertEqual(
+            self.cache.get_refinable(self.entries, ("doc", "pyth")), [0, 2]
+        )
+        self.assertIsNone(self.cache.get_refinable(self.entries, ("py",)))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put(self.entries, ("a",), [0])
+        self.cache.put(self.entries, ("b",), [1])
+        self.cache.get(self.entries, ("a",))
+        self.cache.put(self.entries, ("c",), [2])
+        self.assertEqual(self.cache.get(self.entries, ("a",)), [0])
+        self.assertIsNone(self.cache.get(self.entries, ("b",)))
+
+    def test_retains_only_searched_entries(self):
+        reloaded_entries = ["a", "b"]
+        self.cache.put(self.entries, ("a",), [0])
+        self.cache.put(reloaded_entries, ("a",), [0])
+        self.cache.retain([reloaded_entries])
+        self.assertIsNone(self.cache.get(self.entries, ("a",)))
+        self.assertEqual(self.cache.get(reloaded_entries, ("a",)), [0])
+        self.assertEqual(len(self.cache.queries), 1)
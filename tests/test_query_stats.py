@@ -0,0 +1,43 @@
+import unittest
+from querier import QueryStats, QueryTimer
+
+
+class TestQueryStats(unittest.TestCase):
+    def setUp(self):
+        self.stats = QueryStats(window=100)
+
+    def test_aggregates_percentiles(self):
+        for i in range(1, 101):
+            self.stats.record_query({"search": float(i)}, {"matches": i % 10})
+        summary = self.stats.summary()
+        self.assertEqual(summary["search"]["p50"], 51.0)
+        self.assertEqual(summary["search"]["p90"], 91.0)
+        self.assertEqual(summary["search"]["max"], 100.0)
+        self.assertEqual(summary["matches"]["max"], 9)
+
+    def test_keeps_rolling_window(self):
+        for i in range(150):
+            self.stats.record_query({"search": float(i)}, {})
+        self.assertEqual(len(self.stats.queries), 100)
+        self.assertEqual(self.stats.summary()["search"]["p50"], 100.0)
+
+    def test_reports_slowest_sources_and_loads(self):
+        self.stats.record_query({}, {}, {"fast/Bookmarks": 1.0, "slow/Bookmarks": 9.0})
+        self.stats.record_load("slow/Bookmarks", 120.0, 5000)
+        self.assertEqual(self.stats.slowest_sources(1), [("slow/Bookmarks", 9.0)])
+        lines = self.stats.format_lines()
+        self.assertEqual(lines[0], "1 queries")
+        self.assertIn("load slow/Bookmarks: 120.00 ms, 5000 bookmarks", lines)
+
+    def test_dumps_once_per_interval(self):
+        self.stats.dump_interval = 0
+        self.assertTrue(self.stats.should_dump())
+        self.stats.dump_interval = 3600
+        self.assertFalse(self.stats.should_dump())
+
+    def test_timer_records_stages(self):
+        timer = QueryTimer()
+        timer.lap("lookup")
+        timer.lap("search")
+        self.assertEqual(list(timer.stages), ["lookup", "search"])
+        self.assertGreaterEqual(timer.stages["search"], 0)
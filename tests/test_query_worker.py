@@ -0,0 +1,55 @@
+import threading
+import unittest
+from querier import QueryCancelled, QueryWorker
+
+
+class TestQueryWorker(unittest.TestCase):
+    def setUp(self):
+        self.started = threading.Event()
+        self.results = []
+        self.rendered = threading.Event()
+        self.worker = QueryWorker(self.handle)
+        self.worker.start()
+
+    def tearDown(self):
+        self.worker.stop()
+        self.worker.join()
+
+    def handle(self, query, is_cancelled):
+        if query == "slow":
+            self.started.set()
+            # Scans until the query is superseded
+            while not is_cancelled():
+                pass
+            raise QueryCancelled()
+        return query.upper()
+
+    def render(self, result):
+        self.results.append(result)
+        self.rendered.set()
+
+    def test_answers_queries(self):
+        self.worker.submit("python", self.render)
+        self.assertTrue(self.rendered.wait(5))
+        self.assertEqual(self.results, ["PYTHON"])
+
+    def test_cancels_superseded_queries(self):
+        self.worker.submit("slow", self.render)
+        self.assertTrue(self.started.wait(5))
+        self.worker.submit("python", self.render)
+        self.assertTrue(self.rendered.wait(5))
+        self.assertEqual(self.results, ["PYTHON"])
+        self.assertEqual(self.worker.cancelled_queries, 1)
+
+    def test_only_answers_the_latest_pending_query(self):
+        self.worker.submit("slow", self.render)
+        self.assertTrue(self.started.wait(5))
+        # Both arrive while the slow query is still scanning
+        self.worker.submit("p", self.render)
+        self.worker.submit("python", self.render)
+        self.assertTrue(self.rendered.wait(5))
+        self.assertEqual(self.results, ["PYTHON"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import threading
+import unittest
+from functools import partial
+from querier import QueryCancelled, QueryWorker, ResultSender
+
+
+class Client:
+    def __init__(self):
+        self.responses = []
+        self.sent = threading.Event()
+
+    def send(self, response):
+        self.responses.append(response)
+        self.sent.set()
+
+
+class Extension:
+    def __init__(self):
+        self._client = Client()
+
+
+class TestResultSender(unittest.TestCase):
+    def setUp(self):
+        self.started = threading.Event()
+        self.extension = Extension()
+        self.sender = ResultSender(self.extension, lambda event, items: (event, items))
+        self.worker = QueryWorker(self.handle)
+        self.worker.start()
+
+    def tearDown(self):
+        self.worker.stop()
+        self.worker.join()
+
+    def handle(self, query, is_cancelled):
+        if query == "slow":
+            self.started.set()
+            while not is_cancelled():
+                pass
+            raise QueryCancelled()
+        if query == "stale":
+            # A newer keystroke arrives right after the search finished
+            self.worker.submit("python", partial(self.sender.send, "newer"))
+        return [query]
+
+    def test_sends_the_results_through_the_client(self):
+        self.assertTrue(self.sender.send("event", ["item"]))
+        self.assertEqual(self.extension._client.responses, [("event", ["item"])])
+
+    def test_only_sends_the_results_of_the_latest_query(self):
+        self.worker.submit("slow", partial(self.sender.send, "first"))
+        self.assertTrue(self.started.wait(5))
+        self.worker.submit("python", partial(self.sender.send, "second"))
+        self.assertTrue(self.extension._client.sent.wait(5))
+        self.assertEqual(self.extension._client.responses, [("second", ["python"])])
+        self.assertEqual(self.worker.cancelled_queries, 1)
+
+    def test_drops_results_of_a_superseded_finished_search(self):
+        self.worker.submit("stale", partial(self.sender.send, "stale"))
+        self.assertTrue(self.extension._client.sent.wait(5))
+        self.assertEqual(self.extension._client.responses, [("newer", ["python"])])
+        self.assertEqual(self.worker.cancelled_queries, 1)
+
+    def test_does_not_fail_without_a_client(self):
+        del self.extension._client
+        with self.assertLogs("querier.ResultSender", "ERROR"):
+            self.assertFalse(self.sender.send("event", ["item"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
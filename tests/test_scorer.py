@@ -0,0 +1,108 @@
+import unittest
+from querier import FuzzyMatcher, RankedMatches, Scorer
+
+
+class TestScorer(unittest.TestCase):
+    def setUp(self):
+        self.scorer = Scorer()
+
+    def test_title_ranks_above_url_and_folder(self):
+        title = self.scorer.score("python", "https://a.org", "", ("python",))
+        url = self.scorer.score("docs", "https://python.org", "", ("python",))
+        folder = self.scorer.score("docs", "https://a.org", " python", ("python",))
+        self.assertGreater(title, url)
+        self.assertGreater(url, folder)
+
+    def test_prefix_and_word_boundary_rank_higher(self):
+        prefix = self.scorer.score("python tricks", "", "", ("python",))
+        boundary = self.scorer.score("real python", "", "", ("python",))
+        inner = self.scorer.score("realpython", "", "", ("python",))
+        self.assertGreater(prefix, boundary)
+        self.assertGreater(boundary, inner)
+
+    def test_shorter_urls_rank_higher(self):
+        short = self.scorer.score("python", "https://python.org", "", ("python",))
+        long = self.scorer.score(
+            "python", "https://python.org/3/library", "", ("python",)
+        )
+        self.assertGreater(short, long)
+
+    def test_typos_rank_below_exact_matches(self):
+        terms = ("pyhton",)
+        patterns = FuzzyMatcher(terms).patterns
+        exact = self.scorer.score("pyhton", "", "", terms, patterns)
+        title = self.scorer.score("python", "", "", terms, patterns)
+        url = self.scorer.score("docs", "https://python.org", "", terms, patterns)
+        none = self.scorer.score("docs", "", "", terms, patterns)
+        self.assertGreater(exact, title)
+        self.assertGreater(title, url)
+        self.assertGreater(url, none)
+        self.assertLessEqual(exact, self.scorer.max_score(terms))
+        fuzzy_bound = self.scorer.bound("python", 6, terms, matched_text="python")
+        self.assertLessEqual(title, fuzzy_bound)
+        self.assertLess(fuzzy_bound, exact)
+
+    def test_upper_bound(self):
+        url = "https://python.org"
+        score = self.scorer.score("python", url, " python", ("python", "py"))
+        self.assertLessEqual(score, self.scorer.upper_bound(len(url), ("python", "py")))
+        self.assertLessEqual(score, self.scorer.max_score(("python", "py")))
+
+    def test_bound_is_exact_for_title_and_url_matches(self):
+        cases = [
+            ("real python", "https://www.python.org/docs", ("python", "docs")),
+            ("python tricks", "https://a.org", ("py", "tricks")),
+            ("realpython", "https://a.org/python-3", ("python", "org")),
+            ("café guide", "https://b.org", ("caf", "guide")),
+            ("redirect", "https://x.org/?r=http://y.org", ("x", "y")),
+        ]
+        for title, url, terms in cases:
+            with self.subTest(title=title, terms=terms):
+                score = self.scorer.score(title, url, "", terms)
+                bound = self.scorer.bound(title + " " + url, len(title), terms)
+                self.assertEqual(score, bound)
+
+    def test_bound_covers_folder_matches(self):
+        terms = ("python", "news")
+        score = self.scorer.score("docs", "https://a.org", " python news", terms)
+        self.assertLessEqual(score, self.scorer.bound("docs https://a.org", 4, terms))
+
+    def test_strips_only_a_leading_scheme(self):
+        self.assertEqual(Scorer.strip_scheme("https://www.a.org"), "a.org")
+        self.assertEqual(
+            Scorer.strip_scheme("https://x.org/?r=http://y.org"),
+            "x.org/?r=http://y.org",
+        )
+        self.assertEqual(Scorer.strip_scheme("a.org/?r=http://y"), "a.org/?r=http://y")
+
+    def test_later_and_inner_term_scores(self):
+        starts = self.scorer.score("python", "", "", ("python",))
+        later = self.scorer.score("real python", "", "", ("python",))
+        inner = self.scorer.score("realpython", "", "", ("python",))
+        url_bonus = self.scorer.url_length_bonus(0)
+        self.assertEqual(starts - url_bonus, self.scorer.max_term_score())
+        self.assertLessEqual(later - url_bonus, self.scorer.max_later_term_score())
+        self.assertLessEqual(inner - url_bonus, self.scorer.max_inner_term_score())
+        self.assertLess(
+            self.scorer.max_inner_term_score(), self.scorer.max_later_term_score()
+        )
+
+
+class TestRankedMatches(unittest.TestCase):
+    def test_keeps_best_matches_and_earlier_ones_on_ties(self):
+        ranked = RankedMatches(2)
+        ranked.push(1.0, "a")
+        ranked.push(2.0, "b")
+        ranked.push(1.0, "c")
+        ranked.push(3.0, "d")
+        self.assertEqual(ranked.sorted(), ["d", "b"])
+        self.assertEqual(ranked.threshold(), 2.0)
+
+    def test_keeps_best_match_per_key(self):
+        ranked = RankedMatches(2, key=lambda match: match[0])
+        ranked.push(2.0, ("a", "first"))
+        ranked.push(2.0, ("a", "second"))
+        ranked.push(1.0, ("b", "first"))
+        ranked.push(3.0, ("b", "second"))
+        ranked.push(0.5, ("c", "first"))
+        self.assertEqual(ranked.sorted(), [("b", "second"), ("a", "first")])
@@ -0,0 +1,42 @@
+import unittest
+from querier import TrigramIndex
+
+
+class TestTrigramIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TrigramIndex(
+            ["python tutorial", "git tutorial", "zen of python", "docs"]
+        )
+
+    def test_candidates_contain_all_terms(self):
+        self.assertEqual(self.index.candidates(["python"]), [0, 2])
+        self.assertEqual(self.index.candidates(["tutorial"]), [0, 1])
+        self.assertEqual(self.index.candidates(["python", "tutorial"]), [0])
+
+    def test_unknown_trigram_has_no_candidates(self):
+        self.assertEqual(self.index.candidates(["java"]), [])
+
+    def test_short_terms_cannot_use_the_index(self):
+        self.assertIsNone(self.index.candidates(["py", ""]))
+
+    def test_restores_postings_from_bytes(self):
+        postings = {
+            trigram: posting.tobytes()
+            for trigram, posting in self.index.postings.items()
+        }
+        restored = TrigramIndex.restore(postings, self.index.size)
+        self.assertEqual(restored.postings, self.index.postings)
+        self.assertEqual(restored.candidates(["python", "tutorial"]), [0])
+
+    def test_word_start_candidates(self):
+        # The indexed texts start with the folders, so words never start at their very start
+        index = TrigramIndex(
+            [" python tutorial", " git tutorial", " zen of python", " docs/x"]
+        )
+        self.assertEqual(index.word_start_candidates("py", 10), {0, 2})
+        self.assertEqual(index.word_start_candidates("tut", 10), {0, 1})
+        self.assertEqual(index.word_start_candidates("ython", 10), set())
+        # Single characters also start a word at the end of a text
+        self.assertEqual(index.word_start_candidates("x", 10), {3})
+        self.assertEqual(index.word_start_candidates("o", 10), {2})
+        self.assertIsNone(index.word_start_candidates("t", 1))